@@ -1,2 +1,6 @@
 
-__version__= "1.2.0"
\ No newline at end of file
+__version__= "1.2.0"
+
+from ._scraper import ScraperGooleScholar
+from ._record import Record
+from ._sinks import Sink, CSVSink, JSONLSink, ParquetSink
@@ -4,14 +4,31 @@
 import argparse
 import sys
 import os
-import re
 import time
 import typing 
+import socket
+import threading
+import subprocess
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 from ._scraper import ScraperGooleScholar
+from ._crossref import CrossrefAPI
+from ._crossref_client import CrossrefClient
+from ._demografix import GenderPredictor
+from ._pipeline import Pipeline
+from ._ratelimit import RateLimiter
+from ._retry import Retrier
+from ._proxy import Proxy
+from ._cassette import Cassette
+from ._availability import AvailabilityProbe
+from ._metrics import Metrics
+from ._shard import YearShards
+from ._rawstore import RawStore
+from ._sinks import ParquetSink
+from ._workqueue import WorkQueue
 
 
-def run ( query: str, numentries: int, outdir: str, vpn:str, verbose:bool ):
+def run ( query: str, numentries: int, outdir: str, vpn:str, verbose:bool, workers:int = 4, years:typing.Tuple[int,int] = None ):
     """
     General options management
     --------------------------------------------------------------------
@@ -19,10 +36,14 @@ def run ( query: str, numentries: int, outdir: str, vpn:str, verbose:bool ):
         :param numentries: Number of entries to recover 
         :param outdir:     Folder where store CSV with results
         :param verbose:    Show messages
+        :param workers:    Number of entries enriched at the same time
+        :param years:      (first, last) publication years of the results, None for every year
 
+    Returns the number of entries written.
     """
 
     scraper = ScraperGooleScholar()
+    scraper.years = years
 
     # Check if previous download was runed
     dwonloaded_entries = scraper.get_downloaded_entries(query, outdir) 
@@ -30,30 +51,530 @@ def run ( query: str, numentries: int, outdir: str, vpn:str, verbose:bool ):
 
     if (verbose): 
         print(f"Number of entries to download ({len(entries_to_download)}/{numentries})")
+    Metrics.SHARED.start(len(entries_to_download))
 
+    # Main info from the query entries, saved raw, enriched and exported to csv
+    raw = RawStore(ScraperGooleScholar.get_rawfile(query, outdir))
+    pipeline = Pipeline(scraper, query, outdir, vpn, workers=workers, verbose=verbose, raw=raw)
+    written = 0
+    try:
+        # Entries fetched by a previous run but not enriched are not requested to GS again
+        fetched = scraper.get_raw_records(query, outdir, entries_to_download)
+        if fetched:
+            if (verbose):
+                print(f"Enriching {len(fetched)} entries already fetched from Google Scholar")
+            written = pipeline.run_records(sorted(fetched.items()), numentries)
+            entries_to_download = [ rank for rank in entries_to_download if int(rank) not in fetched ]
 
-    # Query to Google Scholar web
-    response = scraper.scrapeGS(query, numentries, outdir, vpn, verbose)
+        written = fetch_ranges(scraper, pipeline, query, numentries, vpn, verbose, entries_to_download) or written
+    finally:
+        scraper.close()
+        raw.close()
 
+    return written
+
+
+def fetch_ranges ( scraper: ScraperGooleScholar, pipeline: Pipeline, query: str, numentries: int, vpn:str, verbose:bool,
+                   entries_to_download: typing.List[str] ) -> int:
+    """
+    Request to GS the result pages with entries to download and pass them to a pipeline.
+    Returns the number of entries written by the pipeline, 0 if nothing was requested.
+    --------------------------------------------------------------------
+        :param scraper:             ScraperGooleScholar instance
+        :param pipeline:            Pipeline that processes the entries
+        :param query:               Search query to GS
+        :param numentries:          Number of entries to recover 
+        :param verbose:             Show messages
+        :param entries_to_download: GSRANKs to download
+
+    """
     # Check if all the sheets are availables to consult
-    if numentries == 1000:
-        numentries = scraper.check_availability( query, verbose )
+    if numentries == 1000 and entries_to_download:
+        numentries = scraper.check_availability( query, verbose, vpn )
+
+    # Only the GS result pages with missing entries are requested
+    ranges = ScraperGooleScholar.get_missing_ranges( numentries, entries_to_download )
+
+    written = 0
+    for first, last in ranges:
+
+        if (verbose):
+            print(f"Downloading entries {first}-{last}")
+
+        # Query to Google Scholar web starting at the page of the first entry
+        response = scraper.scrapeGS(query, numentries, pipeline.outdir, vpn, verbose, start_index=first - 1)
+        written = pipeline.run(response, last, entries_to_download, first=first)
+    return written
+
+
+def harvest ( query: str, numentries: int, outdir: str, vpn:str, verbose:bool, workers:int = 4, years:typing.Tuple[int,int] = None ):
+    """
+    First phase of a job: the GS records are only saved in the raw store of
+    the query, as fast as GS allows. They are enriched by enrich().
+    --------------------------------------------------------------------
+        :param query:      Search query to GS
+        :param numentries: Number of entries to recover 
+        :param outdir:     Folder where store CSV with results
+        :param verbose:    Show messages
+        :param workers:    Not used, every record is saved by the producer
+        :param years:      (first, last) publication years of the results, None for every year
+
+    Returns the number of records saved.
+    """
+
+    scraper = ScraperGooleScholar()
+    scraper.years = years
+
+    # Entries already enriched or already fetched on any day
+    done = scraper.get_downloaded_entries(query, outdir) | { str(rank) for rank in scraper.get_raw_records(query, outdir) }
+    entries_to_download = [ str(i+1) for i in range(numentries) if not str(i+1) in done ]
+
+    if (verbose):
+        print(f"Number of entries to harvest ({len(entries_to_download)}/{numentries})")
+    Metrics.SHARED.start(len(entries_to_download))
+
+    raw = RawStore(ScraperGooleScholar.get_rawfile(query, outdir))
+    pipeline = Pipeline(scraper, query, outdir, vpn, verbose=verbose, raw=raw, harvest_only=True)
+    try:
+        saved = fetch_ranges(scraper, pipeline, query, numentries, vpn, verbose, entries_to_download)
+    finally:
+        scraper.close()
+        raw.close()
+
+    if (verbose):
+        print(f"Harvest: {saved} records saved in {raw.path}")
+    return saved
+
+
+def enrich ( query: str, numentries: int, outdir: str, vpn:str, verbose:bool, workers:int = 4, reenrich:bool = False ):
+    """
+    Second phase of a job: the GS records of the raw stores of the query (of
+    any day) are enriched without requesting GS. The CSV resume index is the
+    checkpoint of the phase, so a stopped enrichment continues where it was.
+    With reenrich every record is enriched again, e.g. after a change of the
+    enrichment, in a new CSV that replaces the old one once it is complete.
+    --------------------------------------------------------------------
+        :param query:      Search query to GS
+        :param numentries: Number of entries to recover 
+        :param outdir:     Folder where store CSV with results
+        :param verbose:    Show messages
+        :param workers:    Number of entries enriched at the same time
+        :param reenrich:   Enrich again the records already enriched
+
+    Returns the number of entries written.
+    """
+
+    scraper = ScraperGooleScholar()
+    target = Path(outdir) / ScraperGooleScholar.REENRICH_DIR if reenrich else Path(outdir)
+    target.mkdir(parents=True, exist_ok=True)
+
+    done = scraper.get_downloaded_entries(query, target)
+    records = { rank: entry for rank, entry in scraper.get_raw_records(query, outdir).items()
+                if rank <= numentries and str(rank) not in done }
+
+    if (verbose):
+        print(f"Number of entries to enrich ({len(records)}/{numentries})")
+    Metrics.SHARED.start(len(records))
+
+    pipeline = Pipeline(scraper, query, target, vpn, workers=workers, verbose=verbose)
+    try:
+        written = pipeline.run_records(sorted(records.items()), numentries)
+    finally:
+        scraper.close()
+
+    if reenrich and not pipeline.failed and ScraperGooleScholar.get_outfile(query, target).exists():
+        ScraperGooleScholar.replace_outfile(query, target, outdir)
+        if not any(target.iterdir()):
+            target.rmdir()
+    elif pipeline.failed:
+        print(f"[ Enrich Error ] {pipeline.failed} entries could not be enriched, run the enrichment again to finish it")
+    return written
+
+
+def refresh ( query: str, numentries: int, outdir: str, vpn:str, verbose:bool, workers:int = 4 ):
+    """
+    Citations-only refresh of a query. The GS result pages are fetched again
+    and the papers already stored on any day, matched by cluster id, only get
+    their GS fields updated (rank, citations, links). Crossref and the name
+    APIs are only used for new papers. The refreshed CSV is written aside and
+    replaces the CSV of the day once every entry is stored; a refresh stopped
+    before is resumed.
+    --------------------------------------------------------------------
+        :param query:      Search query to GS
+        :param numentries: Number of entries to recover 
+        :param outdir:     Folder where store CSV with results
+        :param verbose:    Show messages
+        :param workers:    Number of entries enriched at the same time
+
+    Returns the number of entries written.
+    """
+
+    scraper = ScraperGooleScholar()
+    scraper.known = scraper.get_known_papers(query, outdir)
+    staging = Path(outdir) / ScraperGooleScholar.REFRESH_DIR
+    staging.mkdir(parents=True, exist_ok=True)
+
+    # Entries already refreshed by a previous attempt
+    refreshed_entries = scraper.get_downloaded_entries(query, staging)
+    entries_to_download = [ str(i+1) for i in range(numentries) if not str(i+1) in refreshed_entries ]
+
+    if (verbose):
+        print(f"Papers already stored: {len(scraper.known)}")
+        print(f"Number of entries to refresh ({len(entries_to_download)}/{numentries})")
+    Metrics.SHARED.start(len(entries_to_download))
+
+    if numentries == 1000 and entries_to_download:
+        numentries = scraper.check_availability( query, verbose, vpn )
+
+    ranges = ScraperGooleScholar.get_missing_ranges( numentries, entries_to_download )
+
+    pipeline = Pipeline(scraper, query, staging, vpn, workers=workers, verbose=verbose)
+    written = 0
+    try:
+        for first, last in ranges:
+
+            if (verbose):
+                print(f"Refreshing entries {first}-{last}")
+
+            response = scraper.scrapeGS(query, numentries, staging, vpn, verbose, start_index=first - 1)
+            written = pipeline.run(response, last, entries_to_download, first=first)
+    finally:
+        scraper.close()
+
+    if (verbose):
+        print(f"Refresh: {scraper.reused} papers updated, {written - scraper.reused} new papers enriched")
+
+    # Entries that failed are refreshed in the next run, the old CSV is kept until then
+    if pipeline.failed:
+        print(f"[ Refresh Error ] {pipeline.failed} entries could not be refreshed, run the refresh again to finish it")
+        return written
+
+    if ScraperGooleScholar.get_outfile(query, staging).exists():
+        outfile = ScraperGooleScholar.replace_outfile(query, staging, outdir)
+        if not any(staging.iterdir()):
+            staging.rmdir()
+        if (verbose):
+            print(f"Refreshed CSV: {outfile}")
+    return written
+
+
+def read_queries ( path: str ) -> typing.List[str]:
+    """ Queries of a batch file: one per line, blank lines and lines starting with # are skipped """
+    with open(path, 'r', encoding='utf-8') as queries_file:
+        queries = [ line.strip() for line in queries_file ]
+    return list(dict.fromkeys( query for query in queries if query and not query.startswith('#') ))
+
+
+def run_batch ( queries: typing.List[str], numentries: int, outdir: str, vpn:str, verbose:bool, workers:int = 4, parallel:int = 3,
+                mode:str = 'all' ):
+    """
+    Several queries scraped in one process. Up to `parallel` queries run at the
+    same time sharing the rate limits, lookup caches and proxy pool. Each query
+    waits for a single GS page at a time and the GS token bucket serves the
+    waiting queries in order of arrival, so the pages of the queries are
+    interleaved round-robin under one GS budget. Each query keeps its own CSV.
+    --------------------------------------------------------------------
+        :param queries:    Search queries to GS
+        :param numentries: Number of entries to recover of each query
+        :param outdir:     Folder where store CSV with results
+        :param verbose:    Show messages
+        :param workers:    Number of entries enriched at the same time per query
+        :param parallel:   Number of queries run at the same time
+        :param mode:       'all', 'refresh', 'harvest', 'enrich' or 'reenrich' (see main)
+
+    Returns the entries written, seconds and error of each query.
+    """
+    scrape_query = { 'all':      run,
+                     'refresh':  refresh,
+                     'harvest':  harvest,
+                     'enrich':   enrich,
+                     'reenrich': lambda *args: enrich(*args, reenrich=True) }[mode]
+
+    def scrape ( query: str ) -> typing.Dict:
+        start = time.monotonic()
+        try:
+            written, error = scrape_query(query, numentries, outdir, vpn, verbose, workers), None
+        except Exception as e:
+            written, error = 0, e
+            print(f"[ Batch Error ] Query '{query}' failed: {e}")
+        Metrics.SHARED.count('queries', result='failed' if error is not None else 'done')
+        return {'query': query, 'entries': written, 'seconds': round(time.monotonic() - start, 2), 'error': error}
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max(1, parallel), thread_name_prefix='gscraper-query') as pool:
+        results = list(pool.map(scrape, queries))
+    elapsed = time.monotonic() - start
+
+    if (verbose):
+        for result in results:
+            status = 'failed' if result['error'] is not None else f"{result['entries'] * 3600 / result['seconds'] if result['seconds'] else 0:.0f} entries/h"
+            print(f"Query '{result['query']}': {result['entries']} entries in {result['seconds']} s ({status})")
+
+        total = sum(result['entries'] for result in results)
+        failed = sum(result['error'] is not None for result in results)
+        print(f"Batch: {len(results) - failed}/{len(results)} queries, {total} entries in {elapsed:.2f} s "
+              f"({total * 3600 / elapsed if elapsed else 0:.0f} entries/h)")
+
+    return results
+
+
+def coordinate ( queries: typing.List[str], numentries: int, outdir: str, vpn:str, verbose:bool, workqueue: WorkQueue,
+                 task_size:int = 50, local_workers:int = 0, command:typing.List[str] = None, poll:float = 5 ) -> int:
+    """
+    Coordinator of a distributed harvest: the missing entries of each query
+    are split in GS page-range tasks queued in the work queue, and the rows
+    reported by the workers are merged into the output of each query until
+    every task is done or out of attempts. The workers are other processes,
+    started here once the tasks are queued (local_workers) or on other
+    nodes sharing the queue file.
+    --------------------------------------------------------------------
+        :param queries:       Search queries to GS
+        :param numentries:    Number of entries to recover of each query
+        :param outdir:        Folder where store CSV with results
+        :param verbose:       Show messages
+        :param workqueue:     Queue shared with the workers
+        :param task_size:     Number of entries of each task, rounded to whole GS pages
+        :param local_workers: Number of workers started on this host, the coordination stops if all of them exit
+        :param command:       Command of a local worker
+        :param poll:          Seconds between two merges of the reported rows
+
+    Returns the number of entries merged.
+    """
+    scraper = ScraperGooleScholar()
+    processes = []
+    try:
+        # Rows reported after the last coordination are stored before planning
+        merged = merge_results(scraper, workqueue, outdir)
+
+        for query in queries:
+            dwonloaded_entries = scraper.get_downloaded_entries(query, outdir)
+            entries_to_download = [ str(i+1) for i in range(numentries) if not str(i+1) in dwonloaded_entries ]
+
+            total = numentries
+            if numentries == 1000 and entries_to_download:
+                total = scraper.check_availability( query, verbose, vpn )
+
+            ranges = ScraperGooleScholar.get_missing_ranges(total, entries_to_download)
+            tasks = WorkQueue.split(ranges, task_size, ScraperGooleScholar.PAGE_SIZE)
+            queued = workqueue.add(query, tasks, total)
+            if (verbose):
+                print(f"Query '{query}': {len(entries_to_download)} entries to download, {queued} tasks queued")
+
+        processes = [ subprocess.Popen(command) for _ in range(local_workers if workqueue.open_tasks() else 0) ]
+
+        while workqueue.open_tasks():
+            time.sleep(poll)
+            merged += merge_results(scraper, workqueue, outdir)
+            if (verbose):
+                print(f"Work queue: {workqueue.stats()}")
+            if processes and all(process.poll() is not None for process in processes):
+                print("[ Queue Error ] Every local worker exited before the queue was finished, run the coordinator again to resume it")
+                break
+
+        merged += merge_results(scraper, workqueue, outdir)
+    finally:
+        scraper.close()
+        for process in processes:
+            process.wait()
+
+    for query, first, last, error in workqueue.failures():
+        print(f"[ Queue Error ] Entries {first}-{last} of '{query}' failed {WorkQueue.MAX_ATTEMPTS} times: {error}")
+    if (verbose):
+        print(f"Coordinator: {merged} entries merged in {outdir}")
+    return merged
 
-    for numentry in range(numentries):
 
-        # Main info from the query entries
-        entry = scraper.get_entry( 
-            response, 
-            numentry + 1, 
-            numentries, 
-            entries_to_download, 
-            vpn,
-            verbose
-        )
+def merge_results ( scraper: ScraperGooleScholar, workqueue: WorkQueue, outdir: str ) -> int:
+    """ Store the rows reported by the workers in the output of their query. Returns the number of rows """
+    merged = 0
+    while True:
+        results = workqueue.unmerged()
+        if not results:
+            return merged
+        for query, gsrank, row in results:
+            scraper.write(query, row, gsrank, outdir)
 
-        # Export to csv
-        if entry is not None:
-            scraper.write(query, entry, numentry, outdir)
+        # Saved before they are marked, so a crash merges them again instead of losing them
+        for writer in scraper.writers.values():
+            writer.flush()
+        workqueue.merged(results)
+        merged += len(results)
+
+
+def work ( workqueue: WorkQueue, vpn:str, verbose:bool, workers:int = 4, lease:float = 600, poll:float = 5 ) -> int:
+    """
+    Worker of a distributed harvest: tasks are claimed from the queue and
+    their entries fetched from GS, enriched and reported to the queue, until
+    no task is pending or running. The lease of a task is renewed while it
+    runs; a task with failed entries is released to be retried.
+    --------------------------------------------------------------------
+        :param workqueue: Queue shared with the coordinator
+        :param vpn:       Type of VPN used to change the proxy
+        :param verbose:   Show messages
+        :param workers:   Number of entries enriched at the same time
+        :param lease:     Seconds a task is reserved without a renewal
+        :param poll:      Seconds between two claims when every task is running
+
+    Returns the number of entries reported.
+    """
+    worker = f"{socket.gethostname()}-{os.getpid()}"
+    scraper = ScraperGooleScholar()
+    reported = 0
+    try:
+        while True:
+            task = workqueue.claim(worker, lease)
+
+            # Finished queue. A worker started before the coordinator waits for the tasks
+            stats = workqueue.stats()
+            if task is None and not workqueue.open_tasks() and (stats['done'] or stats['failed']):
+                break
+            if task is None:
+                time.sleep(poll)
+                continue
+
+            query, first, last = task['query'], task['first'], task['last']
+            if (verbose):
+                print(f"[{worker}] Entries {first}-{last} of '{query}' (attempt {task['attempts']})")
+
+            # The lease is renewed while the task runs
+            finished = threading.Event()
+
+            def renew_lease ():
+                while not finished.wait(lease / 3):
+                    workqueue.renew(task, worker, lease)
+
+            heartbeat = threading.Thread(target=renew_lease, name='gscraper-lease', daemon=True)
+            heartbeat.start()
+
+            # Entries already reported by a previous attempt are not downloaded again
+            done = workqueue.reported(query, first, last)
+            entries_to_download = [ str(rank) for rank in range(first, last + 1) if str(rank) not in done ]
+            pipeline = Pipeline(scraper, query, None, vpn, workers=workers, verbose=verbose,
+                                sink=lambda numentry, row: workqueue.report(query, numentry, row, worker))
+            try:
+                if entries_to_download:
+                    response = scraper.scrapeGS(query, task['numentries'], None, vpn, verbose, start_index=first - 1)
+                    pipeline.run(response, last, entries_to_download, first=first)
+                if pipeline.failed:
+                    workqueue.fail(task, worker, f"{pipeline.failed} entries could not be enriched")
+                else:
+                    workqueue.complete(task, worker, pipeline.written)
+            except Exception as e:
+                print(f"[ Queue Error ] Entries {first}-{last} of '{query}' failed: {e}")
+                workqueue.fail(task, worker, str(e))
+            finally:
+                finished.set()
+                heartbeat.join()
+            reported += pipeline.written
+    finally:
+        scraper.close()
+
+    if (verbose):
+        print(f"[{worker}] {reported} entries reported")
+    return reported
+
+
+def worker_argv ( argv: typing.List[str], queuefile: str ) -> typing.List[str]:
+    """ Command of a local worker: the arguments of the coordinator without the queries and the coordination """
+    values = {'-q', '--query', '-qf', '--queries-file', '-n', '--numentries', '--coordinator', '--local-workers', '--task-size'}
+
+    command = [sys.executable, '-m', __package__, '--worker', queuefile]
+    skip = False
+    for arg in argv:
+        name = arg.split('=', 1)[0]
+        if skip:
+            skip = False
+        elif name in values or (name.startswith('--') and len(name) > 3 and any(value.startswith(name) for value in values)):
+            skip = '=' not in arg
+        else:
+            command.append(arg)
+    return command
+
+
+def run_sharded ( query: str, outdir: str, vpn:str, verbose:bool, workers:int = 4, parallel:int = 3,
+                  years:typing.Tuple[int,int] = None ):
+    """
+    Query harvested past the GS cap in publication-year slices. The slices are
+    planned splitting any range of years that still reaches the cap, harvested
+    at the same time under the shared GS budget like a batch of queries and
+    merged in one deduplicated CSV with a global rank.
+    --------------------------------------------------------------------
+        :param query:    Search query to GS
+        :param outdir:   Folder where store CSV with results
+        :param verbose:  Show messages
+        :param workers:  Number of entries enriched at the same time per slice
+        :param parallel: Number of slices run at the same time
+        :param years:    (first, last) publication years of the query
+
+    Returns the merged CSV.
+    """
+    shards = YearShards(query, outdir, years)
+
+    def count ( slice_years: typing.Tuple[int,int] ) -> int:
+        scraper = ScraperGooleScholar()
+        scraper.years = slice_years
+        return scraper.check_availability(query, verbose, vpn)
+
+    slices = shards.plan(count, verbose)
+
+    def harvest ( shard: typing.Tuple[typing.Tuple[int,int],int] ) -> typing.Dict:
+        slice_years, available = shard
+        folder = shards.folder(slice_years)
+        folder.mkdir(parents=True, exist_ok=True)
+        try:
+            written, error = run(query, available, folder, vpn, verbose, workers, years=slice_years), None
+        except Exception as e:
+            written, error = 0, e
+            print(f"[ Shard Error ] Slice {slice_years[0]}-{slice_years[1]} failed: {e}")
+        return {'years': slice_years, 'entries': written, 'error': error}
+
+    with ThreadPoolExecutor(max_workers=max(1, parallel), thread_name_prefix='gscraper-shard') as pool:
+        results = list(pool.map(harvest, slices))
+
+    outfile, papers = shards.merge(slices)
+    if (verbose):
+        failed = sum(result['error'] is not None for result in results)
+        print(f"Shards: {len(slices) - failed}/{len(slices)} slices, {papers} papers merged in {outfile}")
+    return outfile
+
+
+def print_stats ( ):
+    """ Statistics of the caches, rate limits, retries and stages of the run """
+
+    if CrossrefAPI.INDEX is not None:
+        stats = CrossrefAPI.INDEX.stats()
+        print(f"Crossref index: {stats['hits']} hits, {stats['misses']} misses ({stats['works']} indexed works)")
+
+    if ScraperGooleScholar.PAPERS is not None:
+        stats = ScraperGooleScholar.PAPERS.stats()
+        print(f"Paper store: {stats['hits']} hits, {stats['misses']} misses ({stats['papers']} stored papers)")
+
+    if CrossrefAPI.CACHE is not None:
+        stats = CrossrefAPI.CACHE.stats()
+        print(f"Crossref cache: {stats['hits']} hits, {stats['misses']} misses ({stats['size']} stored lookups)")
+
+    stats = GenderPredictor.INFERENCE.stats()
+    print(f"Name inference: {stats['requests']['genderize']} Genderize and "
+          f"{stats['requests']['nationalize']} Nationalize requests, "
+          f"{stats['memory']['hits']} names answered from cache")
+    if 'table' in stats:
+        print(f"Name table: {stats['table']['hits']} hits, {stats['table']['misses']} misses ({stats['table']['names']} names)")
+
+    for host, stats in RateLimiter.SHARED.stats().items():
+        print(f"Rate limit {host}: {stats['rate']} req/s, {stats['slept']} s waiting")
+
+    for service, retries in Retrier.stats()['retries'].items():
+        print(f"Retries {service}: {retries}")
+
+    if Proxy.POOL is not None:
+        print(f"Proxy pool: {Proxy.POOL.rotations} rotations")
+
+    if Cassette.ACTIVE is not None:
+        stats = Cassette.ACTIVE.stats()
+        print(f"Cassette ({stats['mode']}): {stats['recorded']} recorded, {stats['replayed']} replayed, {stats['missing']} missing")
+
+    for stage, stats in Metrics.SHARED.report()['stages'].items():
+        print(f"Stage {stage}: {stats['count']} calls, {stats['total']} s, p50 {stats['p50']} s, p90 {stats['p90']} s, p99 {stats['p99']} s")
 
 
 def main():
@@ -64,15 +585,111 @@ def main():
 
     parser.add_argument('-q', '--query', type=str, default=None,
                         help='Set a custom in-line query with the search to Google Scholar.')
+
+    parser.add_argument('-qf', '--queries-file', type=str, default=None,
+                        help='Set a file with one query per line, scraped in a single process sharing caches, proxies and the GS budget.')
+
+    parser.add_argument('--parallel-queries', type=int, default=3,
+                        help='Set the number of queries of --queries-file, or of year slices of --shard-years, run at the same time.')
     
+    parser.add_argument('--shard-years', type=str, nargs='?', default=None, const=f"{YearShards.FIRST_YEAR}-",
+                        metavar='FIRST-LAST',
+                        help='Harvest past the 1000 results cap splitting the query in publication-year slices, '
+                             f'e.g. 1950-2024. Without value: {YearShards.FIRST_YEAR} to the current year. --numentries is ignored.')
+
+    parser.add_argument('--refresh', action='store_true',
+                        help='Citations-only refresh: update rank and citations of the papers already stored and enrich only the new ones.')
+
+    parser.add_argument('--phase', type=str, default='all', choices=['all', 'harvest', 'enrich'],
+                        help='Run only one phase of the job: harvest saves the GS records in <query>.raw.jsonl without enriching them, '
+                             'enrich enriches the saved records without requesting GS. Default: both.')
+
+    parser.add_argument('--reenrich', action='store_true',
+                        help='Enrich again every saved GS record, bypassing the stored papers, and replace the CSV once finished. Implies --phase enrich.')
+
+    parser.add_argument('--coordinator', type=str, default=None, metavar='QUEUE',
+                        help='Split the queries in GS page-range tasks queued in the SQLite file QUEUE and merge the rows of the workers.')
+
+    parser.add_argument('--worker', type=str, default=None, metavar='QUEUE',
+                        help='Run the tasks of the SQLite work queue QUEUE of a coordinator until it is finished. No query is needed.')
+
+    parser.add_argument('--local-workers', type=int, default=0,
+                        help='Set the number of workers the coordinator starts on this host with the same options.')
+
+    parser.add_argument('--task-size', type=int, default=50,
+                        help='Set the number of entries of each task of the work queue, rounded to whole GS pages.')
+
+    parser.add_argument('--lease', type=float, default=600,
+                        help='Set the seconds a task is reserved to a worker without a renewal before another worker can claim it.')
+
     parser.add_argument('-n', '--numentries', type=int, default=1000,
                         help='Set of entries to be retrieved from the query.')
 
     parser.add_argument('-od', '--outdir', type=str, default=".",
                         help='Set a custom path for the directory where the search .CSV files should be stored.')
 
+    parser.add_argument('-o', '--output', type=str, default='csv', choices=['csv', 'parquet'],
+                        help="Set the output format: 'csv' or 'parquet' (typed columns, partitioned by query and date in <outdir>/parquet, requires pyarrow).")
+
     parser.add_argument('-vpn', '--vpntype', type=str, default="desktop",
-                        help='Set if your are using ProtonVPN in desktop app or in cmd.')
+                        help="Set if your are using ProtonVPN in desktop app or in cmd, or 'pool' to rotate the proxies of --proxies.")
+
+    parser.add_argument('-px', '--proxies', type=str, default=None,
+                        help="Set a file with one HTTP/SOCKS proxy URL per line, used when --vpntype is 'pool'.")
+
+    parser.add_argument('--proxy-check-url', type=str, default=None,
+                        help='Set the URL used to check the health of the proxies of the pool.')
+
+    parser.add_argument('-f', '--fetcher', type=str, default='scholarly', choices=['scholarly', 'native'],
+                        help="Set the Google Scholar client: 'scholarly' or 'native' (keep-alive session, one request and parse per result page).")
+
+    parser.add_argument('-w', '--workers', type=int, default=4,
+                        help='Set the number of entries enriched with Crossref and name inference at the same time.')
+
+    parser.add_argument('-m', '--mailto', type=str, default=None,
+                        help='Set a contact email sent to Crossref to use its faster polite pool.')
+
+    parser.add_argument('--crossref-concurrency', type=int, default=CrossrefClient.IN_FLIGHT,
+                        help='Set the maximum number of Crossref requests in flight when a GS page is resolved at once.')
+
+    parser.add_argument('-ci', '--crossref-index', type=str, default=None,
+                        help='Set a local Crossref index (built with python -m ScraperGoogleScholar._crossref_index) queried before the live API.')
+
+    parser.add_argument('-nt', '--name-table', type=str, default=None,
+                        help='Set a CSV name table (service,name,country_id,gender,probability,count) answering gender and nationality before the APIs. API answers are appended to it.')
+
+    parser.add_argument('-r', '--rate', type=str, action='append', default=None, metavar='HOST=RPS',
+                        help='Set the requests per second allowed for a host, e.g. scholar.google.com=0.1. Can be repeated.')
+
+    parser.add_argument('-cd', '--cachedir', type=str, default=None,
+                        help='Set a custom path for the directory where the lookup caches are stored. Default: <outdir>/.cache')
+
+    parser.add_argument('--cache-ttl', type=float, default=30,
+                        help='Days before a cached lookup expires. Use 0 to never expire.')
+
+    parser.add_argument('--cache-size', type=int, default=100000,
+                        help='Maximum number of lookups stored in each cache.')
+
+    parser.add_argument('--availability-ttl', type=float, default=7,
+                        help='Days before the number of results available for a query is checked again. Use 0 to never expire.')
+
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Disable the persistent lookup caches.')
+
+    parser.add_argument('--record', type=str, default=None, metavar='ARCHIVE',
+                        help='Record every request made to Google Scholar, Crossref, Genderize and Nationalize in a zip archive.')
+
+    parser.add_argument('--replay', type=str, default=None, metavar='ARCHIVE',
+                        help='Replay a run offline from an archive created with --record.')
+
+    parser.add_argument('--report', type=str, default=None, metavar='FILE',
+                        help='Write a JSON report with the latency of each stage, retries, cache hit ratios and time slept.')
+
+    parser.add_argument('--prometheus', type=str, default=None, metavar='FILE',
+                        help='Write the run metrics in a Prometheus textfile, refreshed during the run.')
+
+    parser.add_argument('--progress', action='store_true',
+                        help='Show a live progress line with the entries per hour and the estimated time left.')
 
     parser.add_argument('-v', '--verbose', type=bool, default=True,
                         help='Verbose mode.')
@@ -81,10 +698,67 @@ def main():
 
 
     # Arguments validation
-    if args.query is None:
-        print("[ Input Error ] Provide at least one of the following arguments: --query or -q")
+    if args.query is None and args.queries_file is None and args.worker is None:
+        print("[ Input Error ] Provide at least one of the following arguments: --query, -q, --queries-file or -qf")
+        sys.exit()
+
+    if args.query is not None and args.queries_file is not None:
+        print("[ Input Error ] Provide only one of the arguments --query or --queries-file")
+        sys.exit()
+
+    if args.reenrich:
+        args.phase = 'enrich'
+
+    if args.phase != 'all' and args.refresh:
+        print("[ Input Error ] --refresh can not be used with --phase or --reenrich")
         sys.exit()
 
+    if args.coordinator is not None or args.worker is not None:
+        if args.coordinator is not None and args.worker is not None:
+            print("[ Input Error ] Provide only one of the arguments --coordinator or --worker")
+            sys.exit()
+        if args.refresh or args.phase != 'all' or args.shard_years is not None:
+            print("[ Input Error ] --coordinator and --worker can not be used with --refresh, --phase, --reenrich or --shard-years")
+            sys.exit()
+
+    if args.output == 'parquet':
+        if args.refresh or args.reenrich or args.shard_years is not None:
+            print("[ Input Error ] --output parquet can not be used with --refresh, --reenrich or --shard-years")
+            sys.exit()
+        try:
+            ParquetSink.require()
+        except ImportError as e:
+            print(e)
+            sys.exit()
+
+    if args.shard_years is not None:
+        if args.queries_file is not None or args.refresh or args.phase != 'all':
+            print("[ Input Error ] --shard-years can not be used with --queries-file, --refresh, --phase or --reenrich")
+            sys.exit()
+        try:
+            shard_years = YearShards.parse_years(args.shard_years)
+        except ValueError as e:
+            print(e)
+            sys.exit()
+
+    if args.queries_file is not None:
+        if not Path(args.queries_file).exists():
+            print(f"[ Input Error ] The queries file {args.queries_file} does not exist")
+            sys.exit()
+        queries = read_queries(args.queries_file)
+        if not queries:
+            print(f"[ Input Error ] The queries file {args.queries_file} has no queries")
+            sys.exit()
+
+        # Each query needs its own CSV
+        outfiles = dict()
+        for query in queries:
+            outfile = ScraperGooleScholar.get_outfile(query, '.').name
+            if outfile in outfiles:
+                print(f"[ Input Error ] The queries '{outfiles[outfile]}' and '{query}' would be written to the same file {outfile}")
+                sys.exit()
+            outfiles[outfile] = query
+
     if args.numentries is None and args.numentries > 1000:
         print("[ Input Error ] Provide a number in a range of 0-1000 or provide at \
                     least one of the following arguments: --numentries or -n")
@@ -99,21 +773,100 @@ def main():
         outdir.mkdir(parents=True,exist_ok=True)
 
     if args.vpntype is None:
-        print("[ Input Error ] Provide with the arguments --vpntype or -vpn the options 'desktop' or 'cmd' ")
+        print("[ Input Error ] Provide with the arguments --vpntype or -vpn the options 'desktop', 'cmd' or 'pool' ")
         sys.exit()
 
     if args.verbose is None:
         print("[ Input Error ] Provide with the arguments --verbose or -v the options 'desktop' or 'cmd' ")
         sys.exit()
 
+    if args.record is not None and args.replay is not None:
+        print("[ Input Error ] Provide only one of the arguments --record or --replay")
+        sys.exit()
+
+    try:
+        limits = RateLimiter.parse_limits(args.rate)
+    except ValueError as e:
+        print(e)
+        sys.exit()
+
+    if args.replay is not None:
+        # Offline run: nothing to throttle unless limits are given
+        limits = { **{ host: 1e6 for host in RateLimiter.LIMITS }, **limits }
+        Cassette(args.replay, 'replay').install()
+    elif args.record is not None:
+        Cassette(args.record, 'record').install()
+
+    RateLimiter.configure(limits)
+    ScraperGooleScholar.FETCHER = args.fetcher
+    ScraperGooleScholar.OUTPUT = args.output
+    CrossrefClient.configure(args.mailto, args.crossref_concurrency)
+
+    if args.crossref_index is not None:
+        if not Path(args.crossref_index).exists():
+            print(f"[ Input Error ] The Crossref index {args.crossref_index} does not exist")
+            sys.exit()
+        CrossrefAPI.set_index(args.crossref_index)
+
+    if args.name_table is not None:
+        GenderPredictor.set_table(args.name_table)
+
+    if args.vpntype == 'pool':
+        if args.proxies is None:
+            print("[ Input Error ] Provide a proxy list with the arguments --proxies or -px to use the 'pool' option")
+            sys.exit()
+        Proxy.set_pool(args.proxies, check_url=args.proxy_check_url)
+
+    if not args.no_cache:
+        cachedir = Path(args.cachedir) if args.cachedir is not None else Path(args.outdir) / '.cache'
+        cachedir.mkdir(parents=True, exist_ok=True)
+        CrossrefAPI.set_cache(str(cachedir / 'crossref.sqlite'), ttl=args.cache_ttl * 86400, maxsize=args.cache_size)
+        GenderPredictor.set_cache(str(cachedir / 'names.sqlite'), ttl=args.cache_ttl * 86400, maxsize=args.cache_size)
+        AvailabilityProbe.set_cache(str(cachedir / 'availability.sqlite'), ttl=args.availability_ttl * 86400)
+        # A re-enrichment must not reuse the stored papers it is replacing
+        if not args.reenrich:
+            ScraperGooleScholar.set_papers(str(cachedir / 'papers.sqlite'), ttl=args.cache_ttl * 86400)
+
     if (args.verbose):
         print("Google Scholar Scraper.")
         print("Query processed:")
-        print(f"query: {args.query} - {args.numentries} entries.")
+        if args.worker is not None:
+            print(f"Worker of the queue {args.worker}")
+        elif args.queries_file is not None:
+            print(f"queries: {len(queries)} from {args.queries_file} - {args.numentries} entries each.")
+        else:
+            print(f"query: {args.query} - {args.numentries} entries.")
         print(f"Output path: {args.outdir}")
 
+    Metrics.reset(progress=args.progress).export_to(args.report, args.prometheus)
+
     # Execution
-    run ( args.query, args.numentries, outdir, args.vpntype, args.verbose )
+    try:
+        if args.worker is not None:
+            work ( WorkQueue(args.worker), args.vpntype, args.verbose, args.workers, args.lease )
+        elif args.coordinator is not None:
+            coordinate ( queries if args.queries_file is not None else [args.query], args.numentries, outdir, args.vpntype, args.verbose,
+                         WorkQueue(args.coordinator), args.task_size, args.local_workers, worker_argv(sys.argv[1:], args.coordinator) )
+        elif args.queries_file is not None:
+            mode = 'refresh' if args.refresh else 'reenrich' if args.reenrich else args.phase
+            run_batch ( queries, args.numentries, outdir, args.vpntype, args.verbose, args.workers, args.parallel_queries, mode )
+        elif args.shard_years is not None:
+            run_sharded ( args.query, outdir, args.vpntype, args.verbose, args.workers, args.parallel_queries, shard_years )
+        elif args.refresh:
+            refresh ( args.query, args.numentries, outdir, args.vpntype, args.verbose, args.workers )
+        elif args.phase == 'harvest':
+            harvest ( args.query, args.numentries, outdir, args.vpntype, args.verbose, args.workers )
+        elif args.phase == 'enrich':
+            enrich ( args.query, args.numentries, outdir, args.vpntype, args.verbose, args.workers, args.reenrich )
+        else:
+            run ( args.query, args.numentries, outdir, args.vpntype, args.verbose, args.workers )
+
+        if (args.verbose):
+            print_stats()
+    finally:
+        Metrics.SHARED.finish()
+        if GenderPredictor.INFERENCE.table is not None:
+            GenderPredictor.INFERENCE.table.flush()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+from typing import Callable, Optional, Tuple
+from ._cache import ResultCache
+from ._ratelimit import RateLimiter
+from ._metrics import Metrics
+from ._proxy import Proxy
+from ._gsfetch import GSFetcher, GSParser
+
+class AvailabilityProbe:
+    """
+    Number of results that Google Scholar really serves for a query. Instead
+    of walking the last pages one by one, the last page with results is found
+    with a galloping search down from the last page followed by a binary
+    search, so a query with every page available costs a single request and
+    any other query a few. Requests go through the shared rate limiter and the
+    keep-alive session of the native fetcher, and the answer is cached per query.
+    --------------------------------------------------------------------
+    """
+
+    # Main Params
+    HOST = 'scholar.google.com'
+    MAX_RESULTS = 1000
+    PAGE_SIZE = 10
+
+    # Persistent cache of the probes, disabled until set_cache is called
+    CACHE = None
+
+
+    def set_cache ( path:str, ttl:float = None ) -> ResultCache:
+        """
+        Enable the persistent cache of the probes.
+        ------------------------------------
+            :param path: SQLite file where the probes are stored
+            :param ttl:  Seconds before a cached probe expires
+
+        """
+        AvailabilityProbe.CACHE = ResultCache(path, 'availability', ttl=ttl)
+        return AvailabilityProbe.CACHE
+
+
+    def count ( query:str, probe:Optional[Callable[[int],int]] = None, verbose:bool = False,
+                years:Optional[Tuple[int,int]] = None ) -> int:
+        """
+        Number of results available for a query, from the cache or probing GS.
+        ------------------------------------
+            :param query:   Search query to GS
+            :param probe:   Function returning the results of the page at a start offset
+            :param verbose: Show messages
+            :param years:   (first, last) publication years of the results, None for every year
+
+        """
+        key = query if years is None else f"{query} as_ylo={years[0]} as_yhi={years[1]}"
+        cached = AvailabilityProbe.CACHE.get(key) if AvailabilityProbe.CACHE is not None else None
+        if cached is not None:
+            if (verbose):
+                print(f"Total number of links for query '{key}': {cached['count']} (cached)")
+            return cached['count']
+
+        probe = probe or (lambda start: AvailabilityProbe.page_results(query, start, years))
+        with Metrics.SHARED.timer('availability'):
+            count, requests_sent = AvailabilityProbe.search(probe)
+
+        if AvailabilityProbe.CACHE is not None:
+            AvailabilityProbe.CACHE.set(key, {'count': count, 'checked': time.time()})
+
+        if (verbose):
+            print(f"Total number of links for query '{key}': {count} ({requests_sent} pages probed)")
+        return count
+
+
+    def search ( probe:Callable[[int],int] ):
+        """
+        Galloping + binary search of the last page with results.
+        Returns the number of results and the number of probed pages.
+        ------------------------------------
+            :param probe: Function returning the results of the page at a start offset
+
+        """
+        size = AvailabilityProbe.PAGE_SIZE
+        last = (AvailabilityProbe.MAX_RESULTS - 1) // size
+        probed = 1
+
+        # Most queries serve every page: a single request
+        rows = probe(last * size)
+        if rows:
+            return last * size + rows, probed
+
+        # Gallop down until a page with results is found
+        high, step, low, low_rows = last, 1, None, 0
+        while low is None:
+            page = max(0, high - step)
+            rows = probe(page * size)
+            probed += 1
+            if rows:
+                low, low_rows = page, rows
+            elif page == 0:
+                return 0, probed
+            else:
+                high, step = page, step * 2
+
+        # Binary search between the last page with results and the first without
+        while high - low > 1:
+            middle = (low + high) // 2
+            rows = probe(middle * size)
+            probed += 1
+            if rows:
+                low, low_rows = middle, rows
+            else:
+                high = middle
+
+        return low * size + low_rows, probed
+
+
+    def page_results ( query:str, start:int, years:Optional[Tuple[int,int]] = None ) -> int:
+        """
+        Results in the GS page at a start offset, 0 if the page is empty.
+        Blocks and CAPTCHAs raise so the caller can rotate the proxy.
+        ------------------------------------
+            :param query: Search query to GS
+            :param start: Offset of the first result of the page
+            :param years: (first, last) publication years of the results, None for every year
+
+        """
+        RateLimiter.SHARED.acquire(AvailabilityProbe.HOST)
+        began = time.monotonic()
+        try:
+            rows = GSParser.count(GSFetcher.get('/scholar', GSFetcher.search_params(query, start, years)))
+        except Exception as e:
+            status = getattr(getattr(e, 'response', None), 'status_code', None)
+            if status in (403, 429) or 'captcha' in str(e).lower():
+                RateLimiter.SHARED.penalize(AvailabilityProbe.HOST, RateLimiter.retry_after(getattr(e, 'response', None)))
+            Proxy.report(False)
+            raise
+
+        RateLimiter.SHARED.reward(AvailabilityProbe.HOST)
+        Proxy.report(True, time.monotonic() - began)
+        return rows
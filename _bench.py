@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+import argparse
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from ._standin import StandIns, Corpus
+from ._ratelimit import RateLimiter
+from ._crossref import CrossrefAPI
+from ._demografix import GenderPredictor
+from ._names import NameInference
+from ._scraper import ScraperGooleScholar
+from ._resume import CSVWriter, ResumeIndex
+from ._metrics import Metrics
+from ._gsfetch import GSParser
+from . import __main__ as cli
+
+def bench_run ( entries:int, workers:int, latency:Dict[str,float], error_rate:Dict[str,float],
+                burst_every:Dict[str,int], burst_size:int, gs_rate:float ) -> Dict:
+    """
+    Full run() path against the local stand-in services.
+    ------------------------------------
+        :param entries:     Number of entries to scrape
+        :param workers:     Number of entries enriched at the same time
+        :param latency:     Mean seconds added by each stand-in
+        :param error_rate:  Probability of a 500 answer of each stand-in
+        :param burst_every: A burst of 429 answers every N requests of each stand-in
+        :param burst_size:  Number of 429 answers of each burst
+        :param gs_rate:     Google Scholar requests per second allowed
+
+    """
+    standins = StandIns(Corpus(), latency=latency, error_rate=error_rate,
+                        burst_every=burst_every, burst_size=burst_size).start().install()
+    metrics = Metrics.reset()
+
+    # Cold caches and only the GS budget limits the run
+    RateLimiter.configure({ **{ host: 1e6 for host in RateLimiter.LIMITS }, 'scholar.google.com': gs_rate })
+    CrossrefAPI.CACHE = None
+    GenderPredictor.INFERENCE = NameInference()
+
+    try:
+        with tempfile.TemporaryDirectory() as outdir:
+            start = time.perf_counter()
+            cli.run('stand-in benchmark query', entries, outdir, 'none', False, workers)
+            elapsed = time.perf_counter() - start
+
+            outfile = ScraperGooleScholar.get_outfile('stand-in benchmark query', outdir)
+            written = len(ResumeIndex(outfile)) if outfile.exists() else 0
+    finally:
+        standins.stop()
+
+    report = metrics.report()
+    return {
+        'entries': written,
+        'seconds': round(elapsed, 3),
+        'entries_per_sec': round(written / elapsed, 3) if elapsed else 0.0,
+        'stages': report['stages'],
+        'requests': standins.num_requests(),
+        'counters': report['counters']
+    }
+
+
+def bench_csv ( rows:int ) -> Dict[str,float]:
+    """ CSV write, resume from the sidecar index and resume from a CSV scan """
+    entry = { field: 'x' * 20 for field in ScraperGooleScholar.FIELDNAMES }
+
+    with tempfile.TemporaryDirectory() as outdir:
+        outfile = Path(outdir) / 'bench.csv'
+
+        start = time.perf_counter()
+        writer = CSVWriter(outfile, ScraperGooleScholar.FIELDNAMES, ScraperGooleScholar.FLUSH_EVERY)
+        for rank in range(1, rows + 1):
+            writer.write({ **entry, ScraperGooleScholar.GSRANK_KEY: str(rank) })
+        writer.close()
+        write = time.perf_counter() - start
+
+        start = time.perf_counter()
+        ResumeIndex(outfile)
+        sidecar = time.perf_counter() - start
+
+        os.remove(str(outfile) + ResumeIndex.SUFFIX)
+        start = time.perf_counter()
+        ResumeIndex(outfile)
+        scan = time.perf_counter() - start
+
+    return {
+        'rows': rows,
+        'write_rows_per_sec': round(rows / write, 1),
+        'resume_sidecar_ms': round(sidecar * 1000, 3),
+        'resume_csv_scan_ms': round(scan * 1000, 3)
+    }
+
+
+def bench_parse ( pages:int, saved:Optional[str] = None ) -> Dict[str,Dict[str,float]]:
+    """
+    Parsing of GS result pages with the scholarly parser and the native one.
+    ------------------------------------
+        :param pages: Number of pages parsed by each parser
+        :param saved: Folder with saved GS result pages (*.html). Stand-in pages if None
+
+    """
+    from bs4 import BeautifulSoup
+    from scholarly.publication_parser import PublicationParser
+    from scholarly.data_types import PublicationSource
+
+    class Navigator:
+        publib = '/citations?hl=en&info={id}&json='
+
+    if saved is not None:
+        html = [ path.read_text(encoding='utf-8') for path in sorted(Path(saved).glob('*.html')) ]
+        if not html:
+            raise FileNotFoundError(f"[ Bench Error ] No .html pages in {saved}")
+        html = [ html[page % len(html)] for page in range(pages) ]
+    else:
+        corpus = Corpus()
+        html = [ StandIns.scholar_page(corpus, 'benchmark', (page % 100) * 10) for page in range(pages) ]
+
+    parser = PublicationParser(Navigator())
+
+    def scholarly_parse( page ):
+        soup = BeautifulSoup(page, 'html.parser')
+        return [ parser.get_publication(row, PublicationSource.PUBLICATION_SEARCH_SNIPPET)
+                 for row in soup.find_all('div', class_='gs_r gs_or gs_scl') ]
+
+    def native_parse( page ):
+        return GSParser.parse(page)[0]
+
+    results = dict()
+    for name, parse in (('scholarly', scholarly_parse), ('native', native_parse)):
+        start = time.perf_counter()
+        parsed = sum(len(parse(page)) for page in html)
+        elapsed = time.perf_counter() - start
+        results[name] = {'pages': pages, 'results': parsed, 'pages_per_sec': round(pages / elapsed, 1)}
+
+    # Both parsers must agree on the fields read by the scraper
+    fields = lambda result: (result['gsrank'], result['bib']['title'], result['bib']['author'], result['bib']['pub_year'],
+                             result['author_id'], result['num_citations'], result.get('pub_url'), result['url_scholarbib'])
+    results['same_fields'] = all(list(map(fields, scholarly_parse(page))) == list(map(fields, native_parse(page))) for page in html[:20])
+    return results
+
+
+def host_values ( values:List[str], cast ) -> Dict[str,float]:
+    """ Parse HOST=VALUE arguments, 'all' applies to every stand-in """
+    parsed = dict()
+    for value in values or []:
+        host, _, number = value.partition('=')
+        hosts = StandIns.HANDLERS if host == 'all' else [host]
+        for name in hosts:
+            parsed[name] = cast(number)
+    return parsed
+
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        description='Benchmark of the scraper against local stand-ins of Google Scholar, Crossref, Genderize and Nationalize')
+
+    parser.add_argument('-n', '--numentries', type=int, default=50,
+                        help='Number of entries scraped in the full run benchmark.')
+
+    parser.add_argument('-w', '--workers', type=int, default=4,
+                        help='Number of entries enriched at the same time.')
+
+    parser.add_argument('--latency', type=str, action='append', default=None, metavar='HOST=SECONDS',
+                        help="Mean latency added by a stand-in ('all' for every host). Can be repeated.")
+
+    parser.add_argument('--error-rate', type=str, action='append', default=None, metavar='HOST=PROBABILITY',
+                        help="Probability of a 500 answer of a stand-in ('all' for every host). Can be repeated.")
+
+    parser.add_argument('--burst-every', type=str, action='append', default=None, metavar='HOST=REQUESTS',
+                        help="A burst of 429 answers every N requests of a stand-in. Can be repeated.")
+
+    parser.add_argument('--burst-size', type=int, default=3,
+                        help='Number of 429 answers of each burst.')
+
+    parser.add_argument('--gs-rate', type=float, default=100.0,
+                        help='Google Scholar requests per second allowed during the benchmark.')
+
+    parser.add_argument('--csv-rows', type=int, default=1000,
+                        help='Rows written in the CSV micro-benchmark.')
+
+    parser.add_argument('--pages', type=int, default=200,
+                        help='Result pages parsed in the parsing micro-benchmark.')
+
+    parser.add_argument('--saved-pages', type=str, default=None, metavar='FOLDER',
+                        help='Folder with saved Google Scholar result pages (*.html) for the parsing micro-benchmark.')
+
+    parser.add_argument('--fetcher', type=str, default='scholarly', choices=['scholarly', 'native'],
+                        help='Google Scholar client used in the full run benchmark.')
+
+    parser.add_argument('--skip-run', action='store_true',
+                        help='Only run the micro-benchmarks.')
+
+    parser.add_argument('-o', '--output', type=str, default=None,
+                        help='Write the results as JSON in this file.')
+
+    args = parser.parse_args()
+
+    results = dict()
+    if not args.skip_run:
+        ScraperGooleScholar.FETCHER = args.fetcher
+        results['run'] = bench_run(args.numentries, args.workers,
+                                   host_values(args.latency, float), host_values(args.error_rate, float),
+                                   host_values(args.burst_every, int), args.burst_size, args.gs_rate)
+    results['csv'] = bench_csv(args.csv_rows)
+    results['parse'] = bench_parse(args.pages, args.saved_pages)
+
+    print(json.dumps(results, indent=2))
+
+    if args.output is not None:
+        with open(args.output, 'w', encoding='utf-8') as outfile:
+            json.dump(results, outfile, indent=2)
+
+
+if __name__ == "__main__":
+    main()
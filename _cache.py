@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import re
+import json
+import atexit
+import time
+import sqlite3
+import threading
+from pathlib import Path
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from ._metrics import Metrics
+
+class ResultCache:
+    """
+    Persistent key/value cache stored in a SQLite file. Values are saved as JSON
+    so any lookup result (Crossref, Genderize, Nationalize...) can be stored.
+    The access times of the hits are written in batches, and once the cache
+    is full the least recently used entries are evicted in batches, walking
+    the index on the access time, so a lookup never sorts the table.
+    --------------------------------------------------------------------
+        :param path:    SQLite file. ':memory:' keeps the cache in RAM
+        :param table:   Table name, one table per kind of lookup
+        :param ttl:     Seconds before an entry expires. None or 0 never expires
+        :param maxsize: Maximum number of entries. Least recently used are evicted
+
+    """
+
+    # Main Params
+    ACCESS_BATCH = 100
+    EVICT_FRACTION = 0.01
+
+    def __init__( self, path:str, table:str, ttl:Optional[float]=None, maxsize:Optional[int]=None ):
+        if not re.fullmatch(r'[A-Za-z_][A-Za-z0-9_]*', table):
+            raise ValueError(f"[ Cache Error ] Invalid cache table name: {table}")
+
+        if path != ':memory:':
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+
+        self.path = str(path)
+        self.table = table
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(f'CREATE TABLE IF NOT EXISTS {table} ('
+                           'key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+                           'created REAL NOT NULL, accessed REAL NOT NULL)')
+        self._conn.execute(f'CREATE INDEX IF NOT EXISTS {table}_accessed ON {table} (accessed)')
+        self._conn.commit()
+
+        # Upper bound of the number of entries (replaced keys are counted twice) and access times not written yet
+        self._size = self._conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+        self._accessed = dict()
+        atexit.register(self.flush)
+
+
+    def normalize ( key:str ) -> str:
+        """ Normalized form of a key: lower case, no quotes and single spaces """
+        return ' '.join(key.replace('"', ' ').lower().split())
+
+
+    def get ( self, key:str ) -> Optional[Any]:
+        """
+        Return the cached value of a key or None if it is missing or expired.
+        ------------------------------------
+            :param key: Lookup key, it is normalized before the query
+
+        """
+        key = ResultCache.normalize(key)
+        now = time.time()
+
+        with self._lock:
+            row = self._conn.execute(
+                f'SELECT value, created FROM {self.table} WHERE key = ?', (key,)).fetchone()
+
+            if row is None or (self.ttl and now - row[1] > self.ttl):
+                if row is not None:
+                    self._conn.execute(f'DELETE FROM {self.table} WHERE key = ?', (key,))
+                    self._conn.commit()
+                    self._size -= 1
+                self.misses += 1
+                Metrics.SHARED.count('cache_lookups', cache=self.table, result='miss')
+                return None
+
+            self._accessed[key] = now
+            if len(self._accessed) >= ResultCache.ACCESS_BATCH:
+                self.write_accessed()
+                self._conn.commit()
+            self.hits += 1
+
+        Metrics.SHARED.count('cache_lookups', cache=self.table, result='hit')
+        return json.loads(row[0])
+
+
+    def get_many ( self, keys:list ) -> Dict[str,Any]:
+        """ Cached values for several keys. Missing keys are not returned """
+        found = dict()
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                found[key] = value
+        return found
+
+
+    def set ( self, key:str, value:Any ) -> None:
+        """
+        Store a value and evict the least recently used entries if the
+        cache is bigger than maxsize.
+        ------------------------------------
+            :param key:   Lookup key, it is normalized before storing
+            :param value: JSON serializable value
+
+        """
+        key = ResultCache.normalize(key)
+        now = time.time()
+
+        with self._lock:
+            self._accessed.pop(key, None)
+            self._conn.execute(
+                f'INSERT OR REPLACE INTO {self.table} (key, value, created, accessed) VALUES (?, ?, ?, ?)',
+                (key, json.dumps(value), now, now))
+            self._size += 1
+
+            if self.maxsize and self._size > self.maxsize:
+                self.evict()
+            self._conn.commit()
+
+
+    def write_accessed ( self ) -> None:
+        """ Write the access times of the hits (the lock is held) """
+        if self._accessed:
+            self._conn.executemany(f'UPDATE {self.table} SET accessed = ? WHERE key = ?',
+                                   [ (accessed, key) for key, accessed in self._accessed.items() ])
+            self._accessed = dict()
+
+
+    def evict ( self ) -> None:
+        """ Remove the least recently used entries above maxsize, and a batch more so the next inserts do not evict (the lock is held) """
+        self._size = self._conn.execute(f'SELECT COUNT(*) FROM {self.table}').fetchone()[0]
+        if self._size <= self.maxsize:
+            return
+        self.write_accessed()
+        excess = self._size - self.maxsize + int(self.maxsize * ResultCache.EVICT_FRACTION)
+        cursor = self._conn.execute(
+            f'DELETE FROM {self.table} WHERE key IN (SELECT key FROM {self.table} ORDER BY accessed LIMIT ?)', (excess,))
+        self._size -= cursor.rowcount
+
+
+    def purge ( self ) -> int:
+        """ Remove expired entries. Returns the number of removed rows """
+        if not self.ttl:
+            return 0
+        with self._lock:
+            cursor = self._conn.execute(
+                f'DELETE FROM {self.table} WHERE created < ?', (time.time() - self.ttl,))
+            self._conn.commit()
+            self._size -= cursor.rowcount
+        return cursor.rowcount
+
+
+    def __len__ ( self ) -> int:
+        with self._lock:
+            return self._conn.execute(f'SELECT COUNT(*) FROM {self.table}').fetchone()[0]
+
+
+    def stats ( self ) -> Dict[str,Any]:
+        """ Hit/miss counters of the cache """
+        total = self.hits + self.misses
+        return {
+            'table': self.table,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / total, 4) if total else 0.0,
+            'size': len(self)
+        }
+
+
+    def flush ( self ) -> None:
+        """ Write the pending access times """
+        with self._lock:
+            self.write_accessed()
+            self._conn.commit()
+
+
+    def close ( self ) -> None:
+        self.flush()
+        atexit.unregister(self.flush)
+        with self._lock:
+            self._conn.close()
+
+
+class LRUCache:
+    """
+    Small in-process least recently used cache shared between threads.
+    --------------------------------------------------------------------
+        :param maxsize: Maximum number of entries kept in memory
+
+    """
+
+    def __init__( self, maxsize:int=4096 ):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+
+    def get ( self, key:str ) -> Optional[Any]:
+        """ Value of a key or None if it is not in memory """
+        with self._lock:
+            if key not in self._data:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return self._data[key]
+
+
+    def set ( self, key:str, value:Any ) -> None:
+        """ Store a value and drop the oldest entries above maxsize """
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+
+    def __len__ ( self ) -> int:
+        return len(self._data)
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import base64
+import atexit
+import hashlib
+import zipfile
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+class CassetteMiss(Exception):
+    """ The request is not in the archive being replayed """
+
+
+class Cassette:
+    """
+    Record/replay of every outbound HTTP request. The archive is a compressed
+    zip where each response is stored under the SHA-256 of its request
+    (method, URL with sorted parameters and body), so a recorded run can be
+    replayed fully offline. Requests made with `requests` (name APIs, native GS
+    fetcher) and with `httpx`, blocking or async (scholarly, Crossref), are captured.
+    While recording, each response is appended to a JSONL journal next to the
+    archive. The journal is folded in the archive when the cassette is
+    uninstalled, by writing a new zip aside and moving it over the old one,
+    so a crash never leaves a broken archive: the journal it leaves is folded
+    when the archive is opened again.
+    --------------------------------------------------------------------
+        :param path: Zip archive
+        :param mode: 'record' or 'replay'
+
+    """
+
+    # Headers that do not apply to the stored (already decoded) body
+    DROP_HEADERS = ('content-encoding', 'content-length', 'transfer-encoding')
+
+    # Archive in use, only one can be installed
+    ACTIVE = None
+
+    # Suffix of the journal of the recorded responses not folded in the archive yet
+    JOURNAL = '.journal.jsonl'
+
+    def __init__( self, path:str, mode:str ):
+        if mode not in ('record', 'replay'):
+            raise ValueError(f"[ Cassette Error ] Unknown mode {mode}, use 'record' or 'replay'")
+        self.path = str(path)
+        self.journal = Path(self.path + Cassette.JOURNAL)
+        if mode == 'replay' and not Path(path).exists() and not self.journal.exists():
+            raise FileNotFoundError(f"[ Cassette Error ] Archive {path} does not exist")
+
+        self.mode = mode
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+        self._lock = threading.Lock()
+        self._journal = None
+        self._originals = dict()
+
+        # Responses of a recording that crashed
+        self.fold()
+
+        # The archive is only kept open to replay it, a recording replaces it
+        self._zip = zipfile.ZipFile(self.path, 'r') if mode == 'replay' else None
+        if self._zip is not None:
+            self._names = set(self._zip.namelist())
+        elif Path(self.path).exists():
+            with zipfile.ZipFile(self.path, 'r') as archive:
+                self._names = set(archive.namelist())
+        else:
+            self._names = set()
+
+
+    def key ( method:str, url:str, body=None ) -> str:
+        """ Content address of a request """
+        parts = urlsplit(url)
+        query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+        url = urlunsplit((parts.scheme, parts.netloc.lower(), parts.path, query, ''))
+
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        digest = hashlib.sha256(f"{method.upper()} {url}\n".encode('utf-8'))
+        digest.update(body or b'')
+        return digest.hexdigest()
+
+
+    def save ( self, key:str, method:str, url:str, status:int, headers:Dict[str,str], body:bytes ) -> None:
+        """ Store a response, the first answer of a request is kept """
+        record = {
+            'method': method,
+            'url': url,
+            'status': status,
+            'headers': { name: value for name, value in headers.items() if name.lower() not in Cassette.DROP_HEADERS },
+            'body': base64.b64encode(body or b'').decode('ascii')
+        }
+        with self._lock:
+            if key in self._names:
+                return
+            if self._journal is None:
+                self._journal = open(self.journal, 'a', encoding='utf-8')
+            self._journal.write(json.dumps({'key': key, **record}) + '\n')
+            self._journal.flush()
+            self._names.add(key)
+            self.recorded += 1
+
+
+    def read_journal ( path:Path ) -> Dict[str,Dict]:
+        """ Records of a journal by key, the first answer of a request is kept and a truncated last line is ignored """
+        records = dict()
+        with open(path, 'r', encoding='utf-8') as journal:
+            for line in journal:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                records.setdefault(record.pop('key'), record)
+        return records
+
+
+    def fold ( self ) -> None:
+        """ Move the journal into the archive: a new zip is written aside and replaces the old one """
+        if not self.journal.exists():
+            return
+        records = Cassette.read_journal(self.journal)
+        if records:
+            partial = self.path + '.tmp'
+            with zipfile.ZipFile(partial, 'w', compression=zipfile.ZIP_DEFLATED) as target:
+                if Path(self.path).exists():
+                    with zipfile.ZipFile(self.path, 'r') as source:
+                        for name in source.namelist():
+                            target.writestr(name, source.read(name))
+                            records.pop(name, None)
+                for key, record in records.items():
+                    target.writestr(key, json.dumps(record))
+            with open(partial, 'rb+') as written:
+                os.fsync(written.fileno())
+            os.replace(partial, self.path)
+        self.journal.unlink()
+
+
+    def flush ( self ) -> None:
+        """ Fold the responses recorded so far in the archive """
+        with self._lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            self.fold()
+
+
+    def load ( self, key:str, url:str ) -> Dict:
+        """ Stored response of a request """
+        with self._lock:
+            if key not in self._names:
+                self.misses += 1
+                raise CassetteMiss(f"[ Cassette Error ] Request not recorded: {url}")
+            record = json.loads(self._zip.read(key))
+            self.hits += 1
+        record['body'] = base64.b64decode(record['body'])
+        return record
+
+
+    def install ( self ) -> 'Cassette':
+        """ Patch the HTTP transports of requests and httpx """
+        if Cassette.ACTIVE is not None:
+            Cassette.ACTIVE.uninstall()
+
+        from requests.adapters import HTTPAdapter
+        self._originals['requests'] = HTTPAdapter.send
+        HTTPAdapter.send = self.requests_send()
+
+        try:
+            import httpx
+            self._originals['httpx'] = httpx.HTTPTransport.handle_request
+            self._originals['httpx_async'] = httpx.AsyncHTTPTransport.handle_async_request
+            httpx.HTTPTransport.handle_request = self.httpx_handle_request()
+            httpx.AsyncHTTPTransport.handle_async_request = self.httpx_handle_async_request()
+        except ImportError:
+            pass
+
+        Cassette.ACTIVE = self
+        atexit.register(self.uninstall)
+        return self
+
+
+    def uninstall ( self ) -> None:
+        """ Restore the transports and close the archive """
+        if 'requests' in self._originals:
+            from requests.adapters import HTTPAdapter
+            HTTPAdapter.send = self._originals.pop('requests')
+        if 'httpx' in self._originals:
+            import httpx
+            httpx.HTTPTransport.handle_request = self._originals.pop('httpx')
+            httpx.AsyncHTTPTransport.handle_async_request = self._originals.pop('httpx_async')
+        if self.mode == 'record':
+            self.flush()
+        with self._lock:
+            if self._zip is not None and self._zip.fp is not None:
+                self._zip.close()
+        if Cassette.ACTIVE is self:
+            Cassette.ACTIVE = None
+
+
+    def requests_send ( self ):
+        """ Replacement of requests.adapters.HTTPAdapter.send """
+        import requests
+        from requests.structures import CaseInsensitiveDict
+        original = self._originals['requests']
+        cassette = self
+
+        def send( adapter, request, **kwargs ):
+            key = Cassette.key(request.method, request.url, request.body)
+
+            if cassette.mode == 'replay':
+                record = cassette.load(key, request.url)
+                response = requests.Response()
+                response.status_code = record['status']
+                response.headers = CaseInsensitiveDict(record['headers'])
+                response._content = record['body']
+                response.url = request.url
+                response.request = request
+                response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+                return response
+
+            response = original(adapter, request, **kwargs)
+            cassette.save(key, request.method, request.url, response.status_code, dict(response.headers), response.content)
+            return response
+
+        return send
+
+
+    def httpx_handle_request ( self ):
+        """ Replacement of httpx.HTTPTransport.handle_request """
+        import httpx
+        original = self._originals['httpx']
+        cassette = self
+
+        def handle_request( transport, request ):
+            body = request.read()
+            key = Cassette.key(request.method, str(request.url), body)
+
+            if cassette.mode == 'replay':
+                record = cassette.load(key, str(request.url))
+                return httpx.Response(record['status'], headers=record['headers'], content=record['body'], request=request)
+
+            response = original(transport, request)
+            content = response.read()
+            headers = { name: value for name, value in response.headers.items() if name.lower() not in Cassette.DROP_HEADERS }
+            cassette.save(key, request.method, str(request.url), response.status_code, headers, content)
+            return httpx.Response(response.status_code, headers=headers, content=content, request=request)
+
+        return handle_request
+
+
+    def httpx_handle_async_request ( self ):
+        """ Replacement of httpx.AsyncHTTPTransport.handle_async_request """
+        import httpx
+        original = self._originals['httpx_async']
+        cassette = self
+
+        async def handle_async_request( transport, request ):
+            body = await request.aread()
+            key = Cassette.key(request.method, str(request.url), body)
+
+            if cassette.mode == 'replay':
+                record = cassette.load(key, str(request.url))
+                return httpx.Response(record['status'], headers=record['headers'], content=record['body'], request=request)
+
+            response = await original(transport, request)
+            content = await response.aread()
+            headers = { name: value for name, value in response.headers.items() if name.lower() not in Cassette.DROP_HEADERS }
+            cassette.save(key, request.method, str(request.url), response.status_code, headers, content)
+            return httpx.Response(response.status_code, headers=headers, content=content, request=request)
+
+        return handle_async_request
+
+
+    def stats ( self ) -> Dict[str,int]:
+        return {'mode': self.mode, 'recorded': self.recorded, 'replayed': self.hits, 'missing': self.misses}
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import csv
+import argparse
+from pathlib import Path
+from typing import Tuple
+from ._resume import ResumeIndex, DatedOutputs
+from ._scraper import ScraperGooleScholar
+
+def compact ( outputs:DatedOutputs, name:str, prune:bool = False ) -> Tuple[int,int]:
+    """
+    Merge the CSVs of a query of every day into <root>/<name>, one row per
+    GSRANK. The row of the latest day is kept. Returns the number of rows
+    and of merged files.
+    ------------------------------------
+        :param outputs: Dated outputs of the output directory
+        :param name:    CSV name of the query
+        :param prune:   Remove the CSVs of each day once merged
+
+    """
+    files = outputs.files(name)
+    target = outputs.root / name
+
+    rows = dict()
+    fieldnames = []
+    for path in files:
+        with open(path, 'r', newline='', encoding='utf-8') as csvfile:
+            reader = csv.DictReader(csvfile)
+            fieldnames += [ field for field in reader.fieldnames or [] if field not in fieldnames ]
+            for row in reader:
+                rank = row.get(ResumeIndex.GSRANK_KEY)
+                if rank:
+                    rows[rank] = row
+
+    # Written aside and moved, so the compacted file is never left half written
+    partial = target.with_name(name + '.tmp')
+    with open(partial, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=fieldnames or ScraperGooleScholar.FIELDNAMES, restval='')
+        writer.writeheader()
+        for rank in sorted(rows, key=ResumeIndex.order):
+            writer.writerow(rows[rank])
+    os.replace(partial, target)
+
+    sidecar = Path(str(target) + ResumeIndex.SUFFIX)
+    if sidecar.exists():
+        sidecar.unlink()
+    ResumeIndex(target)
+
+    if prune:
+        for path in files:
+            if path == target:
+                continue
+            path.unlink()
+            if Path(str(path) + ResumeIndex.SUFFIX).exists():
+                Path(str(path) + ResumeIndex.SUFFIX).unlink()
+            if not any(path.parent.iterdir()):
+                path.parent.rmdir()
+
+    return len(rows), len(files)
+
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        description='Merge the CSVs of the dated folders of an output directory into one deduplicated CSV per query')
+
+    parser.add_argument('-od', '--outdir', type=str, default=".",
+                        help='Output directory used by the scraper, with a YYYY-MM-DD folder per day.')
+
+    parser.add_argument('-q', '--query', type=str, action='append', default=None,
+                        help='Compact only this query. Can be repeated. Default: every query.')
+
+    parser.add_argument('--prune', action='store_true',
+                        help='Remove the CSVs of each day once merged. Do not use it while a run is writing.')
+
+    args = parser.parse_args()
+
+    outputs = DatedOutputs(args.outdir)
+    names = [ ScraperGooleScholar.get_outfile(query, '.').name for query in args.query ] \
+            if args.query is not None else outputs.names()
+
+    if not names:
+        print(f"[ Input Error ] There are no dated outputs in {args.outdir}")
+        return
+
+    for name in names:
+        if not outputs.files(name):
+            print(f"[ Input Error ] There are no outputs for {name} in {args.outdir}")
+            continue
+        rows, files = compact(outputs, name, prune=args.prune)
+        print(f"{outputs.root / name}: {rows} entries from {files} files")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,11 +2,53 @@
 # -*- coding: utf-8 -*-
 import sys
 import typing 
-import requests
-from habanero import Crossref
+from typing import List, Tuple, Union
+from ._cache import ResultCache
+from ._crossref_client import CrossrefClient
+from ._crossref_index import CrossrefIndex
 
 class CrossrefAPI:
 
+    # Persistent cache of the lookups, disabled until set_cache is called
+    CACHE = None
+    HOST = 'api.crossref.org'
+
+    # Local index of a Crossref dump queried before the live API, disabled until set_index is called
+    INDEX = None
+
+
+    def set_cache ( path: str, ttl: float = None, maxsize: int = None ) -> ResultCache:
+        """
+        Enable the persistent cache of Crossref lookups.
+        ------------------------------------
+            :param path:    SQLite file where the lookups are stored
+            :param ttl:     Seconds before a cached lookup expires
+            :param maxsize: Maximum number of cached lookups
+
+        """
+        CrossrefAPI.CACHE = ResultCache(path, 'crossref', ttl=ttl, maxsize=maxsize)
+        return CrossrefAPI.CACHE
+
+
+    def set_index ( path: str ) -> CrossrefIndex:
+        """
+        Query a local index of a Crossref dump before the live API.
+        ------------------------------------
+            :param path: SQLite file built with `python -m ScraperGoogleScholar._crossref_index`
+
+        """
+        CrossrefAPI.INDEX = CrossrefIndex(path)
+        return CrossrefAPI.INDEX
+
+
+    def local ( pub_authors: str, pub_year:str, pub_title: str ):
+        """ Result of the local index, None if it is disabled or has no match """
+        if CrossrefAPI.INDEX is None:
+            return None
+        response = CrossrefAPI.INDEX.lookup(pub_authors, pub_year, pub_title)
+        return CrossrefAPI.validate(pub_authors, response) if response is not None else None
+
+
     def petition ( pub_authors: str, pub_year:str, pub_title: str, num: int, verbose:bool ) -> str:
         """
         Query to Crossref database.
@@ -21,30 +63,26 @@ class CrossrefAPI:
             #sys.stdout.write(f"Crossref query for: {num}) {pub_title[:60]}...")
             print(f"Crossref qury for: {num} {pub_title[:60]}...", end='', flush=True)
 
+        query = CrossrefAPI.query(pub_authors, pub_year, pub_title)
+
+        # Previous lookup of the same query
+        cached = CrossrefAPI.CACHE.get(query) if CrossrefAPI.CACHE is not None else None
+        if cached is not None:
+            if (verbose):
+                print(f"...[{cached['status']}] (cached)\n")
+            return cached['doi'], cached['authors'], cached['status']
+
+        # Local dump index, the live API is only asked on a miss
+        indexed = CrossrefAPI.local(pub_authors, pub_year, pub_title)
+        if indexed is not None:
+            if (verbose):
+                print(f"...[{indexed[2]}] (index)\n")
+            return indexed
+
         try:
-            # Query to Crossref to retrieve doi for each entry
-            cr = Crossref()
-            response = cr.works(query=str(pub_authors.replace(';', ',').replace('"', '').lower() + ' ' +
-                                        pub_year + ' "' + pub_title.lower() + '"'), select='DOI,author', limit=1)['message']['items'][0]
-
-
-            # Validate response
-            crossref_doi = response['DOI'] if 'DOI' in response else ''
-            crossref_author = response['author'] if 'author' in response else [{'given': 'NA', 'family': 'NA'}]
-            
-            # Validate query and response are the same
-            scholarly_first_surname = pub_authors.split(';')[0].split(' ')[-1]
-            chrossref_first_surname = crossref_author[0]['family'].split(' ')[-1] \
-                                        if ' ' in crossref_author[0]['family'] else crossref_author[0]['family']
-
-            if scholarly_first_surname != chrossref_first_surname:
-                crossref_author = [{'given':pub_author.rsplit(" ", 1)[0].strip(),'family':pub_author.rsplit(" ", 1)[-1].strip()} \
-                                    for pub_author in pub_authors.split(';')] 
-                STATUS = 'MISSING'
-            elif '.' in crossref_author[0].get('given', '') or '.' in crossref_author[0].get('family', ''):
-                STATUS = 'REVIEW'
-            else:
-                STATUS = 'PASS'
+            # Query to Crossref to retrieve doi for each entry, over the pooled client
+            response = CrossrefClient.SHARED.works(query)
+            crossref_doi, crossref_author, STATUS = CrossrefAPI.validate(pub_authors, response)
 
         except Exception as e:
                 print('\n{}'.format(e))
@@ -58,6 +96,91 @@ class CrossrefAPI:
             #print(f"\rCrossref qury for: {num}) {pub_title[:60]}...[{STATUS}]")
             #print(f"Crossref qury for: {num}) {pub_title[:60]}...[{STATUS}]")
 
+        if CrossrefAPI.CACHE is not None:
+            CrossrefAPI.CACHE.set(query, {'doi': crossref_doi, 'authors': crossref_author, 'status': STATUS})
+
+        return crossref_doi, crossref_author, STATUS
+
+
+    def petition_many ( entries: List[Tuple[str,str,str,int]], verbose:bool ) -> List[Union[Tuple,Exception]]:
+        """
+        Query to Crossref database for a whole page of entries at once. The
+        lookups that are not cached are sent concurrently. A failed lookup
+        returns its exception instead of raising, so the other ones are kept.
+        ------------------------------------
+            :param entries: (authors, year, title, num) of each paper
+            :param verbose: Show messages
+
+        """
+        queries = [ CrossrefAPI.query(pub_authors, pub_year, pub_title) for pub_authors, pub_year, pub_title, _ in entries ]
+        results = [ None ] * len(entries)
+
+        # Previous lookups of the same queries, then the local dump index
+        pending = []
+        for i, query in enumerate(queries):
+            cached = CrossrefAPI.CACHE.get(query) if CrossrefAPI.CACHE is not None else None
+            if cached is not None:
+                results[i] = (cached['doi'], cached['authors'], cached['status'])
+                continue
+            results[i] = CrossrefAPI.local(*entries[i][:3])
+            if results[i] is None:
+                pending.append(i)
+
+        responses = CrossrefClient.SHARED.works_many([ queries[i] for i in pending ])
+        for i, response in zip(pending, responses):
+            if isinstance(response, Exception):
+                results[i] = response
+                continue
+            try:
+                results[i] = CrossrefAPI.validate(entries[i][0], response)
+            except Exception as e:
+                results[i] = e
+                continue
+            if CrossrefAPI.CACHE is not None:
+                doi, authors, status = results[i]
+                CrossrefAPI.CACHE.set(queries[i], {'doi': doi, 'authors': authors, 'status': status})
+
+        if (verbose):
+            for (_, _, pub_title, num), result in zip(entries, results):
+                status = result[2] if isinstance(result, tuple) else 'ERROR'
+                print(f"Crossref qury for: {num} {pub_title[:60]}...[{status}]")
+
+        return results
+
+
+    def query ( pub_authors: str, pub_year:str, pub_title: str ) -> str:
+        """ Bibliographic query of a paper """
+        return str(pub_authors.replace(';', ',').replace('"', '').lower() + ' ' +
+                   pub_year + ' "' + pub_title.lower() + '"')
+
+
+    def validate ( pub_authors: str, response: dict ) -> Tuple[str,list,str]:
+        """
+        DOI, authors and status of a Crossref match. The match is checked
+        against the first GS author: MISSING keeps the GS authors, REVIEW has
+        abbreviated names and PASS is a full match.
+        ------------------------------------
+            :param pub_authors: Paper authors in GS
+            :param response:    Crossref work
+
+        """
+        crossref_doi = response['DOI'] if 'DOI' in response else ''
+        crossref_author = response['author'] if 'author' in response else [{'given': 'NA', 'family': 'NA'}]
+
+        # Validate query and response are the same
+        scholarly_first_surname = pub_authors.split(';')[0].split(' ')[-1]
+        chrossref_first_surname = crossref_author[0]['family'].split(' ')[-1] \
+                                    if ' ' in crossref_author[0]['family'] else crossref_author[0]['family']
+
+        if scholarly_first_surname != chrossref_first_surname:
+            crossref_author = [{'given':pub_author.rsplit(" ", 1)[0].strip(),'family':pub_author.rsplit(" ", 1)[-1].strip()} \
+                                for pub_author in pub_authors.split(';')] 
+            STATUS = 'MISSING'
+        elif '.' in crossref_author[0].get('given', '') or '.' in crossref_author[0].get('family', ''):
+            STATUS = 'REVIEW'
+        else:
+            STATUS = 'PASS'
+
         return crossref_doi, crossref_author, STATUS
 
 
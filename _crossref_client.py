@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import threading
+import httpx
+from typing import Dict, List, Optional, Union
+from ._ratelimit import RateLimiter
+from ._metrics import Metrics
+
+class CrossrefClient:
+    """
+    Connection-pooled Crossref works client. Single lookups use a blocking
+    client and bulk lookups an asyncio client running in a background event
+    loop, both keeping their connections alive between requests. With a
+    mailto address the requests are identified for the Crossref polite pool.
+    --------------------------------------------------------------------
+        :param mailto:    Contact address sent to Crossref
+        :param in_flight: Maximum number of bulk requests in flight
+
+    """
+
+    # Main Params
+    HOST = 'api.crossref.org'
+    URL = 'https://api.crossref.org/works'
+    AGENT = 'ScraperGoogleScholar/1.0'
+    SELECT = 'DOI,author'
+    TIMEOUT = 30
+    MAX_CONNECTIONS = 20
+    IN_FLIGHT = 5
+
+    # Client shared by the whole run, replaced by configure
+    SHARED = None
+
+    def __init__( self, mailto:Optional[str] = None, in_flight:int = IN_FLIGHT ):
+        self.mailto = mailto
+        self.in_flight = max(1, in_flight)
+        self.client = httpx.Client(headers=self.headers(), timeout=CrossrefClient.TIMEOUT, limits=self.limits())
+        self._aclient = None
+        self._semaphore = None
+        self._loop = None
+        self._lock = threading.Lock()
+
+
+    def configure ( mailto:Optional[str] = None, in_flight:int = IN_FLIGHT ) -> 'CrossrefClient':
+        """ Replace the shared client """
+        if CrossrefClient.SHARED is not None:
+            CrossrefClient.SHARED.close()
+        CrossrefClient.SHARED = CrossrefClient(mailto, in_flight)
+        return CrossrefClient.SHARED
+
+
+    def headers ( self ) -> Dict[str,str]:
+        agent = f"{CrossrefClient.AGENT} (mailto:{self.mailto})" if self.mailto else CrossrefClient.AGENT
+        return {'User-Agent': agent}
+
+
+    def limits ( self ) -> httpx.Limits:
+        return httpx.Limits(max_connections=CrossrefClient.MAX_CONNECTIONS, max_keepalive_connections=CrossrefClient.MAX_CONNECTIONS)
+
+
+    def params ( self, query:str ) -> Dict[str,str]:
+        params = {'query': query, 'select': CrossrefClient.SELECT, 'rows': 1}
+        if self.mailto:
+            params['mailto'] = self.mailto
+        return params
+
+
+    def first_item ( response:httpx.Response ) -> Dict:
+        """ Best match of a works answer. Errors raise, 429 slows the host down """
+        if response.status_code == 429:
+            RateLimiter.SHARED.penalize(CrossrefClient.HOST, RateLimiter.retry_after(response))
+        response.raise_for_status()
+        RateLimiter.SHARED.reward(CrossrefClient.HOST)
+        return response.json()['message']['items'][0]
+
+
+    def works ( self, query:str ) -> Dict:
+        """
+        Best Crossref match of a query.
+        ------------------------------------
+            :param query: Bibliographic query
+
+        """
+        RateLimiter.SHARED.acquire(CrossrefClient.HOST)
+        return CrossrefClient.first_item(self.client.get(CrossrefClient.URL, params=self.params(query)))
+
+
+    def works_many ( self, queries:List[str] ) -> List[Union[Dict,Exception]]:
+        """
+        Best Crossref match of several queries, sent concurrently. A failed
+        lookup returns its exception instead of raising.
+        ------------------------------------
+            :param queries: Bibliographic queries
+
+        """
+        if not queries:
+            return []
+        return asyncio.run_coroutine_threadsafe(self.agather(queries), self.loop()).result()
+
+
+    def loop ( self ) -> asyncio.AbstractEventLoop:
+        """ Background event loop that owns the async client """
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name='gscraper-crossref', daemon=True).start()
+            return self._loop
+
+
+    async def agather ( self, queries:List[str] ) -> List[Union[Dict,Exception]]:
+        if self._aclient is None:
+            self._aclient = httpx.AsyncClient(headers=self.headers(), timeout=CrossrefClient.TIMEOUT, limits=self.limits())
+            self._semaphore = asyncio.Semaphore(self.in_flight)
+        return await asyncio.gather(*(self.aworks(query) for query in queries), return_exceptions=True)
+
+
+    async def aworks ( self, query:str ) -> Dict:
+        async with self._semaphore:
+            await asyncio.get_running_loop().run_in_executor(None, RateLimiter.SHARED.acquire, CrossrefClient.HOST)
+            with Metrics.SHARED.timer('crossref_request'):
+                response = await self._aclient.get(CrossrefClient.URL, params=self.params(query))
+            return CrossrefClient.first_item(response)
+
+
+    def close ( self ) -> None:
+        """ Close the connections and stop the event loop """
+        self.client.close()
+        if self._loop is not None:
+            if self._aclient is not None:
+                asyncio.run_coroutine_threadsafe(self._aclient.aclose(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop = None
+
+
+CrossrefClient.SHARED = CrossrefClient()
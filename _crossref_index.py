@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import re
+import os
+import gzip
+import json
+import sqlite3
+import argparse
+import threading
+import unicodedata
+from pathlib import Path
+from difflib import SequenceMatcher
+from typing import Dict, Iterator, List, Optional, Tuple
+from ._metrics import Metrics
+
+class JSONItems:
+    """
+    Works of a JSON dump decoded one at a time from buffered chunks, so the
+    file is never loaded in memory: the 'items' list of a Crossref public
+    data file ({"items": [...]}), of a works API answer ({"message": {"items":
+    [...]}}) or a top-level list of works.
+    --------------------------------------------------------------------
+        :param dump: Text file object of the dump
+
+    """
+
+    # Characters read from the file at a time
+    CHUNK = 1 << 20
+
+    def __init__( self, dump ):
+        self.dump = dump
+        self.buffer = ''
+        self.pos = 0
+        self.decoder = json.JSONDecoder()
+
+
+    def __iter__ ( self ) -> Iterator[Dict]:
+        first = self.peek()
+        if first == '[':
+            yield from self.array()
+        elif first == '{':
+            yield from self.object()
+        else:
+            raise ValueError("[ Input Error ] A JSON dump must be an object with an 'items' list or a list of works")
+
+
+    def fill ( self ) -> bool:
+        """ Append the next chunk of the file to the unread part of the buffer, False at the end of the file """
+        chunk = self.dump.read(JSONItems.CHUNK)
+        if not chunk:
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+
+    def peek ( self ) -> str:
+        """ Next character that is not a space, '' at the end of the file """
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return ''
+
+
+    def expect ( self, char:str ) -> None:
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"[ Input Error ] Malformed JSON dump: expected '{char}' but found '{found}'")
+        self.pos += 1
+
+
+    def value ( self ) -> object:
+        """ Next JSON value, read until it is complete """
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self.fill():
+                    raise
+                continue
+            # A number at the end of the buffer may continue in the next chunk
+            if end == len(self.buffer) and self.fill():
+                continue
+            self.pos = end
+            return value
+
+
+    def array ( self ) -> Iterator[object]:
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            separator = self.peek()
+            self.pos += 1
+            if separator == ']':
+                return
+            if separator != ',':
+                raise ValueError(f"[ Input Error ] Malformed JSON dump: expected ',' or ']' but found '{separator}'")
+
+
+    def object ( self ) -> Iterator[Dict]:
+        """ Items of the 'items' list of an object, or of its 'message' object, other values are skipped """
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(':')
+            if key == 'items' and self.peek() == '[':
+                yield from self.array()
+            elif key == 'message' and self.peek() == '{':
+                yield from self.object()
+            else:
+                self.value()
+            separator = self.peek()
+            self.pos += 1
+            if separator == '}':
+                return
+            if separator != ',':
+                raise ValueError(f"[ Input Error ] Malformed JSON dump: expected ',' or '}}' but found '{separator}'")
+
+
+class CrossrefIndex:
+    """
+    Local full-text index of Crossref works built from a metadata dump (the
+    Crossref public data file or any subset of it). Works are keyed on the
+    normalized title, the year and the first author surname in SQLite FTS5.
+    Dumps are ingested streaming, in batches, and files already ingested are
+    skipped, so the index grows incrementally without loading a dump in memory.
+    --------------------------------------------------------------------
+        :param path: SQLite file of the index
+
+    """
+
+    # Main Params
+    BATCH_SIZE = 5000
+    CANDIDATES = 5
+    MAX_TOKENS = 12
+    MIN_SIMILARITY = 0.9
+    SUFFIXES = ('.jsonl', '.jsonl.gz', '.json', '.json.gz')
+
+    def __init__( self, path:str ):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = str(path)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript('''
+            CREATE TABLE IF NOT EXISTS works (
+                doi TEXT PRIMARY KEY, title TEXT NOT NULL, year INTEGER, surname TEXT, authors TEXT);
+            CREATE VIRTUAL TABLE IF NOT EXISTS works_fts USING fts5 (
+                title, surname, content='works', content_rowid='rowid');
+            CREATE TRIGGER IF NOT EXISTS works_ai AFTER INSERT ON works BEGIN
+                INSERT INTO works_fts (rowid, title, surname) VALUES (new.rowid, new.title, new.surname);
+            END;
+            CREATE TRIGGER IF NOT EXISTS works_ad AFTER DELETE ON works BEGIN
+                INSERT INTO works_fts (works_fts, rowid, title, surname) VALUES ('delete', old.rowid, old.title, old.surname);
+            END;
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY, size INTEGER, mtime REAL, works INTEGER);
+        ''')
+        self._conn.commit()
+
+
+    def normalize ( text:str ) -> str:
+        """ Lower case ASCII words: accents, punctuation and extra spaces removed """
+        text = unicodedata.normalize('NFKD', text or '')
+        text = ''.join(char for char in text if not unicodedata.combining(char))
+        return ' '.join(re.sub(r'[^\w]+', ' ', text.lower()).split())
+
+
+    def ingest ( self, source:str, verbose:bool = True ) -> int:
+        """
+        Add the works of a dump file or of every dump file in a folder.
+        Returns the number of works ingested.
+        ------------------------------------
+            :param source:  .jsonl(.gz) file with a work per line, .json(.gz) file
+                            with an 'items' list, or a folder with these files
+            :param verbose: Show messages
+
+        """
+        source = Path(source)
+        paths = sorted(path for path in source.rglob('*') if path.name.endswith(CrossrefIndex.SUFFIXES)) \
+                if source.is_dir() else [source]
+
+        total = 0
+        for path in paths:
+            stat = path.stat()
+            with self._lock:
+                done = self._conn.execute('SELECT size, mtime FROM files WHERE path = ?', (str(path.resolve()),)).fetchone()
+            if done is not None and done[0] == stat.st_size and done[1] == stat.st_mtime:
+                if (verbose):
+                    print(f"{path} already ingested")
+                continue
+
+            count = 0
+            batch = []
+            for work in CrossrefIndex.works(path):
+                row = CrossrefIndex.row(work)
+                if row is not None:
+                    batch.append(row)
+                if len(batch) >= CrossrefIndex.BATCH_SIZE:
+                    count += self.insert(batch)
+                    batch = []
+            count += self.insert(batch)
+
+            with self._lock:
+                self._conn.execute('INSERT OR REPLACE INTO files (path, size, mtime, works) VALUES (?, ?, ?, ?)',
+                                   (str(path.resolve()), stat.st_size, stat.st_mtime, count))
+                self._conn.commit()
+            total += count
+            if (verbose):
+                print(f"{path}: {count} works ingested")
+
+        return total
+
+
+    def works ( path:Path ) -> Iterator[Dict]:
+        """ Works of a dump file, read line by line (JSONL) or item by item (JSON) """
+        opener = gzip.open if path.name.endswith('.gz') else open
+        with opener(path, 'rt', encoding='utf-8') as dump:
+            if path.name.endswith(('.jsonl', '.jsonl.gz')):
+                for line in dump:
+                    line = line.strip()
+                    if line:
+                        work = json.loads(line)
+                        yield work.get('message', work) if isinstance(work.get('message'), dict) else work
+            else:
+                yield from JSONItems(dump)
+
+
+    def row ( work:Dict ) -> Optional[Tuple]:
+        """ Indexed fields of a work, None if it has no DOI or title """
+        doi = work.get('DOI')
+        title = work.get('title')
+        title = title[0] if isinstance(title, list) and title else title
+        if not doi or not title:
+            return None
+
+        year = None
+        for key in ('issued', 'published', 'published-print', 'published-online', 'created'):
+            parts = (work.get(key) or {}).get('date-parts') or [[None]]
+            if parts[0] and parts[0][0]:
+                year = int(parts[0][0])
+                break
+
+        authors = [ { key: author[key] for key in ('given', 'family') if key in author }
+                    for author in work.get('author', []) if 'family' in author ]
+        surname = CrossrefIndex.normalize(authors[0]['family']).split(' ')[-1] if authors else ''
+
+        return doi, CrossrefIndex.normalize(title), year, surname, json.dumps(authors)
+
+
+    def insert ( self, rows:List[Tuple] ) -> int:
+        """ Store a batch of works, newer dumps replace the works already stored """
+        if not rows:
+            return 0
+        with self._lock:
+            self._conn.executemany('DELETE FROM works WHERE doi = ?', [ (row[0],) for row in rows ])
+            self._conn.executemany('INSERT OR IGNORE INTO works (doi, title, year, surname, authors) VALUES (?, ?, ?, ?, ?)', rows)
+            self._conn.commit()
+        return len(rows)
+
+
+    def lookup ( self, pub_authors:str, pub_year:str, pub_title:str ) -> Optional[Dict]:
+        """
+        Crossref work matching a GS entry, in the format of the works API
+        ('DOI' and 'author'), or None if the index has no close enough title.
+        ------------------------------------
+            :param pub_authors: Paper authors separated by ';'
+            :param pub_year:    Year of paper
+            :param pub_title:   Title of paper, may be truncated by GS
+
+        """
+        truncated = pub_title.strip().endswith(('…', '...'))
+        title = CrossrefIndex.normalize(pub_title.replace('…', ' '))
+        tokens = title.split()
+        if truncated and len(tokens) > 1:
+            tokens = tokens[:-1]
+        tokens = tokens[:CrossrefIndex.MAX_TOKENS]
+        if not tokens:
+            return None
+
+        surname = CrossrefIndex.normalize(pub_authors.split(';')[0]).split(' ')[-1]
+        sql = ('SELECT works.doi, works.title, works.surname, works.authors FROM works_fts '
+               'JOIN works ON works.rowid = works_fts.rowid WHERE works_fts MATCH ?')
+        params = ['title : (' + ' '.join(f'"{token}"' for token in tokens) + ')']
+        if str(pub_year).isdigit():
+            sql += ' AND (works.year IS NULL OR works.year BETWEEN ? AND ?)'
+            params += [int(pub_year) - 1, int(pub_year) + 1]
+        sql += ' ORDER BY bm25(works_fts) LIMIT ?'
+        params.append(CrossrefIndex.CANDIDATES)
+
+        with self._lock:
+            candidates = self._conn.execute(sql, params).fetchall()
+
+        best, best_score = None, 0.0
+        for doi, candidate, candidate_surname, authors in candidates:
+            compared = candidate[:len(title)] if truncated else candidate
+            score = SequenceMatcher(None, title, compared).ratio()
+            if score >= CrossrefIndex.MIN_SIMILARITY and surname and surname == candidate_surname:
+                score += 1
+            if score > best_score:
+                best, best_score = (doi, authors), score
+
+        if best is None or best_score < CrossrefIndex.MIN_SIMILARITY:
+            self.misses += 1
+            Metrics.SHARED.count('crossref_index', result='miss')
+            return None
+
+        self.hits += 1
+        Metrics.SHARED.count('crossref_index', result='hit')
+        work = {'DOI': best[0]}
+        authors = json.loads(best[1])
+        if authors:
+            work['author'] = authors
+        return work
+
+
+    def __len__ ( self ) -> int:
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM works').fetchone()[0]
+
+
+    def stats ( self ) -> Dict[str,int]:
+        return {'works': len(self), 'hits': self.hits, 'misses': self.misses}
+
+
+    def close ( self ) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        description='Build the local Crossref index used before the live API from a Crossref metadata dump')
+
+    parser.add_argument('-i', '--index', type=str, required=True,
+                        help='SQLite file of the index. It is created if it does not exist.')
+
+    parser.add_argument('dumps', type=str, nargs='+',
+                        help='Dump files (.jsonl, .jsonl.gz, .json, .json.gz) or folders with dump files.')
+
+    args = parser.parse_args()
+
+    index = CrossrefIndex(args.index)
+    for dump in args.dumps:
+        if not os.path.exists(dump):
+            print(f"[ Input Error ] {dump} does not exist")
+            continue
+        index.ingest(dump)
+    print(f"Works in the index: {len(index)}")
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
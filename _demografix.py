@@ -1,11 +1,89 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-from typing import List, Dict
-from pyagify.agify import GenderizeClient, NationalizeClient
+from typing import List, Dict, Tuple
+from ._names import NameInference
+from ._nametable import NameTable
 
 class GenderPredictor:
 
+    # Shared Genderize/Nationalize client with the lookup caches
+    INFERENCE = NameInference()
+
+
+    def set_cache ( path: str, ttl: float = None, maxsize: int = None ) -> NameInference:
+        """
+        Enable the persistent name -> result store.
+        ------------------------------------
+            :param path:    SQLite file where the answers are stored
+            :param ttl:     Seconds before a stored answer expires
+            :param maxsize: Maximum number of stored answers per service
+
+        """
+        GenderPredictor.INFERENCE = NameInference(path, ttl=ttl, maxsize=maxsize, table=GenderPredictor.INFERENCE.table)
+        return GenderPredictor.INFERENCE
+
+
+    def set_table ( path: str ) -> NameTable:
+        """
+        Answer names from a local name table before the caches and the APIs.
+        ------------------------------------
+            :param path: CSV file of the table, the API answers are appended to it
+
+        """
+        GenderPredictor.INFERENCE.table = NameTable(path)
+        return GenderPredictor.INFERENCE.table
+
+
+    def clean_name ( author_name: str ) -> str:
+        """ Name sent to Genderize: first part of compound or abbreviated names """
+        if "-"  in author_name.replace("‐", "-"):
+            author_name = author_name.replace("‐", "-").split("-")[0]
+        
+        if "." in author_name.replace(".", "."):
+            author_name = author_name.replace(".", ".").split(".")[0]
+
+        return author_name
+
+
+    def clean_surname ( author_surname: str ) -> str:
+        """ Surname sent to Nationalize: first part of compound surnames """
+        if "-"  in author_surname.replace("‐", "-"):
+            author_surname = author_surname.replace("‐", "-").split("-")[0]
+
+        return author_surname
+
+
+    def prefetch ( authors: List[Tuple[str,str]] ) -> None:
+        """
+        Resolve the nation and gender of several authors with bulk requests, so
+        the following get_nation/get_gender calls are answered from memory.
+        ------------------------------------
+            :param authors: List of (name, surname) tuples
+
+        """
+        authors = [ (name, surname) for name, surname in authors if f"{name} {surname}" != ' ' ]
+        if not authors:
+            return
+
+        inference = GenderPredictor.INFERENCE
+
+        # Nation of the surnames, names are used when surname has no country
+        surnames = inference.nationalize([ GenderPredictor.clean_surname(surname) for _, surname in authors ])
+        fallback = [ name for name, surname in authors if not surnames[GenderPredictor.clean_surname(surname)]['country'] ]
+        names = inference.nationalize(fallback) if fallback else {}
+
+        # Gender of the names, one request per country
+        countries = dict()
+        for name, surname in authors:
+            country = surnames[GenderPredictor.clean_surname(surname)]['country'] or names[name]['country']
+            country_id = country[0]['country_id'] if country else ""
+            countries.setdefault(country_id, []).append(GenderPredictor.clean_name(name))
+
+        for country_id, country_names in countries.items():
+            inference.genderize(country_names, country_id)
+
+
     def get_gender ( author_name: str, author_surname: str, nationality: str ) -> Dict[str,Dict[str,str]]:
         """
         Predict gender of the name.
@@ -17,21 +95,17 @@ class GenderPredictor:
         """
         AUTHOR_GENDER = {'genderize':{ 'name':{'gender':"", 'probability':""}}}
 
-        gender = GenderizeClient()
         author = f"{author_name} {author_surname}"
         gender_authors = { author : AUTHOR_GENDER['genderize'] }
         
         # Exceptions
-        if "-"  in author_name.replace("‐", "-"):
-            author_name = author_name.replace("‐", "-").split("-")[0]
-        
-        if "." in author_name.replace(".", "."):
-            author_name = author_name.replace(".", ".").split(".")[0]
+        author_name = GenderPredictor.clean_name(author_name)
 
         if author != ' ' :
             nation = nationality[author]
-            gender_authors[author]['name']['gender'] = gender.get_raw(author_name, nation['surname']['country_id'])['gender']
-            gender_authors[author]['name']['probability'] = gender.get_raw(author_name, nation['surname']['country_id'])['probability']
+            gender = GenderPredictor.INFERENCE.genderize([author_name], nation['surname']['country_id'])[author_name]
+            gender_authors[author]['name']['gender'] = gender['gender']
+            gender_authors[author]['name']['probability'] = gender['probability']
         else:
             gender_authors[author]['name']['gender'] = ""
             gender_authors[author]['name']['probability'] = ""
@@ -49,22 +123,22 @@ class GenderPredictor:
         """
         AUTHORS_NATION = {'nationalize':{'surname':{'country_id':"",'probability':""}}}
 
-        nation = NationalizeClient()
+        nation = GenderPredictor.INFERENCE
         author = f"{author_name} {author_surname}"
         nation_author = { author : AUTHORS_NATION['nationalize'] }
 
         # Exceptions
-        if "-"  in author_surname.replace("‐", "-"):
-            author_surname = author_surname.replace("‐", "-").split("-")[0]
+        author_surname = GenderPredictor.clean_surname(author_surname)
 
         if author != ' ' :
-            if not nation.get_raw(author_surname)['country']:
-                country = nation.get_raw(author_name)['country']
+            surname_country = nation.nationalize([author_surname])[author_surname]['country']
+            if not surname_country:
+                country = nation.nationalize([author_name])[author_name]['country']
                 nation_author[author]['surname']['country_id'] = country[0]['country_id'] if country else ""
                 nation_author[author]['surname']['probability'] = country[0]['probability'] if country else  0.0
                 
             else:
-                country = nation.get_raw(author_surname)['country']
+                country = surname_country
                 nation_author[author]['surname']['country_id'] = country[0]['country_id'] if country else ""
                 nation_author[author]['surname']['probability'] = country[0]['probability'] if country else 0.0
         
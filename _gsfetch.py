@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import re
+import requests
+from lxml import etree, html
+from urllib.parse import urljoin
+from requests.adapters import HTTPAdapter
+from typing import Dict, List, Optional, Tuple
+from ._proxy import Proxy
+
+def has_class ( *names:str ) -> str:
+    """ XPath condition matching elements with every given class """
+    return ' and '.join(f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')" for name in names)
+
+
+class GSParser:
+    """
+    Parser of Google Scholar result pages built on lxml. The whole page is
+    parsed once and every result is returned with the fields of the scholarly
+    publications read by the scraper (bib author/title/pub_year, author_id,
+    gsrank, num_citations, pub_url, url_scholarbib...).
+    --------------------------------------------------------------------
+    """
+
+    # Link of the citation export of a result, as scholarly builds it
+    BIBCITE = '/scholar?hl=en&q=info:{0}:scholar.google.com/&output=cite&scirp={1}&hl=en'
+
+    # Compiled selectors
+    ROWS = etree.XPath(f"//div[{has_class('gs_r', 'gs_or', 'gs_scl')}]")
+    DATABOX = etree.XPath(f".//div[{has_class('gs_ri')}]")
+    TITLE = etree.XPath(f".//h3[{has_class('gs_rt')}]")
+    AUTHORS = etree.XPath(f".//div[{has_class('gs_a')}]")
+    ABSTRACT = etree.XPath(f".//div[{has_class('gs_rs')}]")
+    LINKS = etree.XPath(f".//div[{has_class('gs_fl')}]//a")
+    EPRINT = etree.XPath(f".//div[{has_class('gs_ggs', 'gs_fl')}]//a/@href")
+    NEXT = etree.XPath(f"//*[{has_class('gs_ico', 'gs_ico_nav_next')}]/parent::*/@href")
+    TOTAL = etree.XPath(f"//div[{has_class('gs_ab_mdw')}]")
+    CAPTCHA = etree.XPath("//*[@id='gs_captcha_f' or @id='recaptcha' or @id='captcha-form']")
+
+    AUTHOR_ID = re.compile(r'\?user=(.*?)&amp;')
+    TOTAL_RESULTS = re.compile(r'(^|\s*About)\s*([0-9,\.\s’]+)')
+
+
+    def parse ( text:str ) -> Tuple[List[Dict], Optional[str], Optional[int]]:
+        """
+        Results of a page, the URL of the next page and the total of results.
+        ------------------------------------
+            :param text: HTML of a Google Scholar result page
+
+        """
+        root = html.fromstring(text)
+        if GSParser.CAPTCHA(root):
+            raise ConnectionError('[ Fetch Error ] Google Scholar asked for a CAPTCHA')
+
+        results = [ GSParser.result(row) for row in GSParser.ROWS(root) ]
+        next_url = GSParser.NEXT(root)
+        return results, next_url[0] if next_url else None, GSParser.total(root)
+
+
+    def count ( text:str ) -> int:
+        """ Number of results of a page, without parsing them """
+        root = html.fromstring(text)
+        if GSParser.CAPTCHA(root):
+            raise ConnectionError('[ Fetch Error ] Google Scholar asked for a CAPTCHA')
+        return len(GSParser.ROWS(root))
+
+
+    def total ( root ) -> Optional[int]:
+        """ Total of results announced by the page """
+        for div in GSParser.TOTAL(root):
+            match = GSParser.TOTAL_RESULTS.match(div.text_content())
+            if match:
+                return int(re.sub(r'[,\.\s’]', '', match.group(2)))
+        return None
+
+
+    def result ( row ) -> Dict:
+        """ Fields of a single result """
+        cid = row.get('data-cid')
+        pos = row.get('data-rp')
+        databox = GSParser.DATABOX(row)[0]
+
+        publication = {'container_type': 'Publication', 'bib': {}, 'filled': False, 'gsrank': int(pos) + 1}
+
+        # Title without the [CITATION]/[PDF] markers
+        title = GSParser.TITLE(databox)[0]
+        marker = title.find('span')
+        if marker is not None and any(name in (marker.get('class') or '') for name in ('gs_ctu', 'gs_ctc')):
+            marker.drop_tree()
+        publication['bib']['title'] = title.text_content().strip()
+        link = title.find('.//a')
+        if link is not None:
+            publication['pub_url'] = link.get('href')
+
+        # Authors, venue and year: "authors - venue, year - host"
+        authors = GSParser.AUTHORS(databox)[0]
+        authorinfo = authors.text_content().replace('\xa0', ' ').replace('&amp;', '&')
+        authorinfo_html = (authors.text or '') + ''.join(etree.tostring(child, encoding='unicode') for child in authors)
+        publication['bib']['author'] = GSParser.author_list(authorinfo)
+        publication['author_id'] = GSParser.author_ids(authorinfo_html)
+        publication['bib']['venue'], publication['bib']['pub_year'] = GSParser.venue_year(authorinfo)
+
+        abstract = GSParser.ABSTRACT(databox)
+        if abstract:
+            text = abstract[0].text_content().replace('…', '').replace('\n', ' ').strip()
+            publication['bib']['abstract'] = text[9:].strip() if text[0:8].lower() == 'abstract' else text
+
+        publication['url_scholarbib'] = GSParser.BIBCITE.format(cid, pos)
+
+        publication['num_citations'] = 0
+        for link in GSParser.LINKS(databox):
+            text = link.text_content()
+            if 'Cited by' in text:
+                publication['num_citations'] = int(re.findall(r'\d+', text)[0])
+                publication['citedby_url'] = link.get('href')
+            if 'Related articles' in text:
+                publication['url_related_articles'] = link.get('href')
+
+        eprint = GSParser.EPRINT(row)
+        if eprint:
+            publication['eprint_url'] = eprint[0]
+
+        return publication
+
+
+    def author_list ( authorinfo:str ) -> List[str]:
+        """ Author names of the author line, skipping venues and years """
+        authors = []
+        for name in authorinfo.split(' - ')[0].split(','):
+            name = name.strip()
+            if re.search(r'\d', name) or any(word in name for word in
+                    ('Proceedings', 'Conference', 'Journal', 'Transactions', '(', ')', '[', ']')):
+                continue
+            authors.append(name.replace('…', ''))
+        return authors
+
+
+    def author_ids ( authorinfo_html:str ) -> List[str]:
+        """ GS profile id of each author, empty if the author has no profile """
+        ids = []
+        for author_html in authorinfo_html.split(' - ')[0].split(','):
+            match = GSParser.AUTHOR_ID.search(author_html.strip())
+            ids.append(match.group(1) if match else '')
+        return ids
+
+
+    def venue_year ( authorinfo:str ) -> Tuple[str,str]:
+        """ Venue and year of the author line, 'NA' when missing """
+        parts = authorinfo.split(' - ')
+        if len(parts) <= 2:
+            return 'NA', 'NA'
+        parts = parts[1].split(',')
+        year = parts[-1].strip()
+        if year.isnumeric() and len(year) == 4:
+            return (','.join(parts[0:-1]) if len(parts) >= 2 else 'NA'), year
+        return ','.join(parts), 'NA'
+
+
+class GSFetcher:
+    """
+    Keep-alive HTTP client of Google Scholar. The session keeps a connection
+    pool and goes through the current proxy of the pool, if any. Blocks raise
+    an HTTPError and CAPTCHA pages a ConnectionError, so the GS retrier rotates
+    the proxy.
+    --------------------------------------------------------------------
+    """
+
+    # Main Params
+    BASE_URL = 'https://scholar.google.com'
+    TIMEOUT = 30
+    POOL_SIZE = 4
+    HEADERS = {'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/118.0 Safari/537.36',
+               'Accept-Language': 'en-US,en;q=0.9'}
+
+    # Session shared by every GS request
+    SESSION = None
+
+
+    def session ( ) -> requests.Session:
+        if GSFetcher.SESSION is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=GSFetcher.POOL_SIZE, pool_maxsize=GSFetcher.POOL_SIZE)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            session.headers.update(GSFetcher.HEADERS)
+            GSFetcher.SESSION = session
+        return GSFetcher.SESSION
+
+
+    def get ( path:str, params:Optional[Dict] = None ) -> str:
+        """
+        HTML of a Google Scholar page.
+        ------------------------------------
+            :param path:   URL or path relative to scholar.google.com
+            :param params: Query parameters
+
+        """
+        response = GSFetcher.session().get(
+            urljoin(GSFetcher.BASE_URL, path), params=params,
+            proxies=Proxy.requests_proxies(), timeout=GSFetcher.TIMEOUT)
+        response.raise_for_status()
+        return response.text
+
+
+    def search_params ( query:str, start:int = 0, years:Optional[Tuple[int,int]] = None ) -> Dict:
+        """ Parameters of a result page, the same search scholarly sends """
+        params = {'hl': 'en', 'q': query, 'as_vis': 0, 'as_sdt': '1,33'}
+        if years is not None:
+            params['as_ylo'], params['as_yhi'] = years
+        if start:
+            params['start'] = start
+        return params
+
+
+class GSSearch:
+    """
+    Iterator over the results of a query, like the one of scholarly.search_pubs.
+    The first page is loaded on creation and the next one when the results
+    of the current page run out, each page with a single request.
+    --------------------------------------------------------------------
+        :param query:       Search query to GS
+        :param start_index: Position of the first result, multiple of the page size
+        :param years:       (first, last) publication years of the results, None for every year
+
+    """
+
+    def __init__( self, query:str, start_index:int = 0, years:Optional[Tuple[int,int]] = None ):
+        self.query = query
+        self.pages = 0
+        self.load(GSFetcher.get('/scholar', GSFetcher.search_params(query, start_index, years)))
+
+
+    def load ( self, text:str ) -> None:
+        self._results, self._next_url, total = GSParser.parse(text)
+        self._pos = 0
+        self.pages += 1
+        if self.pages == 1:
+            self.total_results = total
+
+
+    def __iter__ ( self ) -> 'GSSearch':
+        return self
+
+
+    def __next__ ( self ) -> Dict:
+        if self._pos < len(self._results):
+            result = self._results[self._pos]
+            self._pos += 1
+            return result
+        if self._next_url is not None:
+            self.load(GSFetcher.get(self._next_url))
+            return self.__next__()
+        raise StopIteration
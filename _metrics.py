@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import json
+import time
+import bisect
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+class Histogram:
+    """
+    Latency histogram with fixed buckets (seconds), as Prometheus expects.
+    Percentiles are estimated by interpolation inside the buckets.
+    --------------------------------------------------------------------
+        :param bounds: Upper bounds of the buckets
+
+    """
+
+    # Upper bounds of the buckets in seconds
+    BOUNDS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+    def __init__( self, bounds:Tuple[float,...]=BOUNDS ):
+        self.bounds = tuple(bounds)
+        self.buckets = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+
+    def observe ( self, seconds:float ) -> None:
+        self.buckets[bisect.bisect_left(self.bounds, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.min = seconds if self.min is None else min(self.min, seconds)
+        self.max = seconds if self.max is None else max(self.max, seconds)
+
+
+    def percentile ( self, q:float ) -> Optional[float]:
+        """ Estimated q-quantile (0-1) in seconds """
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for i, size in enumerate(self.buckets):
+            if size and seen + size >= target:
+                low = self.bounds[i - 1] if i > 0 else 0.0
+                high = self.bounds[i] if i < len(self.bounds) else self.max
+                value = low + (high - low) * (target - seen) / size
+                return min(max(value, self.min), self.max)
+            seen += size
+        return self.max
+
+
+    def summary ( self ) -> Dict[str,Any]:
+        """ Count, total, mean, min/max and p50/p90/p99 in seconds """
+        rounded = lambda value: round(value, 4) if value is not None else None
+        return {
+            'count': self.count,
+            'total': round(self.sum, 3),
+            'mean': rounded(self.sum / self.count) if self.count else None,
+            'min': rounded(self.min),
+            'max': rounded(self.max),
+            'p50': rounded(self.percentile(0.50)),
+            'p90': rounded(self.percentile(0.90)),
+            'p99': rounded(self.percentile(0.99))
+        }
+
+
+class Metrics:
+    """
+    Run metrics: a latency histogram per pipeline stage, labelled counters
+    (requests, retries, cache lookups, seconds slept...) and the progress of
+    the entries. They can be exported as a JSON report and as a Prometheus
+    textfile, and shown as a live progress/ETA line.
+    --------------------------------------------------------------------
+        :param progress: Show the live progress line
+
+    """
+
+    # Prefix of the Prometheus metrics
+    PREFIX = 'gscraper'
+
+    # Seconds between two progress lines and between two exports
+    PROGRESS_EVERY = 1.0
+    EXPORT_EVERY = 30.0
+
+    # Metrics shared by the whole run, replaced by reset
+    SHARED = None
+
+    def __init__( self, progress:bool=False ):
+        self.show_progress = progress
+        self.started = time.monotonic()
+        self.stages = dict()
+        self.counters = dict()
+        self.total = 0
+        self.done = 0
+        self.report_path = None
+        self.prometheus_path = None
+        self._shown = 0.0
+        self._exported = time.monotonic()
+        self._lock = threading.Lock()
+
+
+    def reset ( progress:bool=False ) -> 'Metrics':
+        """ Replace the shared metrics with empty ones """
+        Metrics.SHARED = Metrics(progress)
+        return Metrics.SHARED
+
+
+    def export_to ( self, report:Optional[str]=None, prometheus:Optional[str]=None ) -> None:
+        """
+        Files refreshed during the run and written at the end.
+        ------------------------------------
+            :param report:     JSON run report
+            :param prometheus: Prometheus textfile
+
+        """
+        self.report_path = report
+        self.prometheus_path = prometheus
+
+
+    def export ( self ) -> None:
+        """ Write the configured report files """
+        self._exported = time.monotonic()
+        if self.report_path is not None:
+            self.write_json(self.report_path)
+        if self.prometheus_path is not None:
+            self.write_prometheus(self.prometheus_path)
+
+
+    def observe ( self, stage:str, seconds:float ) -> None:
+        """ Add a latency sample to the histogram of a stage """
+        with self._lock:
+            if stage not in self.stages:
+                self.stages[stage] = Histogram()
+            self.stages[stage].observe(seconds)
+
+
+    @contextmanager
+    def timer ( self, stage:str ) -> Iterator[None]:
+        """ Time a block of code as a sample of a stage """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+
+    def count ( self, name:str, value:float=1, **labels ) -> None:
+        """
+        Increase a labelled counter.
+        ------------------------------------
+            :param name:   Counter name, e.g. 'retries'
+            :param value:  Amount added
+            :param labels: Labels of the counter, e.g. service='crossref'
+
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+
+    def slept ( self, source:str, seconds:float, **labels ) -> None:
+        """ Time spent waiting (rate limits, retry backoff, open circuits...) """
+        if seconds > 0:
+            self.count('sleep_seconds', seconds, source=source, **labels)
+
+
+    def start ( self, total:int ) -> None:
+        """ Add entries to the progress total """
+        with self._lock:
+            self.total += total
+
+
+    def advance ( self, entries:int=1 ) -> None:
+        """ Entries finished. Prints the progress line and refreshes the exports """
+        with self._lock:
+            self.done += entries
+            now = time.monotonic()
+            show = self.show_progress and (now - self._shown >= Metrics.PROGRESS_EVERY or self.done >= self.total)
+            if show:
+                self._shown = now
+            export = now - self._exported >= Metrics.EXPORT_EVERY
+            if export:
+                self._exported = now
+
+        if show:
+            sys.stderr.write('\r' + self.progress_line())
+            sys.stderr.flush()
+        if export:
+            self.export()
+
+
+    def finish ( self ) -> None:
+        """ End the progress line and write the exports """
+        if self.show_progress and self._shown:
+            sys.stderr.write('\r' + self.progress_line() + '\n')
+            sys.stderr.flush()
+        self.export()
+
+
+    def progress_line ( self ) -> str:
+        """ Entries done, rate and estimated time left """
+        elapsed = time.monotonic() - self.started
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        percent = 100 * self.done / self.total if self.total else 100.0
+        left = (self.total - self.done) / rate if rate > 0 else None
+        eta = f"{int(left // 3600)}:{int(left % 3600 // 60):02d}:{int(left % 60):02d}" if left is not None else '--:--:--'
+        return f"[ Progress ] {self.done}/{self.total} entries ({percent:.1f}%) - {rate * 3600:.0f} entries/h - ETA {eta}"
+
+
+    def cache_ratios ( self ) -> Dict[str,Dict[str,float]]:
+        """ Hit ratio of each cache from the 'cache_lookups' counters """
+        lookups = dict()
+        with self._lock:
+            for (name, labels), value in self.counters.items():
+                if name == 'cache_lookups':
+                    labels = dict(labels)
+                    cache = lookups.setdefault(labels.get('cache'), {'hits': 0, 'misses': 0})
+                    cache['hits' if labels.get('result') == 'hit' else 'misses'] += value
+        for cache in lookups.values():
+            total = cache['hits'] + cache['misses']
+            cache['hit_ratio'] = round(cache['hits'] / total, 4) if total else 0.0
+        return lookups
+
+
+    def report ( self ) -> Dict[str,Any]:
+        """ Whole run report """
+        elapsed = time.monotonic() - self.started
+        with self._lock:
+            stages = { stage: histogram.summary() for stage, histogram in self.stages.items() }
+            counters = dict()
+            for (name, labels), value in sorted(self.counters.items()):
+                counters.setdefault(name, []).append({ **dict(labels), 'value': round(value, 3) })
+
+        return {
+            'elapsed': round(elapsed, 3),
+            'entries': {'done': self.done, 'total': self.total,
+                        'per_hour': round(self.done * 3600 / elapsed, 2) if elapsed > 0 else 0.0},
+            'stages': stages,
+            'counters': counters,
+            'caches': self.cache_ratios()
+        }
+
+
+    def write_json ( self, path:str ) -> None:
+        """ Write the run report as JSON """
+        Metrics.write_atomic(path, json.dumps(self.report(), indent=2))
+
+
+    def write_prometheus ( self, path:str ) -> None:
+        """ Write the metrics in the Prometheus text format (node_exporter textfile collector) """
+        prefix = Metrics.PREFIX
+        lines = []
+
+        with self._lock:
+            if self.stages:
+                lines += [f"# HELP {prefix}_stage_seconds Latency of each pipeline stage.",
+                          f"# TYPE {prefix}_stage_seconds histogram"]
+                for stage, histogram in sorted(self.stages.items()):
+                    cumulative = 0
+                    for bound, size in zip(list(histogram.bounds) + ['+Inf'], histogram.buckets):
+                        cumulative += size
+                        lines.append(f'{prefix}_stage_seconds_bucket{Metrics.labels(stage=stage, le=bound)} {cumulative}')
+                    lines.append(f'{prefix}_stage_seconds_sum{Metrics.labels(stage=stage)} {histogram.sum}')
+                    lines.append(f'{prefix}_stage_seconds_count{Metrics.labels(stage=stage)} {histogram.count}')
+
+            names = sorted({ name for name, _ in self.counters })
+            for name in names:
+                lines.append(f"# TYPE {prefix}_{name}_total counter")
+                for (counter, labels), value in sorted(self.counters.items()):
+                    if counter == name:
+                        lines.append(f'{prefix}_{name}_total{Metrics.labels(**dict(labels))} {value}')
+
+        lines += [f"# TYPE {prefix}_entries gauge",
+                  f'{prefix}_entries{Metrics.labels(state="done")} {self.done}',
+                  f'{prefix}_entries{Metrics.labels(state="total")} {self.total}',
+                  f"# TYPE {prefix}_elapsed_seconds gauge",
+                  f"{prefix}_elapsed_seconds {time.monotonic() - self.started}"]
+
+        ratios = self.cache_ratios()
+        if ratios:
+            lines.append(f"# TYPE {prefix}_cache_hit_ratio gauge")
+            lines += [ f'{prefix}_cache_hit_ratio{Metrics.labels(cache=cache)} {stats["hit_ratio"]}'
+                       for cache, stats in sorted(ratios.items()) ]
+
+        Metrics.write_atomic(path, '\n'.join(lines) + '\n')
+
+
+    def labels ( **labels ) -> str:
+        """ Prometheus label set """
+        if not labels:
+            return ''
+        escape = lambda value: str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in labels.items()) + '}'
+
+
+    def write_atomic ( path:str, text:str ) -> None:
+        """ Write through a temporary file so readers never see a partial file """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + '.tmp')
+        with open(tmp, 'w', encoding='utf-8') as outfile:
+            outfile.write(text)
+        os.replace(tmp, path)
+
+
+Metrics.SHARED = Metrics()
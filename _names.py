@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import requests
+from typing import List, Dict, Optional
+from ._cache import ResultCache, LRUCache
+from ._ratelimit import RateLimiter
+from ._metrics import Metrics
+from ._nametable import NameTable
+
+class NameInference:
+    """
+    Batched access to the Genderize and Nationalize APIs. Every answer is kept
+    in an in-process LRU and, if a cache file is given, in a persistent
+    name -> result store, so a name is only requested once. With a local name
+    table, the names it has are never requested and the API answers of the
+    other names are written back to it.
+    --------------------------------------------------------------------
+        :param cache:   SQLite file for the persistent store. None disables it
+        :param ttl:     Seconds before a stored answer expires
+        :param maxsize: Maximum number of stored answers per service
+        :param lrusize: Maximum number of answers kept in memory
+        :param table:   Local name table checked before the store and the APIs
+
+    """
+
+    # Main Params
+    GENDERIZE_URL = 'https://api.genderize.io'
+    NATIONALIZE_URL = 'https://api.nationalize.io'
+    BATCH_SIZE = 10
+    TIMEOUT = 30
+
+    def __init__( self, cache:Optional[str]=None, ttl:Optional[float]=None, maxsize:Optional[int]=None, lrusize:int=4096,
+                  table:Optional[NameTable]=None ):
+        self.session = requests.Session()
+        self.lru = LRUCache(lrusize)
+        self.table = table
+        self.store = {
+            'genderize': ResultCache(cache, 'genderize', ttl=ttl, maxsize=maxsize),
+            'nationalize': ResultCache(cache, 'nationalize', ttl=ttl, maxsize=maxsize)
+        } if cache is not None else {}
+        self.num_requests = {'genderize': 0, 'nationalize': 0}
+
+
+    def nationalize ( self, names:List[str] ) -> Dict[str,Dict]:
+        """
+        Raw Nationalize answer for each name.
+        ------------------------------------
+            :param names: Names or surnames to look up
+
+        """
+        return self.lookup('nationalize', NameInference.NATIONALIZE_URL, names, '')
+
+
+    def genderize ( self, names:List[str], country_id:str='' ) -> Dict[str,Dict]:
+        """
+        Raw Genderize answer for each name localized to a country.
+        ------------------------------------
+            :param names:      Names to look up
+            :param country_id: ISO 3166-1 country code, empty for a global answer
+
+        """
+        return self.lookup('genderize', NameInference.GENDERIZE_URL, names, country_id or '')
+
+
+    def lookup ( self, service:str, url:str, names:List[str], country_id:str ) -> Dict[str,Dict]:
+        """
+        Resolve names from memory, then from the local table and the persistent
+        store, and the remaining ones with batched requests of BATCH_SIZE names.
+        ------------------------------------
+            :param service:    'genderize' or 'nationalize'
+            :param url:        API endpoint
+            :param names:      Names to look up
+            :param country_id: Country used to localize the answer
+
+        """
+        results = dict()
+        pending = []
+
+        for name in dict.fromkeys(names):
+            key = f"{country_id}:{name.lower()}"
+
+            value = self.lru.get(f"{service}:{key}")
+            Metrics.SHARED.count('cache_lookups', cache=f"{service}_memory", result='hit' if value is not None else 'miss')
+            if value is None and self.table is not None and name.strip():
+                value = self.table.get(service, name, country_id)
+                Metrics.SHARED.count('cache_lookups', cache=f"{service}_table", result='hit' if value is not None else 'miss')
+                if value is not None:
+                    self.lru.set(f"{service}:{key}", value)
+            if value is None and service in self.store:
+                value = self.store[service].get(key)
+                if value is not None:
+                    self.lru.set(f"{service}:{key}", value)
+
+            if value is not None:
+                results[name] = value
+            elif name.strip():
+                pending.append(name)
+            else:
+                results[name] = NameInference.empty(service, name)
+
+        for start in range(0, len(pending), NameInference.BATCH_SIZE):
+            batch = pending[start:start + NameInference.BATCH_SIZE]
+            params = [('name[]', name) for name in batch]
+            if country_id:
+                params.append(('country_id', country_id))
+
+            RateLimiter.SHARED.acquire(url)
+            response = self.session.get(url, params=params, timeout=NameInference.TIMEOUT)
+            self.num_requests[service] += 1
+            if response.status_code == 429:
+                RateLimiter.SHARED.penalize(url, RateLimiter.retry_after(response))
+            response.raise_for_status()
+            RateLimiter.SHARED.reward(url)
+
+            for name, value in zip(batch, response.json()):
+                key = f"{country_id}:{name.lower()}"
+                self.lru.set(f"{service}:{key}", value)
+                if service in self.store:
+                    self.store[service].set(key, value)
+                if self.table is not None:
+                    self.table.add(service, name, value, country_id)
+                results[name] = value
+
+        return results
+
+
+    def empty ( service:str, name:str ) -> Dict:
+        """ Answer used for blank names, which are never sent to the APIs """
+        if service == 'genderize':
+            return {'name': name, 'gender': None, 'probability': 0.0, 'count': 0}
+        return {'name': name, 'country': []}
+
+
+    def stats ( self ) -> Dict[str,Dict]:
+        """ Request counters and cache hit ratios """
+        total = self.lru.hits + self.lru.misses
+        stats = {
+            'requests': dict(self.num_requests),
+            'memory': {'hits': self.lru.hits, 'misses': self.lru.misses,
+                       'hit_ratio': round(self.lru.hits / total, 4) if total else 0.0}
+        }
+        for service, store in self.store.items():
+            stats[service] = store.stats()
+        if self.table is not None:
+            stats['table'] = self.table.stats()
+        return stats
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import csv
+import atexit
+import threading
+from array import array
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+class PackedColumns:
+    """
+    Read-only sorted table stored in flat arrays: the keys are concatenated in
+    a single UTF-8 buffer with an offsets array, and each value is split in
+    typed columns (label index, probability, count). Lookups are a binary
+    search, and memory stays a few bytes per row instead of a dict per name.
+    --------------------------------------------------------------------
+        :param rows: (key, label, probability, count) tuples
+
+    """
+
+    def __init__( self, rows:Iterable[Tuple[str,str,float,int]] = () ):
+        latest = dict()
+        for key, label, probability, count in rows:
+            latest[key] = (label, probability, count)
+
+        self.labels = []
+        codes = dict()
+        keys = bytearray()
+        self.offsets = array('I', [0])
+        self.codes = array('H')
+        self.probabilities = array('f')
+        self.counts = array('I')
+
+        for key in sorted(latest):
+            label, probability, count = latest[key]
+            if label not in codes:
+                codes[label] = len(self.labels)
+                self.labels.append(label)
+            keys += key.encode('utf-8')
+            self.offsets.append(len(keys))
+            self.codes.append(codes[label])
+            self.probabilities.append(float(probability or 0.0))
+            self.counts.append(int(count or 0))
+
+        self.keys = bytes(keys)
+
+
+    def key ( self, i:int ) -> bytes:
+        return self.keys[self.offsets[i]:self.offsets[i + 1]]
+
+
+    def find ( self, key:str ) -> Optional[Tuple[str,float,int]]:
+        """ (label, probability, count) of a key, None if it is missing """
+        target = key.encode('utf-8')
+        low, high = 0, len(self)
+        while low < high:
+            middle = (low + high) // 2
+            if self.key(middle) < target:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(self) and self.key(low) == target:
+            return self.labels[self.codes[low]], round(self.probabilities[low], 4), self.counts[low]
+        return None
+
+
+    def rows ( self ) -> Iterable[Tuple[str,str,float,int]]:
+        for i in range(len(self)):
+            yield self.key(i).decode('utf-8'), self.labels[self.codes[i]], round(self.probabilities[i], 4), self.counts[i]
+
+
+    def __len__ ( self ) -> int:
+        return len(self.offsets) - 1
+
+
+class NameTable:
+    """
+    Local name -> gender / nationality table loaded from a CSV file, such as
+    an export of earlier Genderize/Nationalize answers or a public name
+    dataset. Answers are returned with the shape of the APIs. Names the
+    table does not have are resolved by the APIs and appended to the CSV, so
+    the table keeps growing between runs.
+
+    CSV columns: service (genderize/nationalize), name, country_id, gender,
+    probability and count. For genderize rows country_id is the country the
+    answer is localized to (empty for a global answer), for nationalize rows
+    it is the most likely country of the name. Without a service column, rows
+    with a gender are genderize rows.
+    --------------------------------------------------------------------
+        :param path: CSV file of the table. It is created when answers are added
+
+    """
+
+    # Main Params
+    FIELDNAMES = ['service', 'name', 'country_id', 'gender', 'probability', 'count']
+    GENDERS = {'m': 'male', 'male': 'male', 'f': 'female', 'female': 'female'}
+    MERGE_EVERY = 10000
+    FLUSH_EVERY = 100
+
+    def __init__( self, path:Optional[str] = None ):
+        self.path = Path(path) if path is not None else None
+        self.columns = {'genderize': PackedColumns(), 'nationalize': PackedColumns()}
+        self.recent = {'genderize': dict(), 'nationalize': dict()}
+        self.hits = 0
+        self.misses = 0
+        self._rows = []
+        self._lock = threading.Lock()
+        self._file_lock = threading.Lock()
+
+        if self.path is not None and self.path.exists():
+            self.upgrade()
+            self.load()
+        if self.path is not None:
+            atexit.register(self.flush)
+
+
+    def key ( country_id:str, name:str ) -> str:
+        """ Key of an answer, the same NameInference uses """
+        return f"{country_id or ''}:{name.lower()}"
+
+
+    def load ( self ) -> None:
+        """ Read the CSV file once and pack it """
+        rows = {'genderize': [], 'nationalize': []}
+        with open(self.path, 'r', newline='', encoding='utf-8') as csvfile:
+            for row in csv.DictReader(csvfile):
+                parsed = NameTable.parse(row)
+                if parsed is not None:
+                    rows[parsed[0]].append(parsed[1:])
+        self.columns = { service: PackedColumns(service_rows) for service, service_rows in rows.items() }
+
+
+    def parse ( row:Dict[str,str] ) -> Optional[Tuple]:
+        """ (service, key, label, probability, count) of a CSV row """
+        name = (row.get('name') or '').strip()
+        if not name:
+            return None
+        gender = NameTable.GENDERS.get((row.get('gender') or '').strip().lower(), '')
+        service = (row.get('service') or ('genderize' if gender else 'nationalize')).strip().lower()
+        country_id = (row.get('country_id') or '').strip().upper()
+        probability = float(row.get('probability') or 0.0)
+        count = int(float(row.get('count') or 0))
+
+        if service == 'genderize':
+            return service, NameTable.key(country_id, name), gender, probability, count
+        if service == 'nationalize':
+            return service, NameTable.key('', name), country_id, probability, count
+        return None
+
+
+    def get ( self, service:str, name:str, country_id:str = '' ) -> Optional[Dict]:
+        """
+        Answer of a name with the shape of the API, None if the table does not have it.
+        ------------------------------------
+            :param service:    'genderize' or 'nationalize'
+            :param name:       Name or surname
+            :param country_id: Country the gender is localized to
+
+        """
+        key = NameTable.key(country_id if service == 'genderize' else '', name)
+        with self._lock:
+            found = self.recent[service].get(key)
+            if found is None:
+                found = self.columns[service].find(key)
+            if found is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+
+        label, probability, count = found
+        if service == 'genderize':
+            answer = {'name': name, 'gender': label or None, 'probability': probability, 'count': count}
+            if country_id:
+                answer['country_id'] = country_id
+            return answer
+        return {'name': name, 'country': [{'country_id': label, 'probability': probability}] if label else []}
+
+
+    def add ( self, service:str, name:str, value:Dict, country_id:str = '' ) -> None:
+        """
+        Store an API answer, it is written back to the CSV file.
+        ------------------------------------
+            :param service:    'genderize' or 'nationalize'
+            :param name:       Name or surname
+            :param value:      Answer of the API
+            :param country_id: Country the gender is localized to
+
+        """
+        if service == 'genderize':
+            key = NameTable.key(country_id, name)
+            found = (value.get('gender') or '', value.get('probability') or 0.0, value.get('count') or 0)
+            row = {'service': service, 'name': name, 'country_id': country_id or '', 'gender': found[0],
+                   'probability': found[1], 'count': found[2]}
+        else:
+            key = NameTable.key('', name)
+            top = (value.get('country') or [{}])[0]
+            found = (top.get('country_id', ''), top.get('probability', 0.0), 0)
+            row = {'service': service, 'name': name, 'country_id': found[0], 'gender': '',
+                   'probability': found[1], 'count': ''}
+
+        with self._lock:
+            self.recent[service][key] = found
+            self._rows.append(row)
+            flush = len(self._rows) >= NameTable.FLUSH_EVERY
+            if len(self.recent[service]) >= NameTable.MERGE_EVERY:
+                self.merge(service)
+        if flush:
+            self.flush()
+
+
+    def merge ( self, service:str ) -> None:
+        """ Pack the recent answers of a service with the table (the lock is held) """
+        recent = [ (key, *found) for key, found in self.recent[service].items() ]
+        self.columns[service] = PackedColumns(list(self.columns[service].rows()) + recent)
+        self.recent[service] = dict()
+
+
+    def flush ( self ) -> None:
+        """ Append the new answers to the CSV file, one flush at a time (workers and atexit) """
+        with self._lock:
+            rows, self._rows = self._rows, []
+        if self.path is None or not rows:
+            return
+
+        with self._file_lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            new = not self.path.exists() or os.path.getsize(self.path) == 0
+            with open(self.path, 'a', newline='', encoding='utf-8') as csvfile:
+                writer = csv.DictWriter(csvfile, fieldnames=NameTable.FIELDNAMES, extrasaction='ignore', restval='')
+                if new:
+                    writer.writeheader()
+                writer.writerows(rows)
+
+
+    def upgrade ( self ) -> None:
+        """ Rewrite a file with other columns, e.g. a public dataset, with the columns of the table (once, when it is loaded) """
+        if os.path.getsize(self.path) == 0:
+            return
+        with open(self.path, 'r', newline='', encoding='utf-8') as csvfile:
+            fieldnames = next(csv.reader(csvfile), [])
+        if fieldnames[:len(NameTable.FIELDNAMES)] == NameTable.FIELDNAMES:
+            return
+
+        extra = [ name for name in fieldnames if name not in NameTable.FIELDNAMES ]
+        upgraded = self.path.with_name(self.path.name + '.tmp')
+        with open(self.path, 'r', newline='', encoding='utf-8') as source, \
+             open(upgraded, 'w', newline='', encoding='utf-8') as target:
+            writer = csv.DictWriter(target, fieldnames=NameTable.FIELDNAMES + extra, restval='')
+            writer.writeheader()
+            for row in csv.DictReader(source):
+                parsed = NameTable.parse(row)
+                if parsed is None:
+                    continue
+                service = parsed[0]
+                row['service'] = service
+                if service == 'genderize':
+                    row['gender'] = parsed[2]
+                writer.writerow(row)
+        os.replace(upgraded, self.path)
+
+
+    def __len__ ( self ) -> int:
+        return sum(len(columns) + len(self.recent[service]) for service, columns in self.columns.items())
+
+
+    def stats ( self ) -> Dict[str,int]:
+        return {'names': len(self), 'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import re
+import json
+import time
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from ._metrics import Metrics
+
+class PaperStore:
+    """
+    Enriched papers shared by every query, keyed by the GS cluster id and with
+    the DOI as a fallback key. A paper returned by another query is not sent
+    to Crossref and the name APIs again: its stored row is reused and only its
+    rank in the new query is recorded.
+    --------------------------------------------------------------------
+        :param path: SQLite file of the store
+        :param ttl:  Seconds before a stored paper is enriched again. None or 0 never expires
+
+    """
+
+    # Cluster id in SCHOLAR_LINK or in the citation link of a GS result
+    CLUSTER = re.compile(r'(?:info:|cluster=)([^:&/?]+)')
+
+    def __init__( self, path:str, ttl:Optional[float] = None ):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = str(path)
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript('''
+            CREATE TABLE IF NOT EXISTS papers (
+                key TEXT PRIMARY KEY, doi TEXT, row TEXT NOT NULL, created REAL NOT NULL);
+            CREATE INDEX IF NOT EXISTS papers_doi ON papers (doi);
+            CREATE TABLE IF NOT EXISTS ranks (
+                key TEXT NOT NULL, query TEXT NOT NULL, gsrank INTEGER, seen REAL NOT NULL,
+                PRIMARY KEY (key, query));
+        ''')
+        self._conn.commit()
+
+
+    def cluster_id ( link:Optional[str] ) -> Optional[str]:
+        """ GS cluster id of a SCHOLAR_LINK, None if it has none """
+        match = PaperStore.CLUSTER.search(link or '')
+        return match.group(1) if match and match.group(1) not in ('None', '') else None
+
+
+    def key ( cluster:Optional[str], doi:Optional[str] = None ) -> Optional[str]:
+        """ Key of a paper: its cluster id, or its DOI when GS gave no cluster """
+        if cluster:
+            return cluster
+        return f"doi:{doi.lower()}" if doi else None
+
+
+    def get ( self, cluster:str ) -> Optional[Dict[str,str]]:
+        """ Stored row of a cluster, None if it is missing or expired """
+        return self.find('SELECT row, created FROM papers WHERE key = ?', cluster)
+
+
+    def get_doi ( self, doi:str ) -> Optional[Dict[str,str]]:
+        """ Stored row of any paper with a DOI, None if there is none """
+        return self.find('SELECT row, created FROM papers WHERE doi = ? ORDER BY created DESC LIMIT 1', doi.lower(), fallback=True)
+
+
+    def find ( self, sql:str, value:str, fallback:bool = False ) -> Optional[Dict[str,str]]:
+        """ Stored row of a query. Misses of the fallback key are not counted twice """
+        with self._lock:
+            row = self._conn.execute(sql, (value,)).fetchone()
+        if row is None or (self.ttl and time.time() - row[1] > self.ttl):
+            if not fallback:
+                self.misses += 1
+                Metrics.SHARED.count('cache_lookups', cache='papers', result='miss')
+            return None
+        self.hits += 1
+        Metrics.SHARED.count('cache_lookups', cache='papers', result='hit')
+        return json.loads(row[0])
+
+
+    def known ( self, clusters:Iterable[str] ) -> Set[str]:
+        """ Clusters of a list that are stored and not expired """
+        clusters = [ cluster for cluster in clusters if cluster ]
+        if not clusters:
+            return set()
+        since = time.time() - self.ttl if self.ttl else 0.0
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT key FROM papers WHERE created >= ? AND key IN ({', '.join('?' * len(clusters))})",
+                [since, *clusters]).fetchall()
+        return { row[0] for row in rows }
+
+
+    def set ( self, cluster:Optional[str], doi:Optional[str], row:Dict[str,str] ) -> None:
+        """
+        Store the enriched row of a paper.
+        ------------------------------------
+            :param cluster: GS cluster id
+            :param doi:     DOI found in Crossref, if any
+            :param row:     CSV row of the paper
+
+        """
+        key = PaperStore.key(cluster, doi)
+        if key is None:
+            return
+        with self._lock:
+            self._conn.execute('INSERT OR REPLACE INTO papers (key, doi, row, created) VALUES (?, ?, ?, ?)',
+                               (key, doi.lower() if doi else None, json.dumps(row), time.time()))
+            self._conn.commit()
+
+
+    def seen ( self, cluster:Optional[str], doi:Optional[str], query:str, gsrank:int ) -> None:
+        """ Record the rank of a paper in a query """
+        key = PaperStore.key(cluster, doi)
+        if key is None:
+            return
+        with self._lock:
+            self._conn.execute('INSERT OR REPLACE INTO ranks (key, query, gsrank, seen) VALUES (?, ?, ?, ?)',
+                               (key, query, gsrank, time.time()))
+            self._conn.commit()
+
+
+    def ranks ( self, cluster:str ) -> List[Tuple[str,int]]:
+        """ (query, gsrank) of every query where a paper was found """
+        with self._lock:
+            return self._conn.execute('SELECT query, gsrank FROM ranks WHERE key = ? ORDER BY seen', (cluster,)).fetchall()
+
+
+    def __len__ ( self ) -> int:
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM papers').fetchone()[0]
+
+
+    def stats ( self ) -> Dict[str,int]:
+        return {'papers': len(self), 'hits': self.hits, 'misses': self.misses}
+
+
+    def close ( self ) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import threading
+from pathlib import Path
+from typing import Dict, List, Set
+from ._record import Record
+from ._resume import DatedOutputs
+from ._sinks import ParquetSink
+
+class ParquetOutput:
+    """
+    Output of a query as a Parquet dataset partitioned by query and harvest
+    date, <root>/parquet/query=<name>/date=<day>/part-<n>.parquet, so every
+    query and day is read at once with pyarrow.dataset or pandas. Rows are
+    typed as Record and buffered in record batches, each batch written as a
+    new part file (written aside and moved, never left half written). Rows
+    whose GSRANK is already in a part of any day are skipped.
+    --------------------------------------------------------------------
+        :param root:       Output directory given to the CLI
+        :param name:       Name of the query, the stem of its CSV
+        :param day:        Harvest date, YYYY-MM-DD
+        :param batch_size: Number of rows of each part file
+
+    """
+
+    # Main Params
+    DIR = 'parquet'
+    BATCH_SIZE = 100
+
+    def __init__( self, root:str, name:str, day:str, batch_size:int = BATCH_SIZE ):
+        self.pa = ParquetSink.require()
+        self.schema = ParquetSink.get_schema(self.pa)
+        self.query_folder = Path(root) / ParquetOutput.DIR / f"query={name}"
+        self.folder = self.query_folder / f"date={day}"
+        self.batch_size = max(1, batch_size)
+        self.columns = ParquetSink.empty_columns()
+        self.ranks = self.load()
+        self._lock = threading.Lock()
+
+
+    def of ( outfile:str ) -> 'ParquetOutput':
+        """ Parquet output of the CSV path of a query: its folder is the harvest date if it is a dated folder """
+        outfile = Path(outfile)
+        if DatedOutputs.DATE.fullmatch(outfile.parent.name):
+            return ParquetOutput(outfile.parent.parent, outfile.stem, outfile.parent.name)
+        return ParquetOutput(outfile.parent, outfile.stem, time.strftime('%Y-%m-%d'))
+
+
+    def parts ( self ) -> List[Path]:
+        """ Part files of the query of every day, oldest first """
+        return sorted(self.query_folder.glob('date=*/part-*.parquet'))
+
+
+    def load ( self ) -> Set[str]:
+        """ GSRANKs stored on any day, only the GSRANK column of each part is read """
+        ranks = set()
+        for path in self.parts():
+            column = self.pa.parquet.ParquetFile(path).read(columns=['gsrank']).column('gsrank')
+            ranks |= { str(rank) for rank in column.to_pylist() if rank is not None }
+        return ranks
+
+
+    def write ( self, entry:Dict[str,str] ) -> bool:
+        """
+        Buffer a row. Returns False if the GSRANK was already stored.
+        ------------------------------------
+            :param entry: Dict with data
+
+        """
+        record = Record.from_row(entry)
+        with self._lock:
+            rank = str(record.gsrank)
+            if rank in self.ranks:
+                return False
+
+            for name, values in self.columns.items():
+                values.append(getattr(record, name))
+            self.ranks.add(rank)
+
+            if len(self.columns['gsrank']) >= self.batch_size:
+                self.flush_locked()
+        return True
+
+
+    def flush ( self ) -> None:
+        with self._lock:
+            self.flush_locked()
+
+
+    def flush_locked ( self ) -> None:
+        """ Write the buffered rows as a new part file (the lock is held) """
+        if not self.columns['gsrank']:
+            return
+        self.folder.mkdir(parents=True, exist_ok=True)
+        target = self.folder / f"part-{time.time_ns()}.parquet"
+        partial = target.with_name(target.name + '.tmp')
+        batch = self.pa.RecordBatch.from_pydict(self.columns, schema=self.schema)
+        self.pa.parquet.write_table(self.pa.Table.from_batches([batch]), str(partial))
+        os.replace(partial, target)
+        self.columns = ParquetSink.empty_columns()
+
+
+    def close ( self ) -> None:
+        self.flush()
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Callable, Dict, Iterable, List, Iterator, Optional, Tuple
+from ._metrics import Metrics
+
+class Pipeline:
+    """
+    Staged execution of a query: a single producer reads the Google Scholar
+    iterator at the pace GS needs, a bounded pool of workers runs the Crossref
+    and name enrichment of several entries at once and a single writer stores
+    the rows ordered by GSRANK. The Crossref lookups of each GS page are sent
+    together before the entries of the page are enriched. With a raw store,
+    every GS record is saved before it is enriched, and the records can also
+    be only harvested, or enriched from the store without requesting GS.
+    --------------------------------------------------------------------
+        :param scraper:      ScraperGooleScholar instance
+        :param query:        Search query to GS
+        :param outdir:       Folder where store CSV with results
+        :param vpn:          Type of VPN used to change the proxy
+        :param workers:      Number of entries enriched at the same time
+        :param verbose:      Show messages
+        :param raw:          RawStore where the GS records are saved, None disables it
+        :param harvest_only: Save the GS records without enriching them
+        :param sink:         Function receiving (numentry, row) of each entry instead of the CSV, None writes the CSV
+
+    """
+
+    # Sentinel that stops the writer
+    STOP = None
+
+    def __init__( self, scraper, query:str, outdir:str, vpn:str, workers:int=4, verbose:bool=True, raw=None, harvest_only:bool=False,
+                  sink:Optional[Callable[[int,dict],None]]=None ):
+        self.scraper = scraper
+        self.query = query
+        self.outdir = outdir
+        self.vpn = vpn
+        self.workers = max(1, workers)
+        self.verbose = verbose
+        self.raw = raw
+        self.harvest_only = harvest_only
+        self.sink = sink
+        self.written = 0
+        self.failed = 0
+        self._pending = queue.Queue(maxsize=2 * self.workers)
+        self._error = None
+
+
+    def run ( self, search_query:Iterator, numentries:int, entries_to_download:List[str], first:int = 1 ) -> int:
+        """
+        Process the entries of a query. Returns the number of written entries.
+        ------------------------------------
+            :param search_query:        Object with Google Scholar query result
+            :param numentries:          Rank of the last entry to recover
+            :param entries_to_download: GSRANKs that are not in the CSV yet
+            :param first:               Rank of the first entry returned by search_query
+
+        """
+        return self.execute(lambda pool: self.produce(search_query, first, numentries, set(entries_to_download), pool))
+
+
+    def run_records ( self, records:Iterable[Tuple[int,dict]], numentries:int ) -> int:
+        """
+        Enrich GS records of a raw store, without requesting GS. Returns the number of written entries.
+        ------------------------------------
+            :param records:    (numentry, entrydict) of each record, in rank order
+            :param numentries: Number of entries of the query
+
+        """
+        return self.execute(lambda pool: self.produce_records(records, numentries, pool))
+
+
+    def execute ( self, produce:Callable[[ThreadPoolExecutor],None] ) -> int:
+        """ Run a producer with the workers and the writer """
+        writer = threading.Thread(target=self.write, name='gscraper-writer', daemon=True)
+        writer.start()
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='gscraper-enrich') as pool:
+                produce(pool)
+        finally:
+            self._pending.put(Pipeline.STOP)
+            writer.join()
+
+        if self._error is not None:
+            raise self._error
+
+        return self.written
+
+
+    def produce ( self, search_query:Iterator, first:int, numentries:int, entries_to_download:set, pool:ThreadPoolExecutor ) -> None:
+        """ Read the GS entries in order and submit the missing ones to the workers, a GS page at a time """
+        page = []
+        for numentry in range(first, numentries + 1):
+
+            if self._error is not None:
+                break
+
+            # The first page of the iterator is loaded by the query itself
+            new_page = numentry != first and (numentry - 1) % self.scraper.PAGE_SIZE == 0
+
+            # The previous page is complete: enrich it while the next one is requested
+            if new_page:
+                self.submit(page, numentries, pool)
+                page = []
+
+            try:
+                entrydict = self.scraper.fetch_entry(search_query, self.vpn, new_page)
+            except StopIteration:
+                if (self.verbose):
+                    print(f"No more results in Google Scholar after entry {numentry - 1}")
+                break
+
+            if str(numentry) not in entries_to_download:
+                continue
+
+            if self.raw is not None:
+                self.raw.append(numentry, entrydict)
+            page.append((numentry, entrydict))
+
+        if self._error is None:
+            self.submit(page, numentries, pool)
+
+
+    def produce_records ( self, records:Iterable[Tuple[int,dict]], numentries:int, pool:ThreadPoolExecutor ) -> None:
+        """ Submit stored records to the workers in pages of the GS page size """
+        page = []
+        for numentry, entrydict in records:
+
+            if self._error is not None:
+                break
+
+            page.append((numentry, entrydict))
+            if len(page) == self.scraper.PAGE_SIZE:
+                self.submit(page, numentries, pool)
+                page = []
+
+        if self._error is None:
+            self.submit(page, numentries, pool)
+
+
+    def submit ( self, page:List[Tuple[int,dict]], numentries:int, pool:ThreadPoolExecutor ) -> None:
+        """ Bulk Crossref lookup of a page followed by the enrichment of each entry """
+        if not page:
+            return
+
+        # The GS records are safe on disk before anything can fail enriching them
+        if self.raw is not None:
+            self.raw.flush()
+
+        if self.harvest_only:
+            self.written += len(page)
+            Metrics.SHARED.count('entries', len(page), result='harvested')
+            Metrics.SHARED.advance(len(page))
+            return
+
+        # Submitted first, so the workers waiting for it never block the pool
+        batch = pool.submit(self.crossref, page)
+
+        for numentry, entrydict in page:
+            future = pool.submit(self.enrich, entrydict, numentry, numentries, batch)
+
+            # Blocks when the writer is behind, keeping memory bounded
+            self._pending.put((numentry, future))
+
+
+    def crossref ( self, page:List[Tuple[int,dict]] ) -> Dict[int,object]:
+        """ Crossref results of a page, empty if the bulk lookup fails (each entry is looked up alone) """
+        try:
+            return self.scraper.crossref_page(page, self.verbose)
+        except Exception as e:
+            print('\n{}'.format(e))
+            return dict()
+
+
+    def enrich ( self, entrydict:dict, numentry:int, numentries:int, batch:Optional[Future] = None ) -> Optional[dict]:
+        """ Enrichment of an entry, errors drop the entry so it is retried in the next run """
+        try:
+            crossref = batch.result().get(numentry) if batch is not None else None
+            return self.scraper.enrich_entry(entrydict, numentry, numentries, self.verbose, crossref)
+        except Exception as e:
+            print('\n{}'.format(e))
+            print(f"[ Save Error ] There was a problem enriching the entry {numentry}. "
+                  "It will be downloaded in the next run.")
+            return None
+
+
+    def write ( self ) -> None:
+        """ Single writer: rows are stored in the order they were produced (GSRANK) """
+        while True:
+            item = self._pending.get()
+            if item is Pipeline.STOP:
+                break
+
+            numentry, future = item
+
+            # After an error (e.g. the stream was closed) the entries not started are dropped
+            if self._error is not None:
+                future.cancel()
+                continue
+
+            try:
+                entry = future.result()
+                if entry:
+                    if self.sink is not None:
+                        self.sink(numentry, entry)
+                    else:
+                        self.scraper.write(self.query, entry, numentry, self.outdir)
+                    self.written += 1
+                else:
+                    self.failed += 1
+                Metrics.SHARED.count('entries', result='written' if entry else 'failed')
+            except Exception as e:
+                if self._error is None:
+                    self._error = e
+            Metrics.SHARED.advance()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+import random
+import threading
+from urllib.parse import urlparse
+from typing import Dict, List, Optional
+from ._metrics import Metrics
+
+class TokenBucket:
+    """
+    Token bucket of a single host. The rate drops when the host answers with
+    429/CAPTCHA and recovers slowly after successful requests.
+    --------------------------------------------------------------------
+        :param rate:  Requests per second allowed
+        :param burst: Requests that can be sent at once
+
+    """
+
+    # Main Params
+    BACKOFF = 0.5
+    RECOVERY = 1.25
+    BASE_COOLDOWN = 5.0
+    MAX_COOLDOWN = 600.0
+
+    def __init__( self, rate:float, burst:int=1 ):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.strikes = 0
+        self.slept = 0.0
+        self._lock = threading.Lock()
+
+
+    def acquire ( self ) -> float:
+        """ Wait until a request can be sent. Returns the seconds waited """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+            # Reserve a token, the wait covers the missing part and any cooldown
+            self.tokens -= 1
+            wait = max(-self.tokens / self.rate if self.tokens < 0 else 0.0, self.blocked_until - now)
+            self.slept += max(wait, 0.0)
+
+        if wait > 0:
+            time.sleep(wait)
+        return max(wait, 0.0)
+
+
+    def penalize ( self, retry_after:Optional[float]=None ) -> float:
+        """
+        Slow down after a 429/CAPTCHA answer. Returns the cooldown in seconds.
+        ------------------------------------
+            :param retry_after: Cooldown requested by the server, if any
+
+        """
+        with self._lock:
+            self.strikes += 1
+            self.rate = max(self.max_rate * 0.01, self.rate * TokenBucket.BACKOFF)
+            cooldown = min(TokenBucket.MAX_COOLDOWN, TokenBucket.BASE_COOLDOWN * 2 ** (self.strikes - 1))
+            cooldown = max(cooldown * random.uniform(0.5, 1.5), retry_after or 0.0)
+            self.blocked_until = max(self.blocked_until, time.monotonic() + cooldown)
+        return cooldown
+
+
+    def reward ( self ) -> None:
+        """ Successful request: recover the configured rate step by step """
+        with self._lock:
+            self.strikes = max(0, self.strikes - 1)
+            self.rate = min(self.max_rate, self.rate * TokenBucket.RECOVERY)
+
+
+class RateLimiter:
+    """
+    One token bucket per host. Hosts without a configured limit are not throttled.
+    --------------------------------------------------------------------
+        :param limits: Requests per second for each host
+
+    """
+
+    # Default limits (requests per second)
+    LIMITS = {
+        'scholar.google.com': 1 / 15,
+        'api.crossref.org': 10.0,
+        'api.genderize.io': 5.0,
+        'api.nationalize.io': 5.0
+    }
+
+    # Limiter shared by the whole run, replaced by configure
+    SHARED = None
+
+    def __init__( self, limits:Optional[Dict[str,float]]=None ):
+        self.limits = dict(RateLimiter.LIMITS)
+        self.limits.update(limits or {})
+        self.buckets = dict()
+        self._lock = threading.Lock()
+
+
+    def configure ( limits:Optional[Dict[str,float]]=None ) -> 'RateLimiter':
+        """ Replace the shared limiter with new host limits """
+        RateLimiter.SHARED = RateLimiter(limits)
+        return RateLimiter.SHARED
+
+
+    def parse_limits ( values:Optional[List[str]] ) -> Dict[str,float]:
+        """
+        Parse CLI limits in the form HOST=REQUESTS_PER_SECOND.
+        ------------------------------------
+            :param values: List of 'host=rate' strings
+
+        """
+        limits = dict()
+        for value in values or []:
+            host, _, rate = value.partition('=')
+            try:
+                limits[host.strip().lower()] = float(rate)
+            except ValueError:
+                raise ValueError(f"[ Input Error ] Rate limit '{value}' must be HOST=REQUESTS_PER_SECOND")
+            if limits[host.strip().lower()] <= 0:
+                raise ValueError(f"[ Input Error ] Rate limit '{value}' must be greater than 0")
+        return limits
+
+
+    def host ( url:str ) -> str:
+        """ Host of an URL, or the value itself if it is already a host """
+        return (urlparse(url).hostname or url).lower() if '//' in url else url.lower()
+
+
+    def bucket ( self, host:str ) -> Optional[TokenBucket]:
+        host = RateLimiter.host(host)
+        with self._lock:
+            if host not in self.buckets and host in self.limits:
+                self.buckets[host] = TokenBucket(self.limits[host])
+            return self.buckets.get(host)
+
+
+    def acquire ( self, host:str ) -> float:
+        """ Wait for a request slot of a host. Returns the seconds waited """
+        bucket = self.bucket(host)
+        waited = bucket.acquire() if bucket is not None else 0.0
+        Metrics.SHARED.count('requests', host=RateLimiter.host(host))
+        Metrics.SHARED.slept('ratelimit', waited, host=RateLimiter.host(host))
+        return waited
+
+
+    def penalize ( self, host:str, retry_after:Optional[float]=None ) -> float:
+        """ Back off a host after a 429/CAPTCHA answer """
+        bucket = self.bucket(host)
+        Metrics.SHARED.count('throttled', host=RateLimiter.host(host))
+        return bucket.penalize(retry_after) if bucket is not None else 0.0
+
+
+    def reward ( self, host:str ) -> None:
+        bucket = self.bucket(host)
+        if bucket is not None:
+            bucket.reward()
+
+
+    def retry_after ( response ) -> Optional[float]:
+        """ Seconds in the Retry-After header of a response, if any """
+        value = getattr(response, 'headers', {}).get('Retry-After') if response is not None else None
+        try:
+            return float(value) if value is not None else None
+        except ValueError:
+            return None
+
+
+    def stats ( self ) -> Dict[str,Dict[str,float]]:
+        """ Current rate, strikes and time slept per host """
+        with self._lock:
+            return { host: {'rate': round(bucket.rate, 4), 'strikes': bucket.strikes, 'slept': round(bucket.slept, 2)}
+                     for host, bucket in self.buckets.items() }
+
+
+RateLimiter.SHARED = RateLimiter()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+class RawStore:
+    """
+    Append-only JSONL store of the raw Google Scholar records of a query, one
+    line per record with its rank. Records are fsynced at the end of every GS
+    page, so a crash loses at most the page being read. A truncated last line
+    is ignored when the store is read, and cut off before the store is
+    appended again, so it never merges with the next record. The records can be enriched later,
+    or enriched again, without requesting GS.
+    --------------------------------------------------------------------
+        :param path: JSONL file of the store
+
+    """
+
+    # Main Params
+    SUFFIX = '.raw.jsonl'
+
+    def __init__( self, path:str ):
+        self.path = Path(path)
+        self.ranks = { rank for rank, _ in RawStore.read(self.path) }
+        self._file = None
+        self._lock = threading.Lock()
+
+
+    def read ( path:Path ) -> Iterator[Tuple[int,Dict]]:
+        """ (rank, record) of every complete line of a store """
+        if not Path(path).exists():
+            return
+        with open(path, 'r', encoding='utf-8') as rawfile:
+            for line in rawfile:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                yield int(record['rank']), record['entry']
+
+
+    def records ( paths:Iterable[Path], ranks:Optional[Iterable] = None ) -> Dict[int,Dict]:
+        """
+        Records of several stores by rank, the last store read wins.
+        ------------------------------------
+            :param paths: JSONL files, oldest first
+            :param ranks: Only these ranks, None for every rank
+
+        """
+        ranks = { int(rank) for rank in ranks } if ranks is not None else None
+        records = dict()
+        for path in paths:
+            for rank, entry in RawStore.read(path):
+                if ranks is None or rank in ranks:
+                    records[rank] = entry
+        return records
+
+
+    def append ( self, rank:int, entry:Dict ) -> None:
+        """
+        Add a record. It is safe on disk after the next flush.
+        ------------------------------------
+            :param rank:  GSRANK of the record
+            :param entry: Record returned by the GS iterator
+
+        """
+        line = json.dumps({'rank': int(rank), 'fetched': time.time(), 'entry': entry}, default=str)
+        with self._lock:
+            if self._file is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self.repair()
+                self._file = open(self.path, 'a', encoding='utf-8')
+            self._file.write(line + '\n')
+            self.ranks.add(int(rank))
+
+
+    def repair ( self ) -> None:
+        """ Truncate the file back to its last complete line, left after a crash mid-write """
+        if not self.path.exists():
+            return
+        with open(self.path, 'rb+') as rawfile:
+            end = rawfile.seek(0, os.SEEK_END)
+            position = end
+            while position > 0:
+                start = max(0, position - 4096)
+                rawfile.seek(start)
+                chunk = rawfile.read(position - start)
+                newline = chunk.rfind(b'\n')
+                if newline >= 0:
+                    position = start + newline + 1
+                    break
+                position = start
+            if position < end:
+                rawfile.truncate(position)
+
+
+    def flush ( self ) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+
+
+    def close ( self ) -> None:
+        self.flush()
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+    def __contains__ ( self, rank ) -> bool:
+        return int(rank) in self.ranks
+
+
+    def __len__ ( self ) -> int:
+        return len(self.ranks)
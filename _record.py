@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from typing import Any, Dict, Optional
+
+class Record:
+    """
+    Enriched Google Scholar entry with native types: ranks, years and
+    citations are ints and probabilities floats. Fields are stored in
+    __slots__, so a record takes a fraction of the memory of a CSV row dict.
+    Missing values are None.
+    --------------------------------------------------------------------
+        Each CSV column is an attribute with its name in lower case, e.g.
+        record.gsrank, record.num_citations or record.first_author_gender.
+
+    """
+
+    # (attribute, CSV column, type) of each field, in the order of the CSV
+    FIELDS = [
+        ('gsrank',                          'GSRANK',                           int),
+        ('query_success',                   'QUERY_SUCCESS',                    str),
+        ('author',                          'AUTHOR',                           str),
+        ('first_author',                    'FIRST_AUTHOR',                     str),
+        ('last_author',                     'LAST_AUTHOR',                      str),
+        ('author_id',                       'AUTHOR_ID',                        str),
+        ('pub_year',                        'PUB_YEAR',                         int),
+        ('title',                           'TITLE',                            str),
+        ('scholar_link',                    'SCHOLAR_LINK',                     str),
+        ('pub_url',                         'PUB_URL',                          str),
+        ('num_citations',                   'NUM_CITATIONS',                    int),
+        ('suggested_doi',                   'SUGGESTED_DOI',                    str),
+        ('first_author_gender',             'FIRST_AUTHOR_GENDER',              str),
+        ('first_author_gender_probability', 'FIRST_AUTHOR_GENDER_PROBABILITY',  float),
+        ('first_author_nation',             'FIRST_AUTHOR_NATION',              str),
+        ('first_author_country_probability','FIRST_AUTHOR_COUNTRY_PROBABILITY', float),
+        ('last_author_gender',              'LAST_AUTHOR_GENDER',               str),
+        ('last_author_gender_probability',  'LAST_AUTHOR_GENDER_PROBABILITY',   float),
+        ('last_author_nation',              'LAST_AUTHOR_NATION',               str),
+        ('last_author_country_probability', 'LAST_AUTHOR_COUNTRY_PROBABILITY',  float),
+    ]
+
+    # Text written for a missing value by the enrichment
+    MISSING = ('', 'None', 'NA', 'nan')
+
+    __slots__ = tuple(name for name, _, _ in FIELDS)
+
+    def __init__( self, **values ):
+        for name, _, _ in Record.FIELDS:
+            setattr(self, name, values.get(name))
+
+
+    def parse ( value:Any, kind:type ) -> Optional[Any]:
+        """ Native value of a CSV field, None if it is missing or malformed """
+        if value is None or (isinstance(value, str) and value.strip() in Record.MISSING):
+            return None
+        try:
+            return kind(float(value)) if kind is int else kind(value)
+        except (TypeError, ValueError):
+            return None
+
+
+    def from_row ( row:Dict[str,Any] ) -> 'Record':
+        """ Record of a CSV row, as built by the scraper or read from a CSV file """
+        record = Record.__new__(Record)
+        for name, column, kind in Record.FIELDS:
+            setattr(record, name, Record.parse(row.get(column), kind))
+        return record
+
+
+    def row ( self ) -> Dict[str,str]:
+        """ CSV row of the record """
+        return { column: '' if getattr(self, name) is None else str(getattr(self, name))
+                 for name, column, _ in Record.FIELDS }
+
+
+    def as_dict ( self ) -> Dict[str,Any]:
+        """ Native values of the record by attribute """
+        return { name: getattr(self, name) for name, _, _ in Record.FIELDS }
+
+
+    def __eq__ ( self, other ) -> bool:
+        return isinstance(other, Record) and self.as_dict() == other.as_dict()
+
+
+    def __repr__ ( self ) -> str:
+        return f"Record(gsrank={self.gsrank!r}, title={self.title!r})"
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import csv
+import threading
+from pathlib import Path
+from typing import List, Dict, Optional, Set
+
+class ResumeIndex:
+    """
+    GSRANKs already stored in an output CSV. The ranks are loaded once and kept
+    in a sidecar file (<csv>.idx, one rank per line) so a resumed run does not
+    need to parse the whole CSV. The sidecar is rebuilt from the CSV when it is
+    missing or older than the CSV.
+    --------------------------------------------------------------------
+        :param outfile: Output CSV of the query
+
+    """
+
+    # Main Params
+    GSRANK_KEY = 'GSRANK'
+    SUFFIX = '.idx'
+
+    def __init__( self, outfile:str ):
+        self.outfile = Path(outfile)
+        self.sidecar = Path(str(outfile) + ResumeIndex.SUFFIX)
+        self.ranks = self.load()
+        self._pending = []
+
+
+    def load ( self ) -> Set[str]:
+        """ Ranks from the sidecar file, or from the CSV if the sidecar is stale """
+        if not self.outfile.exists():
+            if self.sidecar.exists():
+                self.sidecar.unlink()
+            return set()
+
+        if self.sidecar.exists() and self.sidecar.stat().st_mtime >= self.outfile.stat().st_mtime:
+            with open(self.sidecar, 'r', encoding='utf-8') as idxfile:
+                return { line.strip() for line in idxfile if line.strip() }
+
+        return self.rebuild()
+
+
+    def rebuild ( self ) -> Set[str]:
+        """ Scan the CSV once and write a fresh sidecar file """
+        with open(self.outfile, 'r', newline='', encoding='utf-8') as csvfile:
+            ranks = { row.get(ResumeIndex.GSRANK_KEY) for row in csv.DictReader(csvfile) }
+        ranks.discard(None)
+
+        with open(self.sidecar, 'w', encoding='utf-8') as idxfile:
+            idxfile.writelines(f"{rank}\n" for rank in sorted(ranks, key=ResumeIndex.order))
+        return ranks
+
+
+    def order ( rank:str ):
+        """ Numeric order of ranks """
+        return (0, int(rank)) if str(rank).isdigit() else (1, str(rank))
+
+
+    def __contains__ ( self, rank ) -> bool:
+        return str(rank) in self.ranks
+
+
+    def __len__ ( self ) -> int:
+        return len(self.ranks)
+
+
+    def add ( self, rank ) -> None:
+        """ Register a rank. It reaches the sidecar file on flush """
+        rank = str(rank)
+        if rank in self.ranks:
+            return
+        self.ranks.add(rank)
+        self._pending.append(rank)
+
+
+    def flush ( self ) -> None:
+        """ Append the new ranks to the sidecar file """
+        if not self._pending:
+            return
+        with open(self.sidecar, 'a', encoding='utf-8') as idxfile:
+            idxfile.writelines(f"{rank}\n" for rank in self._pending)
+            idxfile.flush()
+            os.fsync(idxfile.fileno())
+        self._pending = []
+
+
+    def close ( self ) -> None:
+        self.flush()
+
+
+class CSVWriter:
+    """
+    Append-only CSV writer that keeps the output file open and flushes rows in
+    batches. Rows whose GSRANK is already in the resume index are skipped.
+    --------------------------------------------------------------------
+        :param outfile:     Output CSV of the query
+        :param fieldnames:  CSV columns
+        :param flush_every: Number of rows buffered before flushing to disk
+
+    """
+
+    def __init__( self, outfile:str, fieldnames:List[str], flush_every:int=10 ):
+        self.outfile = Path(outfile)
+        self.fieldnames = fieldnames
+        self.flush_every = max(1, flush_every)
+        self.index = ResumeIndex(outfile)
+        self.buffered = 0
+        self._lock = threading.Lock()
+        self._csvfile = None
+        self._writer = None
+
+
+    def open ( self ) -> None:
+        self._csvfile = open(self.outfile, 'a', newline='', encoding='utf-8')
+        self._writer = csv.DictWriter(self._csvfile, fieldnames=self.fieldnames, delimiter=',')
+        if self._csvfile.tell() == 0:
+            self._writer.writeheader()
+
+
+    def write ( self, entry:Dict[str,str] ) -> bool:
+        """
+        Append a row. Returns False if the GSRANK was already stored.
+        ------------------------------------
+            :param entry: Dict with data
+
+        """
+        with self._lock:
+            rank = entry.get(ResumeIndex.GSRANK_KEY)
+            if rank in self.index:
+                return False
+
+            if self._writer is None:
+                self.open()
+
+            self._writer.writerow(entry)
+            self.index.add(rank)
+            self.buffered += 1
+
+            if self.buffered >= self.flush_every:
+                self.flush_locked()
+        return True
+
+
+    def flush ( self ) -> None:
+        with self._lock:
+            self.flush_locked()
+
+
+    def flush_locked ( self ) -> None:
+        """ CSV first and sidecar after, so the sidecar never lists unsaved rows """
+        if self._csvfile is not None:
+            self._csvfile.flush()
+            os.fsync(self._csvfile.fileno())
+        self.index.flush()
+        self.buffered = 0
+
+
+    def close ( self ) -> None:
+        with self._lock:
+            self.flush_locked()
+            if self._csvfile is not None:
+                self._csvfile.close()
+                self._csvfile = None
+                self._writer = None
+            self.index.close()
+
+
+class DatedOutputs:
+    """
+    Output CSVs of the queries spread over the dated folders of an output
+    directory (<root>/YYYY-MM-DD/<query>.csv) and the compacted CSVs merged
+    into the root (<root>/<query>.csv). Every file keeps its resume index, so
+    the ranks of a query over all the days are read from the sidecars.
+    --------------------------------------------------------------------
+        :param root: Output directory given to the CLI
+
+    """
+
+    # Name of the dated folders
+    DATE = re.compile(r'\d{4}-\d{2}-\d{2}')
+
+    def __init__( self, root:str ):
+        self.root = Path(root)
+
+
+    def of ( outfile:str ) -> Optional['DatedOutputs']:
+        """ Outputs of the root of an output CSV, None if it is not in a dated folder """
+        outfile = Path(outfile)
+        if not DatedOutputs.DATE.fullmatch(outfile.parent.name):
+            return None
+        return DatedOutputs(outfile.parent.parent)
+
+
+    def folders ( self ) -> List[Path]:
+        """ Dated folders, oldest first """
+        if not self.root.is_dir():
+            return []
+        return sorted(path for path in self.root.iterdir() if path.is_dir() and DatedOutputs.DATE.fullmatch(path.name))
+
+
+    def files ( self, name:str ) -> List[Path]:
+        """ CSVs of a query, oldest first: the compacted one and then one per day """
+        files = [ folder / name for folder in self.folders() if (folder / name).exists() ]
+        return ([self.root / name] if (self.root / name).exists() else []) + files
+
+
+    def names ( self ) -> List[str]:
+        """ CSV names of every query with outputs """
+        return sorted({ path.name for folder in self.folders() for path in folder.glob('*.csv') })
+
+
+    def ranks ( self, name:str, exclude:Optional[str] = None ) -> Set[str]:
+        """
+        GSRANKs of a query stored on any day.
+        ------------------------------------
+            :param name:    CSV name of the query
+            :param exclude: CSV not read, e.g. the one of the current run
+
+        """
+        ranks = set()
+        for path in self.files(name):
+            if exclude is None or path.resolve() != Path(exclude).resolve():
+                ranks |= ResumeIndex(path).ranks
+        return ranks
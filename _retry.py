@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+import random
+import threading
+import requests
+from typing import Callable, Dict, Optional
+from ._metrics import Metrics
+
+class CircuitOpenError(Exception):
+    """ The service failed too many times in a row and is not called for a while """
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker of a service. After `threshold` consecutive failures the
+    circuit opens and calls fail fast until `reset_timeout` seconds pass, then
+    a single trial call decides if it closes again.
+    --------------------------------------------------------------------
+        :param service:       Name of the service
+        :param threshold:     Consecutive failures that open the circuit
+        :param reset_timeout: Seconds the circuit stays open
+
+    """
+
+    def __init__( self, service:str, threshold:int=5, reset_timeout:float=60.0 ):
+        self.service = service
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trips = 0
+        self._lock = threading.Lock()
+
+
+    def remaining ( self ) -> float:
+        """ Seconds until the circuit accepts a trial call, 0 if it is closed """
+        with self._lock:
+            if self.opened_at is None:
+                return 0.0
+            return max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+
+
+    def record_success ( self ) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+
+    def record_failure ( self ) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                if self.opened_at is None:
+                    self.trips += 1
+                self.opened_at = time.monotonic()
+
+
+class Retrier:
+    """
+    Retry engine that classifies failures by service and error type:
+        - blocked:   Google Scholar block or CAPTCHA, the proxy is rotated
+        - transient: timeouts, connection errors and 5xx answers
+        - quota:     429/402 answers of Crossref or the name APIs
+        - fatal:     any other error, it is raised without retrying
+    Only the failing call is retried, with exponential backoff and jitter.
+    --------------------------------------------------------------------
+    """
+
+    # Services
+    SCHOLAR = 'scholar'
+    CROSSREF = 'crossref'
+    NAMES = 'names'
+
+    # Main Params
+    BASE_DELAY = 2.0
+    MAX_DELAY = 120.0
+    MAX_WAIT_OPEN = 300.0
+
+    # One breaker per service, shared by the whole run
+    BREAKERS = dict()
+    _lock = threading.Lock()
+
+    # Retries done per service and error type
+    RETRIES = dict()
+
+
+    def breaker ( service:str ) -> CircuitBreaker:
+        with Retrier._lock:
+            if service not in Retrier.BREAKERS:
+                Retrier.BREAKERS[service] = CircuitBreaker(service)
+            return Retrier.BREAKERS[service]
+
+
+    def classify ( service:str, error:Exception ) -> str:
+        """
+        Type of a failure: 'blocked', 'transient', 'quota' or 'fatal'.
+        ------------------------------------
+            :param service: Service that raised the error
+            :param error:   Raised exception
+
+        """
+        name = type(error).__name__
+        status = getattr(getattr(error, 'response', None), 'status_code', None)
+
+        if service == Retrier.SCHOLAR:
+            if name in ('MaxTriesExceededException', 'DOSException') or status in (403, 429) \
+                    or 'captcha' in str(error).lower():
+                return 'blocked'
+
+        if status in (402, 429):
+            return 'quota'
+
+        if isinstance(error, (requests.exceptions.Timeout, requests.exceptions.ConnectionError, TimeoutError, ConnectionError)) \
+                or (status is not None and status >= 500) \
+                or type(error).__module__.startswith('httpx') and any(kind in name for kind in ('Timeout', 'Connect', 'Network', 'Protocol')):
+            return 'transient'
+
+        return 'fatal'
+
+
+    def delay ( attempt:int ) -> float:
+        """ Exponential backoff with jitter """
+        return min(Retrier.MAX_DELAY, Retrier.BASE_DELAY * 2 ** attempt) * random.uniform(0.5, 1.5)
+
+
+    def call ( service:str, function:Callable, *args, attempts:int=5, on_blocked:Optional[Callable]=None, **kwargs ):
+        """
+        Call a function retrying the recoverable failures of a service.
+        ------------------------------------
+            :param service:    Service reached by the function
+            :param function:   Function to call with *args and **kwargs
+            :param attempts:   Maximum number of calls
+            :param on_blocked: Called when the service blocks us (proxy rotation)
+
+        """
+        breaker = Retrier.breaker(service)
+
+        for attempt in range(attempts):
+
+            # Wait for the circuit to accept a trial call
+            remaining = breaker.remaining()
+            if remaining > Retrier.MAX_WAIT_OPEN:
+                raise CircuitOpenError(f"[ Circuit Error ] {service} is failing, calls suspended for {remaining:.0f} seconds")
+            if remaining > 0:
+                Metrics.SHARED.slept('circuit', remaining, service=service)
+                time.sleep(remaining)
+
+            try:
+                result = function(*args, **kwargs)
+
+            except StopIteration:
+                breaker.record_success()
+                raise
+
+            except Exception as e:
+                kind = Retrier.classify(service, e)
+                if kind == 'fatal':
+                    raise
+
+                breaker.record_failure()
+                with Retrier._lock:
+                    key = f"{service}:{kind}"
+                    Retrier.RETRIES[key] = Retrier.RETRIES.get(key, 0) + 1
+                Metrics.SHARED.count('retries', service=service, kind=kind)
+
+                if attempt + 1 >= attempts:
+                    raise
+
+                print(f"[ Retry Warning ] {service} {kind} error: {e}. Attempt {attempt + 1}/{attempts}")
+
+                if kind == 'blocked' and on_blocked is not None:
+                    on_blocked()
+                else:
+                    delay = Retrier.delay(attempt)
+                    Metrics.SHARED.slept('retry', delay, service=service)
+                    time.sleep(delay)
+
+            else:
+                breaker.record_success()
+                return result
+
+
+    def stats ( ) -> Dict[str,Dict]:
+        """ Retries per service and error type and breaker trips """
+        with Retrier._lock:
+            return {
+                'retries': dict(Retrier.RETRIES),
+                'circuit_trips': { service: breaker.trips for service, breaker in Retrier.BREAKERS.items() }
+            }
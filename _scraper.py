@@ -1,17 +1,31 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import sys
 import re
+import queue
+import asyncio
 import csv
+import os
 import time
-import requests
+import threading
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 from ._proxy import Proxy
-from bs4 import BeautifulSoup
 from scholarly import scholarly
 from ._crossref import CrossrefAPI
-from typing import List, Dict, Iterator
+from ._resume import CSVWriter, DatedOutputs
+from ._ratelimit import RateLimiter
+from ._retry import Retrier
+from ._metrics import Metrics
+from ._availability import AvailabilityProbe
+from ._gsfetch import GSSearch
+from ._papers import PaperStore
+from ._rawstore import RawStore
+from ._pipeline import Pipeline
+from ._record import Record
+from ._sinks import Sink
+from ._parquet import ParquetOutput
+from typing import AsyncIterator, List, Dict, Iterator, Tuple
 from ._demografix import GenderPredictor
 
 class ScraperGooleScholar:
@@ -40,9 +54,211 @@ class ScraperGooleScholar:
     LAST_AUTHOR_NATION_PROBABILITY = 'LAST_AUTHOR_COUNTRY_PROBABILITY'
     QUERY_SUCCESS = 'QUERY_SUCCESS'
     NUM_ATTEMPTS = 20
+    PAGE_SIZE = 10
+    MAX_RESULTS = 1000
+
+    # GS client: 'scholarly' or 'native' (page-level fetcher and parser)
+    FETCHER = 'scholarly'
+
+    # Output backend: 'csv' or 'parquet'
+    OUTPUT = 'csv'
+
+    # Enriched papers shared by every query, disabled until set_papers is called
+    PAPERS = None
+    GS_HOST = 'scholar.google.com'
+    FLUSH_EVERY = 10
+
+    # Records enriched ahead of a slow stream consumer
+    STREAM_BUFFER = 100
+
+    # Folders of the dated output where a refreshed or re-enriched CSV is written before replacing the old one
+    REFRESH_DIR = '.refresh'
+    REENRICH_DIR = '.reenrich'
+    FIELDNAMES = [
+        GSRANK_KEY, 
+        QUERY_SUCCESS,
+        FULL_AUTHORS, 
+        FIRST_AUTHOR, 
+        LAST_AUTHOR, 
+        AUTHOR_ID, 
+        PUB_YEAR_KEY,
+        TITLE_KEY, 
+        SCHOLAR_LINK_KEY, 
+        PUB_URL_KEY,
+        NUM_CITATIONS_KEY,
+        DOI_KEY,
+        FIRST_AUTHOR_GENDER,
+        FIRST_AUTHOR_GENDER_PROBABILITY,
+        FIRST_AUTHOR_NATION,
+        FIRST_AUTHOR_NATION_PROBABILITY,
+        LAST_AUTHOR_GENDER,
+        LAST_AUTHOR_GENDER_PROBABILITY,
+        LAST_AUTHOR_NATION,
+        LAST_AUTHOR_NATION_PROBABILITY
+    ]
+
+    def __init__( self ):
+        # Open CSV writers with their resume index, one per output file
+        self.writers = dict()
+
+        # Rows of the papers already stored, by cluster id, reused by a refresh
+        self.known = dict()
+
+        # (first, last) publication years of the GS results, None for every year
+        self.years = None
+        self.reused = 0
+        self._lock = threading.Lock()
+
+    def set_papers ( path:str, ttl:float = None ) -> PaperStore:
+        """
+        Reuse the enrichment of the papers already found by any query.
+        ------------------------------------
+            :param path: SQLite file where the papers are stored
+            :param ttl:  Seconds before a stored paper is enriched again
+
+        """
+        ScraperGooleScholar.PAPERS = PaperStore(path, ttl=ttl)
+        return ScraperGooleScholar.PAPERS
+
+    def get_outfile ( query:str, outdir:str ) -> Path:
+        """ Final csv file of a query """
+        regex = re.compile('[^a-zA-Z]')
+        return Path(outdir) / (regex.sub('', query.lower())[:15] + '.csv')
+
+    def get_rawfile ( query:str, outdir:str ) -> Path:
+        """ Raw store of the GS records of a query """
+        outfile = ScraperGooleScholar.get_outfile(query, outdir)
+        return outfile.with_name(outfile.stem + RawStore.SUFFIX)
+
+    def get_day_files ( path:Path ) -> List[Path]:
+        """ A file of a query and the ones of the other days, oldest first """
+        dated = DatedOutputs.of(path)
+        files = dated.files(path.name) if dated is not None else []
+        if path.exists() and all(other.resolve() != path.resolve() for other in files):
+            files.append(path)
+        return files
+
+    def get_raw_records ( self, query:str, outdir:str, ranks:List[str] = None ) -> Dict[int,Dict]:
+        """
+        GS records of a query fetched on any day, by rank.
+        ------------------------------------
+            :param query:  Search query to GS
+            :param outdir: Folder where store CSV with results
+            :param ranks:  Only these ranks, None for every rank
+
+        """
+        return RawStore.records(ScraperGooleScholar.get_day_files(ScraperGooleScholar.get_rawfile(query, outdir)), ranks)
+
+    def get_writer ( self, query:str, outdir:str ) -> CSVWriter:
+        """ Writer of a query (CSV or Parquet output), opened once and reused for every row """
+        outfile = ScraperGooleScholar.get_outfile(query, outdir)
+        if str(outfile) not in self.writers and ScraperGooleScholar.OUTPUT == 'parquet':
+            self.writers[str(outfile)] = ParquetOutput.of(outfile)
+        elif str(outfile) not in self.writers:
+            self.writers[str(outfile)] = CSVWriter(outfile, ScraperGooleScholar.FIELDNAMES, ScraperGooleScholar.FLUSH_EVERY)
+        return self.writers[str(outfile)]
+
+    def close ( self ) -> None:
+        """ Flush and close the CSV files """
+        for writer in self.writers.values():
+            writer.close()
+        self.writers = dict()
+
+    def stream ( query:str, numentries:int = 1000, vpn:str = 'desktop', workers:int = 4, verbose:bool = False,
+                 years:Tuple[int,int] = None, sinks:List[Sink] = (), stop:threading.Event = None ) -> Iterator[Record]:
+        """
+        Enriched entries of a query as records, in GSRANK order, as soon as
+        they are enriched. Nothing is written but the sinks. The rate limits,
+        lookup caches and paper store set in the process are used as in the
+        CLI. Closing the generator, or setting stop from another thread,
+        stops the query.
+        ------------------------------------
+            :param query:      Search query to GS
+            :param numentries: Number of entries to recover
+            :param vpn:        Type of VPN used to change the proxy
+            :param workers:    Number of entries enriched at the same time
+            :param verbose:    Show messages
+            :param years:      (first, last) publication years of the results, None for every year
+            :param sinks:      Sinks where every record is written, closed at the end
+            :param stop:       Event that ends the stream while it waits for a record
+
+        """
+        stop = stop or threading.Event()
+        scraper = ScraperGooleScholar()
+        scraper.years = years
+        records = queue.Queue(maxsize=ScraperGooleScholar.STREAM_BUFFER)
+        stopped = threading.Event()
+
+        def put ( item:object ) -> bool:
+            """ Hand an item to the consumer, False if the stream was closed """
+            while not stopped.is_set():
+                try:
+                    records.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def deliver ( numentry:int, entry:Dict[str,str] ) -> None:
+            if not put(Record.from_row(entry)):
+                raise InterruptedError('[ Stream Error ] The stream was closed')
+
+        def produce () -> None:
+            try:
+                total = numentries
+                if total == ScraperGooleScholar.MAX_RESULTS:
+                    total = scraper.check_availability(query, verbose, vpn)
+                pipeline = Pipeline(scraper, query, None, vpn, workers=workers, verbose=verbose, sink=deliver)
+                pipeline.run(scraper.scrapeGS(query, total, None, vpn, verbose), total, [ str(i+1) for i in range(total) ])
+                put(None)
+            except Exception as e:
+                put(e)
+
+        producer = threading.Thread(target=produce, name='gscraper-stream', daemon=True)
+        producer.start()
+        try:
+            while not stop.is_set():
+                try:
+                    item = records.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                for sink in sinks:
+                    sink.write(item)
+                yield item
+        finally:
+            stopped.set()
+            for sink in sinks:
+                sink.close()
+
+    async def astream ( query:str, numentries:int = 1000, vpn:str = 'desktop', workers:int = 4, verbose:bool = False,
+                        years:Tuple[int,int] = None, sinks:List[Sink] = () ) -> AsyncIterator[Record]:
+        """ Async twin of stream: the records are awaited without blocking the event loop """
+        stop = threading.Event()
+        records = ScraperGooleScholar.stream(query, numentries, vpn, workers, verbose, years, sinks, stop)
+        # The generator only runs in this thread, so it is never closed while it is executing
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='gscraper-astream')
+        pending = None
+        try:
+            while True:
+                pending = executor.submit(next, records, None)
+                record = await asyncio.wrap_future(pending)
+                if record is None:
+                    break
+                yield record
+        finally:
+            # On a cancellation the pending next is still running: it ends once stop is set
+            stop.set()
+            if pending is not None and not pending.done():
+                await asyncio.wrap_future(pending)
+            await asyncio.wrap_future(executor.submit(records.close))
+            executor.shutdown()
 
 
-    def scrapeGS( self, query:str, numentries: int, outdir: str, vpn:str, verbose:bool ) -> object:
+    def scrapeGS( self, query:str, numentries: int, outdir: str, vpn:str, verbose:bool, start_index:int = 0 ) -> object:
         """
         Submit query to GS in order to retrieve the search results from
         the webpage.
@@ -51,30 +267,19 @@ class ScraperGooleScholar:
             numentries: Number of entries to save in csv
             outdir:     Where file is going to be saved
             verbose:    Show messages
+            start_index: Position of the first result, multiple of the page size
 
         """
-        for attempt in range(ScraperGooleScholar.NUM_ATTEMPTS):
-            try:
-
-                # Query to GS
-                print('Connecting to the server to scrap query results.')
+        # Query to GS
+        print('Connecting to the server to scrap query results.')
 
-                # search_query = self._scholarly.search_pubs(query, patents=False)
-                search_query = scholarly.search_pubs(query, patents=False)
-                
-            except Exception as e:
-                print('\n{}'.format(e))
-                print(
-                    '[ Query Error ] There was a problem scraping Google Scholar publications. Attempt {}/{}'.format(attempt + 1, ScraperGooleScholar.NUM_ATTEMPTS))
-                attempt = attempt + 1
-
-                # If connection fails because of the proxy, try to find and connect a new one
-                print(' '.join("[ Connection Error ]: Connecting to a new proxy. This process can takes times. \
-                                                Retrying in 15 seconds once we find a new proxy.".split()))
-                Proxy.set_new_proxy(vpn)
-            else:
-                break
-        else:
+        # search_query = self._scholarly.search_pubs(query, patents=False)
+        try:
+            search_query = Retrier.call(
+                Retrier.SCHOLAR, ScraperGooleScholar.search_pubs, query, start_index, self.years,
+                attempts=ScraperGooleScholar.NUM_ATTEMPTS, on_blocked=lambda: ScraperGooleScholar.rotate_proxy(vpn))
+        except Exception as e:
+            print('\n{}'.format(e))
             raise ConnectionError('[ Critical Error ] Too many failed attempts at scraping Google Scholar. Please run the program again.')
 
         if (verbose): 
@@ -90,56 +295,92 @@ class ScraperGooleScholar:
             :param query:   Search query to GS
             :param outdir:  Folder where store CSV with results
         """
-        # Final csv file
-        regex = re.compile('[^a-zA-Z]')
-        outfile = Path(outdir) / (regex.sub('', query.lower())[:15] + '.csv')
+        # The Parquet parts of every day are read at once, only their GSRANK column
+        if ScraperGooleScholar.OUTPUT == 'parquet':
+            return set(self.get_writer(query, outdir).ranks)
 
-        # Get entries from previous queries
-        if outfile.exists():
-            with open(outfile, 'r', newline='', encoding='utf-8') as csvfile:
-                reader = csv.DictReader(csvfile)
-                return [ row.get('GSRANK') for row in reader ]
-        else:
-            return []
+        # Get entries from previous queries, loaded once from the resume index
+        downloaded = set(self.get_writer(query, outdir).index.ranks)
+
+        # And from the runs of other days, or the compacted CSV of the query
+        outfile = ScraperGooleScholar.get_outfile(query, outdir)
+        dated = DatedOutputs.of(outfile)
+        if dated is not None:
+            downloaded |= dated.ranks(outfile.name, exclude=outfile)
+        return downloaded
+
+    def get_known_papers ( self, query:str, outdir:str ) -> Dict[str,Dict[str,str]]:
+        """
+        Rows already stored for a query on any day, by GS cluster id. The row of
+        the latest day is kept.
+        ------------------------------------
+            :param query:  Search query to GS
+            :param outdir: Folder where store CSV with results
 
-    def check_availability( self, query:str, verbose: bool ) -> int:
+        """
+        known = dict()
+        for path in ScraperGooleScholar.get_day_files(ScraperGooleScholar.get_outfile(query, outdir)):
+            with open(path, 'r', newline='', encoding='utf-8') as csvfile:
+                for row in csv.DictReader(csvfile):
+                    cluster = PaperStore.cluster_id(row.get(ScraperGooleScholar.SCHOLAR_LINK_KEY))
+                    if cluster:
+                        known[cluster] = row
+        return known
+
+    def replace_outfile ( query:str, staging:str, outdir:str ) -> Path:
+        """ Move the CSV of a query and its resume index from the staging folder to the output folder """
+        source = ScraperGooleScholar.get_outfile(query, staging)
+        target = ScraperGooleScholar.get_outfile(query, outdir)
+        os.replace(source, target)
+        if os.path.exists(str(source) + '.idx'):
+            os.replace(str(source) + '.idx', str(target) + '.idx')
+        elif os.path.exists(str(target) + '.idx'):
+            os.remove(str(target) + '.idx')
+        return target
+
+    def get_missing_ranges ( numentries:int, entries_to_download:List[str] ) -> List[Tuple[int,int]]:
+        """
+        Ranges of GS result pages that contain entries to download, as
+        (first_rank, last_rank) tuples aligned to the page size. Consecutive
+        pages are merged so each range is read with a single query iterator.
+        ------------------------------------
+            :param numentries:          Number of entries to recover
+            :param entries_to_download: GSRANKs that are not in the CSV yet
+
+        """
+        size = ScraperGooleScholar.PAGE_SIZE
+        pages = sorted({ (int(rank) - 1) // size for rank in entries_to_download if 0 < int(rank) <= numentries })
+
+        ranges = []
+        for page in pages:
+            first, last = page * size + 1, min((page + 1) * size, numentries)
+            if ranges and ranges[-1][1] + 1 == first:
+                ranges[-1] = (ranges[-1][0], last)
+            else:
+                ranges.append((first, last))
+        return ranges
+
+    def check_availability( self, query:str, verbose: bool, vpn:str = 'desktop' ) -> int:
         """
         Check if all sheets are available to be consulted in Google Scholar for a query. 
         This function only works when numentries is 1000.
         ------------------------------------
             :param query:   Search query to GS
             :param verbose: Show messages
+            :param vpn:     Type of VPN used to change the proxy
 
         """
-        url = f"https://scholar.google.com/scholar?start=940&q={query}"
-        count = 940
-        page = 940
-        
-        while True:
-            res = requests.get(url)
-            soup = BeautifulSoup(res.text, 'html.parser')
-
-            if page == 1000:
-                    break
+        # Each probed page is retried with a new proxy if GS blocks us
+        probe = lambda start: Retrier.call(
+            Retrier.SCHOLAR, AvailabilityProbe.page_results, query, start, self.years,
+            attempts=ScraperGooleScholar.NUM_ATTEMPTS, on_blocked=lambda: ScraperGooleScholar.rotate_proxy(vpn))
 
-            try:
-                next_page_div = soup.find_all('div', {'id': 'gs_n'})
-                next_page = next_page_div[0].find_all('a')[-1]
-                url = f"https://scholar.google.com{next_page['href']}"
-                time.sleep(15)
-                count += 10  
-                page += 10
-
-            except:
-                print(f"[ Numentries Error ] sheet {page} could not be founded")
-                time.sleep(15)
-                page += 10
-                continue
-            
-        if (verbose): 
-            print(f"Total number of links for query '{query}': {count}")
-        
-        return count
+        try:
+            return AvailabilityProbe.count(query, probe, verbose, self.years)
+        except Exception as e:
+            print('\n{}'.format(e))
+            print(f"[ Numentries Error ] The available results could not be checked, {ScraperGooleScholar.MAX_RESULTS} are expected")
+            return ScraperGooleScholar.MAX_RESULTS
 
 
     def get_entry( self, search_query:Iterator, numentry:int, numentries:int, entries_to_download:List[str], vpn:str, verbose:bool ) -> List[Dict[str,str]]:
@@ -153,124 +394,292 @@ class ScraperGooleScholar:
             :param verbose:      Show messages
 
         """
-        attempt = 0
-        entries = dict()
-        for attempt in range(ScraperGooleScholar.NUM_ATTEMPTS):
-            try:
-                # Accessing to the each element of the query object 
-                entrydict = next(search_query)
-
-                if str(numentry) not in entries_to_download:
-                    # time.sleep(1)
-                    return 
-                
-                # Authors info
-                authors = re.sub(r'[\[\]\']', '', str(
-                    entrydict['bib'][ScraperGooleScholar.AUTHOR_KEY.lower()]).replace(',', ';'))
-                
-                # Authors IDs
-                authors_ids = re.sub(r'[\[\]\']', '', str(
-                    entrydict[ScraperGooleScholar.AUTHOR_ID.lower()]).replace(',', ';'))
-                
-                # Year of publication info
-                pubyear = str(entrydict['bib'][ScraperGooleScholar.PUB_YEAR_KEY.lower()])
-                
-                # Title of the article
-                title = str(entrydict['bib'][ScraperGooleScholar.TITLE_KEY.lower()])
-                
-                # Publication URL
-                if (not ('pub_url' in entrydict)):
-                    entrydict['pub_url'] = ''
-
-                # Crossref
-                crossref_doi, crossref_author, STATUS = CrossrefAPI.petition( authors, pubyear, title, numentry, verbose )
-        
-                # DOIs 
-                doi = CrossrefAPI.get_doi( crossref_doi )
-                
-                # All authors
-                authors_fullnames = CrossrefAPI.get_fullname_authors( crossref_author )
-                
-                # First author
-                fauthor_name, fauthor_surname = CrossrefAPI.get_fist_author( crossref_author, authors )
-                fauthor_nation = GenderPredictor.get_nation( fauthor_name, fauthor_surname ) 
-                fauthor_gender = GenderPredictor.get_gender( fauthor_name, fauthor_surname, fauthor_nation)                 
-                first_author = f"{fauthor_name} {fauthor_surname}"
-                
-                # Last author 
-                lauthor_name, lauthor_surname = CrossrefAPI.get_last_author( crossref_author, authors )
-                lauthor_nation = GenderPredictor.get_nation( lauthor_name, lauthor_surname ) 
-                lauthor_gender = GenderPredictor.get_gender( lauthor_name, lauthor_surname, lauthor_nation ) 
-
-                last_author = f"{lauthor_name} {lauthor_surname}"
-                
-                # Save information of each row in the csv
-                entries = {
-                    # ScraperGooleScholar.AUTHOR_KEY: authors,
-                    ScraperGooleScholar.GSRANK_KEY: str(entrydict[ScraperGooleScholar.GSRANK_KEY.lower()]),
-                    ScraperGooleScholar.QUERY_SUCCESS : str(STATUS),
-                    ScraperGooleScholar.FULL_AUTHORS: authors_fullnames,
-                    ScraperGooleScholar.FIRST_AUTHOR: first_author,
-                    ScraperGooleScholar.LAST_AUTHOR: last_author,
-                    ScraperGooleScholar.AUTHOR_ID:authors_ids,
-                    ScraperGooleScholar.PUB_YEAR_KEY: pubyear,
-                    ScraperGooleScholar.TITLE_KEY: title,
-                    ScraperGooleScholar.SCHOLAR_LINK_KEY: 'https://scholar.google.com' + entrydict['url_scholarbib'].replace('?q=info:', '?cluster=').replace(':scholar.google.com/&output=cite&scirp=' + str(numentry), ''),
-                    ScraperGooleScholar.PUB_URL_KEY: str(entrydict[ScraperGooleScholar.PUB_URL_KEY.lower()]),
-                    ScraperGooleScholar.NUM_CITATIONS_KEY: str(
-                        entrydict[ScraperGooleScholar.NUM_CITATIONS_KEY.lower()]),
-                    ScraperGooleScholar.DOI_KEY: doi,
-                
-                    ScraperGooleScholar.FIRST_AUTHOR_GENDER: fauthor_gender[first_author]['name']['gender'],
-                    ScraperGooleScholar.FIRST_AUTHOR_GENDER_PROBABILITY: str(fauthor_gender[first_author]['name']['probability']),
-                    ScraperGooleScholar.FIRST_AUTHOR_NATION: fauthor_nation[first_author]['surname']['country_id'],
-                    ScraperGooleScholar.FIRST_AUTHOR_NATION_PROBABILITY:  str(fauthor_nation[first_author]['surname']['probability']),
-                    ScraperGooleScholar.LAST_AUTHOR_GENDER: lauthor_gender[last_author]['name']['gender'],
-                    ScraperGooleScholar.LAST_AUTHOR_GENDER_PROBABILITY: str(lauthor_gender[last_author]['name']['probability']),
-                    ScraperGooleScholar.LAST_AUTHOR_NATION: lauthor_nation[last_author]['surname']['country_id'],
-                    ScraperGooleScholar.LAST_AUTHOR_NATION_PROBABILITY: str(lauthor_nation[last_author]['surname']['probability'])
-                }
-
-                # Show messages that informs you about the number of entries processed
-                if ((numentry) % 10 == 0 or (numentry + 1) == numentries + 1):
-                    print('{} entries scraped'.format(numentry))
-                    
-                    
-            except Exception as e:
-                print('\n{}'.format(e))
-                print(
-                    '[ Save Error ] There was a problem scraping a Google Scholar entry. Retrying. Attempt {}/{}'.format(attempt + 1, ScraperGooleScholar.NUM_ATTEMPTS))
-                attempt = attempt + 1
-
-                # If connection fails because of the proxy, try to find and connect a new one
-                print(' '.join("[ Connection Error ]: Connecting to a new proxy. This process can takes times. \
-                                            Retrying in 15 seconds once we find a new proxy.".split()))
-                Proxy.set_new_proxy(vpn)
-                return entries
-            else:
-                break
-        else:
-            print(
-                '[ Critical Error ] Too many failed attempts at scraping Google Scholar. Please run the program again in 24h.')
-    
+        # Accessing to the each element of the query object 
+        entrydict = self.fetch_entry( search_query, vpn )
+
+        if str(numentry) not in entries_to_download:
+            return 
+
+        try:
+            return self.enrich_entry( entrydict, numentry, numentries, verbose )
+        except Exception as e:
+            print('\n{}'.format(e))
+            print(f"[ Save Error ] There was a problem enriching the entry {numentry}. It will be downloaded in the next run.")
+
+    def crossref_page( self, items:List[Tuple[int,Dict]], verbose:bool ) -> Dict[int,object]:
+        """
+        Crossref lookups of the entries of a GS page, resolved at once, and the
+        nation and gender of their first and last authors, prefetched in one
+        batch. Returns the (doi, authors, STATUS) result or the exception of
+        each entry.
+        ------------------------------------
+            :param items:   (numentry, entrydict) of each entry of the page
+            :param verbose: Show messages
+
+        """
+        # Papers already in the dataset or in the store are not looked up again
+        if ScraperGooleScholar.PAPERS is not None or self.known:
+            clusters = { numentry: PaperStore.cluster_id(entrydict.get('url_scholarbib')) for numentry, entrydict in items }
+            known = ScraperGooleScholar.PAPERS.known(clusters.values()) if ScraperGooleScholar.PAPERS is not None else set()
+            known |= { cluster for cluster in clusters.values() if cluster in self.known }
+            items = [ (numentry, entrydict) for numentry, entrydict in items if clusters[numentry] not in known ]
+
+        entries = [ (ScraperGooleScholar.get_authors(entrydict),
+                     str(entrydict['bib'][ScraperGooleScholar.PUB_YEAR_KEY.lower()]),
+                     str(entrydict['bib'][ScraperGooleScholar.TITLE_KEY.lower()]),
+                     numentry) for numentry, entrydict in items ]
+        with Metrics.SHARED.timer('crossref_page'):
+            results = CrossrefAPI.petition_many(entries, verbose)
+
+        # A failed prefetch only loses the batching: each author is resolved alone later
+        names = [ name for (authors, _, _, _), result in zip(entries, results) if isinstance(result, tuple)
+                  for name in ScraperGooleScholar.get_author_names(result[1], authors) ]
+        try:
+            with Metrics.SHARED.timer('names_prefetch'):
+                Retrier.call( Retrier.NAMES, GenderPredictor.prefetch, names )
+        except Exception as e:
+            print('\n{}'.format(e))
+
+        return { numentry: result for (numentry, _), result in zip(items, results) }
+
+    def get_author_names( crossref_author:List, authors:str ) -> List[Tuple[str,str]]:
+        """ (name, surname) of the first and last authors of a paper """
+        return [ CrossrefAPI.get_fist_author( crossref_author, authors ), CrossrefAPI.get_last_author( crossref_author, authors ) ]
+
+    def get_authors( entrydict:Dict ) -> str:
+        """ GS authors of an entry separated by ';' """
+        return re.sub(r'[\[\]\']', '', str(
+            entrydict['bib'][ScraperGooleScholar.AUTHOR_KEY.lower()]).replace(',', ';'))
+
+    def enrich_entry( self, entrydict:Dict, numentry:int, numentries:int, verbose:bool, crossref:object = None ) -> Dict[str,str]:
+        """
+        Build the CSV row of a Google Scholar entry.
+        Cross-reference the DOIs and authors' names with the Crossref database.
+        Predict gender of the authors.
+        ------------------------------------
+            :param entrydict:  Entry returned by the Google Scholar query
+            :param numentry:   Position of the entry in the query
+            :param numentries: Number of entries to recover 
+            :param verbose:    Show messages
+            :param crossref:   Result of a bulk Crossref lookup of the entry, if any
+
+        """
+        # Authors info
+        authors = ScraperGooleScholar.get_authors(entrydict)
+
+        # Authors IDs
+        authors_ids = re.sub(r'[\[\]\']', '', str(
+            entrydict[ScraperGooleScholar.AUTHOR_ID.lower()]).replace(',', ';'))
+
+        # Year of publication info
+        pubyear = str(entrydict['bib'][ScraperGooleScholar.PUB_YEAR_KEY.lower()])
+
+        # Title of the article
+        title = str(entrydict['bib'][ScraperGooleScholar.TITLE_KEY.lower()])
+
+        # Publication URL
+        if (not ('pub_url' in entrydict)):
+            entrydict['pub_url'] = ''
+
+        # Fields of the GS result, always taken from the current query
+        scholar = {
+            ScraperGooleScholar.GSRANK_KEY: str(entrydict[ScraperGooleScholar.GSRANK_KEY.lower()]),
+            ScraperGooleScholar.AUTHOR_ID:authors_ids,
+            ScraperGooleScholar.PUB_YEAR_KEY: pubyear,
+            ScraperGooleScholar.TITLE_KEY: title,
+            ScraperGooleScholar.SCHOLAR_LINK_KEY: ScraperGooleScholar.get_scholar_link(entrydict, numentry),
+            ScraperGooleScholar.PUB_URL_KEY: str(entrydict[ScraperGooleScholar.PUB_URL_KEY.lower()]),
+            ScraperGooleScholar.NUM_CITATIONS_KEY: str(
+                entrydict[ScraperGooleScholar.NUM_CITATIONS_KEY.lower()])
+        }
+
+        # Papers already in the dataset (refresh) or enriched by any query are reused
+        cluster = PaperStore.cluster_id(scholar[ScraperGooleScholar.SCHOLAR_LINK_KEY])
+        papers = ScraperGooleScholar.PAPERS
+        enrichment = self.known.get(cluster) if cluster else None
+        if enrichment is not None:
+            with self._lock:
+                self.reused += 1
+        elif papers is not None and cluster:
+            enrichment = papers.get(cluster)
+        if enrichment is None:
+            enrichment = self.enrich_paper(authors, pubyear, title, numentry, verbose, crossref, cluster)
+
+        # Save information of each row in the csv
+        entries = { **enrichment, **scholar }
+
+        # Show messages that informs you about the number of entries processed
+        if ((numentry) % 10 == 0 or (numentry + 1) == numentries + 1):
+            print('{} entries scraped'.format(numentry))
+
         return entries
 
-    def is_entry_in_csv(file_path, entry):
+    def enrich_paper( self, authors:str, pubyear:str, title:str, numentry:int, verbose:bool, crossref:object = None, cluster:str = None ) -> Dict[str,str]:
+        """
+        Crossref and name inference fields of a paper, stored in the paper store.
+        ------------------------------------
+            :param authors:  GS authors separated by ';'
+            :param pubyear:  Year of publication
+            :param title:    Title of the paper
+            :param numentry: Position of the entry in the query
+            :param verbose:  Show messages
+            :param crossref: Result of a bulk Crossref lookup of the entry, if any
+            :param cluster:  GS cluster id of the paper
+
+        """
+        # Crossref, unless the page was already resolved. Failed bulk lookups are retried alone
+        if isinstance(crossref, Exception) and Retrier.classify(Retrier.CROSSREF, crossref) == 'fatal':
+            raise crossref
+        bulk = isinstance(crossref, tuple)
+        if bulk:
+            crossref_doi, crossref_author, STATUS = crossref
+        else:
+            with Metrics.SHARED.timer('crossref'):
+                crossref_doi, crossref_author, STATUS = Retrier.call(
+                    Retrier.CROSSREF, CrossrefAPI.petition, authors, pubyear, title, numentry, verbose )
+
+        # Another version of a paper already enriched, found by its DOI. Only a
+        # confirmed match identifies the paper: a MISSING one failed the surname check
+        papers = ScraperGooleScholar.PAPERS
+        confirmed_doi = crossref_doi if STATUS != 'MISSING' else None
+        enrichment = papers.get_doi(confirmed_doi) if papers is not None and confirmed_doi else None
+        if enrichment is not None:
+            papers.set(cluster, crossref_doi, enrichment)
+            return enrichment
+
+        # DOIs 
+        doi = CrossrefAPI.get_doi( crossref_doi )
+
+        # All authors
+        authors_fullnames = CrossrefAPI.get_fullname_authors( crossref_author )
+
+        # First and last author names, prefetched with their page after a bulk lookup
+        (fauthor_name, fauthor_surname), (lauthor_name, lauthor_surname) = ScraperGooleScholar.get_author_names( crossref_author, authors )
+        if not bulk:
+            with Metrics.SHARED.timer('names_prefetch'):
+                Retrier.call( Retrier.NAMES, GenderPredictor.prefetch, [ (fauthor_name, fauthor_surname), (lauthor_name, lauthor_surname) ] )
+
+        # First author
+        with Metrics.SHARED.timer('nation'):
+            fauthor_nation = GenderPredictor.get_nation( fauthor_name, fauthor_surname ) 
+        with Metrics.SHARED.timer('gender'):
+            fauthor_gender = GenderPredictor.get_gender( fauthor_name, fauthor_surname, fauthor_nation)                 
+        first_author = f"{fauthor_name} {fauthor_surname}"
+
+        # Last author 
+        with Metrics.SHARED.timer('nation'):
+            lauthor_nation = GenderPredictor.get_nation( lauthor_name, lauthor_surname ) 
+        with Metrics.SHARED.timer('gender'):
+            lauthor_gender = GenderPredictor.get_gender( lauthor_name, lauthor_surname, lauthor_nation ) 
+
+        last_author = f"{lauthor_name} {lauthor_surname}"
+
+        enrichment = {
+            # ScraperGooleScholar.AUTHOR_KEY: authors,
+            ScraperGooleScholar.QUERY_SUCCESS : str(STATUS),
+            ScraperGooleScholar.FULL_AUTHORS: authors_fullnames,
+            ScraperGooleScholar.FIRST_AUTHOR: first_author,
+            ScraperGooleScholar.LAST_AUTHOR: last_author,
+            ScraperGooleScholar.DOI_KEY: doi,
+
+            ScraperGooleScholar.FIRST_AUTHOR_GENDER: fauthor_gender[first_author]['name']['gender'],
+            ScraperGooleScholar.FIRST_AUTHOR_GENDER_PROBABILITY: str(fauthor_gender[first_author]['name']['probability']),
+            ScraperGooleScholar.FIRST_AUTHOR_NATION: fauthor_nation[first_author]['surname']['country_id'],
+            ScraperGooleScholar.FIRST_AUTHOR_NATION_PROBABILITY:  str(fauthor_nation[first_author]['surname']['probability']),
+            ScraperGooleScholar.LAST_AUTHOR_GENDER: lauthor_gender[last_author]['name']['gender'],
+            ScraperGooleScholar.LAST_AUTHOR_GENDER_PROBABILITY: str(lauthor_gender[last_author]['name']['probability']),
+            ScraperGooleScholar.LAST_AUTHOR_NATION: lauthor_nation[last_author]['surname']['country_id'],
+            ScraperGooleScholar.LAST_AUTHOR_NATION_PROBABILITY: str(lauthor_nation[last_author]['surname']['probability'])
+        }
+
+        if papers is not None:
+            papers.set(cluster, confirmed_doi, enrichment)
+
+        return enrichment
+
+    def get_scholar_link( entrydict:Dict, numentry:int ) -> str:
+        """ GS link of the cluster of an entry """
+        return 'https://scholar.google.com' + entrydict['url_scholarbib'].replace('?q=info:', '?cluster=').replace(':scholar.google.com/&output=cite&scirp=' + str(numentry), '')
+
+    def fetch_entry( self, search_query:Iterator, vpn:str, new_page:bool = False ) -> Dict:
         """
-        Check if an entry already exists in a CSV file.
-        :param file_path: Path to the CSV file.
-        :param entry: The entry (as a dictionary) to check for.
-        :return: True if the entry exists in the CSV, False otherwise.
+        Next entry of the Google Scholar query. Connection errors are retried
+        with a new proxy. StopIteration is raised when there are no more results.
+        ------------------------------------
+            :param search_query: Object with Google Scholar query result
+            :param vpn:          Type of VPN used to change the proxy
+            :param new_page:     The entry is the first of a GS page not loaded yet
+
         """
+        # A failed call is retried by loading the page again, so retries are paced too
+        loads_page = [new_page]
+
+        def next_result():
+            try:
+                return ScraperGooleScholar.next_result(search_query, loads_page[0])
+            finally:
+                loads_page[0] = True
+
         try:
-            with open(file_path, 'r', newline='', encoding='utf-8') as csvfile:
-                reader = csv.DictReader(csvfile)
-                for row in reader:
-                    if row.get('GSRANK') == entry.get('GSRANK'):
-                        return True
-                return False
-        except FileNotFoundError:
-            return False
+            # Accessing to the each element of the query object 
+            return Retrier.call(
+                Retrier.SCHOLAR, next_result,
+                attempts=ScraperGooleScholar.NUM_ATTEMPTS, on_blocked=lambda: ScraperGooleScholar.rotate_proxy(vpn))
+        except StopIteration:
+            raise
+        except Exception as e:
+            print('\n{}'.format(e))
+            raise ConnectionError('[ Critical Error ] Too many failed attempts at scraping Google Scholar. Please run the program again in 24h.')
+
+    def search_pubs ( query:str, start_index:int, years:Tuple[int,int] = None ) -> Iterator:
+        """ Single GS query request, paced by the rate limiter """
+        RateLimiter.SHARED.acquire(ScraperGooleScholar.GS_HOST)
+        start = time.monotonic()
+        year_low, year_high = years if years is not None else (None, None)
+        try:
+            if ScraperGooleScholar.FETCHER == 'native':
+                search_query = GSSearch(query, start_index=start_index, years=years)
+            else:
+                search_query = scholarly.search_pubs(query, patents=False, start_index=start_index,
+                                                     year_low=year_low, year_high=year_high)
+        except Exception:
+            RateLimiter.SHARED.penalize(ScraperGooleScholar.GS_HOST)
+            Proxy.report(False)
+            Metrics.SHARED.observe('gs_query', time.monotonic() - start)
+            raise
+        RateLimiter.SHARED.reward(ScraperGooleScholar.GS_HOST)
+        Proxy.report(True, time.monotonic() - start)
+        Metrics.SHARED.observe('gs_query', time.monotonic() - start)
+        return search_query
+
+    def next_result ( search_query:Iterator, new_page:bool ) -> Dict:
+        """ Next GS result. Only entries that load a new GS page wait for the rate limiter """
+        if new_page:
+            RateLimiter.SHARED.acquire(ScraperGooleScholar.GS_HOST)
+        start = time.monotonic()
+        stage = 'gs_page' if new_page else 'gs_result'
+        try:
+            entrydict = next(search_query)
+        except StopIteration:
+            raise
+        except Exception:
+            RateLimiter.SHARED.penalize(ScraperGooleScholar.GS_HOST)
+            Proxy.report(False)
+            Metrics.SHARED.observe(stage, time.monotonic() - start)
+            raise
+        Metrics.SHARED.observe(stage, time.monotonic() - start)
+        if new_page:
+            RateLimiter.SHARED.reward(ScraperGooleScholar.GS_HOST)
+            Proxy.report(True, time.monotonic() - start)
+        return entrydict
+
+    def rotate_proxy ( vpn:str ) -> None:
+        """ Google Scholar blocked us: connect to a new proxy """
+        print(' '.join("[ Connection Error ]: Connecting to a new proxy. This process can takes times. \
+                                    Retrying once we find a new proxy.".split()))
+        Metrics.SHARED.count('proxy_rotations', vpn=vpn)
+        with Metrics.SHARED.timer('proxy_rotation'):
+            Proxy.set_new_proxy(vpn)
 
     def write( self, query:str, entry: List[Dict[str,str]], numentry:int, outdir:str ) -> None:
         """
@@ -283,44 +692,15 @@ class ScraperGooleScholar:
 
         """
 
-        # Final csv file
-        regex = re.compile('[^a-zA-Z]')
-        outfile = Path(outdir) / (regex.sub('', query.lower())[:15] + '.csv')
-
-        # Check information in csv
-        if not ScraperGooleScholar.is_entry_in_csv(outfile, entry):
-
-            # Create and save information in csv
-            with open(str(outfile), 'a', newline='', encoding='utf-8') as csvfile:
-                fieldnames = [
-                    ScraperGooleScholar.GSRANK_KEY, 
-                    ScraperGooleScholar.QUERY_SUCCESS,
-                    ScraperGooleScholar.FULL_AUTHORS, 
-                    ScraperGooleScholar.FIRST_AUTHOR, 
-                    ScraperGooleScholar.LAST_AUTHOR, 
-                    ScraperGooleScholar.AUTHOR_ID, 
-                    ScraperGooleScholar.PUB_YEAR_KEY,
-                    ScraperGooleScholar.TITLE_KEY, 
-                    ScraperGooleScholar.SCHOLAR_LINK_KEY, 
-                    ScraperGooleScholar.PUB_URL_KEY,
-                    ScraperGooleScholar.NUM_CITATIONS_KEY,
-                    ScraperGooleScholar.DOI_KEY,
-                    ScraperGooleScholar.FIRST_AUTHOR_GENDER,
-                    ScraperGooleScholar.FIRST_AUTHOR_GENDER_PROBABILITY,
-                    ScraperGooleScholar.FIRST_AUTHOR_NATION,
-                    ScraperGooleScholar.FIRST_AUTHOR_NATION_PROBABILITY,
-                    ScraperGooleScholar.LAST_AUTHOR_GENDER,
-                    ScraperGooleScholar.LAST_AUTHOR_GENDER_PROBABILITY,
-                    ScraperGooleScholar.LAST_AUTHOR_NATION,
-                    ScraperGooleScholar.LAST_AUTHOR_NATION_PROBABILITY
-                ]
-                writer = csv.DictWriter(
-                    csvfile, fieldnames=fieldnames, delimiter=',')
-                if  outfile.stat().st_size == 0 :
-                    writer.writeheader()
-                writer.writerow(entry)
-        
-        time.sleep(15)
+        # Check information in the resume index and save it in csv
+        with Metrics.SHARED.timer('write'):
+            self.get_writer(query, outdir).write(entry)
+
+        # Rank of the paper in this query
+        if ScraperGooleScholar.PAPERS is not None:
+            doi = entry[ScraperGooleScholar.DOI_KEY].replace('https://doi.org/', '')
+            ScraperGooleScholar.PAPERS.seen(PaperStore.cluster_id(entry[ScraperGooleScholar.SCHOLAR_LINK_KEY]),
+                                            doi, query, int(entry[ScraperGooleScholar.GSRANK_KEY]))
         
 
 
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import csv
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+from ._scraper import ScraperGooleScholar
+from ._papers import PaperStore
+from ._resume import DatedOutputs
+
+class YearShards:
+    """
+    Split of a query in publication-year slices small enough to be served
+    whole by Google Scholar, which stops at MAX_RESULTS results per query.
+    A slice that still reaches the cap is split in two halves until it fits
+    or spans a single year. Each slice is harvested as its own query in
+    <root>/<query>.shards/<first>-<last>/<day>/, outside the day folder of the
+    run, so a slice is resumed from the entries of its other days like a
+    plain query. The slices are merged in one deduplicated CSV with a global
+    rank, <root>/<day>/<query>.shards.csv.
+    --------------------------------------------------------------------
+        :param query:  Search query to GS
+        :param outdir: Folder where store CSV with results, the dated folder of the run
+        :param years:  (first, last) publication years of the query
+
+    """
+
+    # Main Params
+    FIRST_YEAR = 1900
+    SHARD_KEY = 'SHARD'
+    SHARD_RANK_KEY = 'SHARD_RANK'
+
+    def __init__( self, query:str, outdir:str, years:Tuple[int,int] ):
+        self.query = query
+        self.outdir = Path(outdir)
+        self.years = years
+        self.name = ScraperGooleScholar.get_outfile(query, outdir).stem
+
+        # Slices are kept by day under the output root, as the outputs of any query
+        dated = DatedOutputs.DATE.fullmatch(self.outdir.name) is not None
+        self.root = self.outdir.parent if dated else self.outdir
+        self.day = self.outdir.name if dated else None
+
+
+    def parse_years ( value:str ) -> Tuple[int,int]:
+        """ (first, last) years of a FIRST-LAST string """
+        first, _, last = value.partition('-')
+        try:
+            years = (int(first), int(last) if last else int(time.strftime('%Y')))
+        except ValueError:
+            raise ValueError(f"[ Input Error ] Years '{value}' must be FIRST-LAST, e.g. 1950-2024")
+        if years[0] > years[1]:
+            raise ValueError(f"[ Input Error ] The first year of '{value}' is after the last one")
+        return years
+
+
+    def plan ( self, count:Callable[[Tuple[int,int]],int], verbose:bool = False ) -> List[Tuple[Tuple[int,int],int]]:
+        """
+        Slices of the query with the number of results of each one, oldest first.
+        ------------------------------------
+            :param count:   Function returning the results available for a range of years
+            :param verbose: Show messages
+
+        """
+        slices = []
+        pending = [self.years]
+        while pending:
+            years = pending.pop()
+            available = count(years)
+
+            if available >= ScraperGooleScholar.MAX_RESULTS and years[0] < years[1]:
+                middle = (years[0] + years[1]) // 2
+                pending += [(middle + 1, years[1]), (years[0], middle)]
+                continue
+
+            if available >= ScraperGooleScholar.MAX_RESULTS:
+                print(f"[ Shard Error ] The year {years[0]} alone reaches {ScraperGooleScholar.MAX_RESULTS} results, "
+                      "only the first ones can be downloaded")
+            if available:
+                slices.append((years, available))
+
+        if (verbose):
+            print(f"Query split in {len(slices)} slices: " + ', '.join(f"{first}-{last} ({available})" for (first, last), available in slices))
+        return slices
+
+
+    def folder ( self, years:Tuple[int,int] ) -> Path:
+        """ Output folder of a slice in the run, the day folder of the slice """
+        folder = self.root / f"{self.name}.shards" / f"{years[0]}-{years[1]}"
+        return folder / self.day if self.day is not None else folder
+
+
+    def outfile ( self ) -> Path:
+        """ Merged CSV of the slices """
+        return self.outdir / f"{self.name}.shards.csv"
+
+
+    def merge ( self, slices:List[Tuple[Tuple[int,int],int]] ) -> Tuple[Path,int]:
+        """
+        Merge the CSVs of the slices of every day in one CSV, one row per paper
+        (cluster id, DOI or title and year). The global rank orders the papers by their
+        relative rank inside their slice, so every slice contributes in
+        proportion to its size, and then by number of citations.
+        Returns the merged CSV and its number of rows.
+        ------------------------------------
+            :param slices: Slices returned by plan
+
+        """
+        papers = dict()
+        for years, available in slices:
+            outfile = ScraperGooleScholar.get_outfile(self.query, self.folder(years))
+            for path in ScraperGooleScholar.get_day_files(outfile):
+                with open(path, 'r', newline='', encoding='utf-8') as csvfile:
+                    for row in csv.DictReader(csvfile):
+                        key = YearShards.paper_key(row)
+                        rank = int(row[ScraperGooleScholar.GSRANK_KEY])
+                        order = ((rank - 0.5) / max(available, 1), -YearShards.citations(row))
+                        if key not in papers or order < papers[key][0]:
+                            papers[key] = (order, years, row)
+
+        fieldnames = ScraperGooleScholar.FIELDNAMES + [YearShards.SHARD_KEY, YearShards.SHARD_RANK_KEY]
+        target = self.outfile()
+        target.parent.mkdir(parents=True, exist_ok=True)
+        partial = target.with_name(target.name + '.tmp')
+        with open(partial, 'w', newline='', encoding='utf-8') as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=fieldnames, restval='', extrasaction='ignore')
+            writer.writeheader()
+            for rank, (_, years, row) in enumerate(sorted(papers.values(), key=lambda paper: paper[0]), start=1):
+                writer.writerow({ **row,
+                                  ScraperGooleScholar.GSRANK_KEY: str(rank),
+                                  YearShards.SHARD_KEY: f"{years[0]}-{years[1]}",
+                                  YearShards.SHARD_RANK_KEY: row[ScraperGooleScholar.GSRANK_KEY] })
+        os.replace(partial, target)
+        return target, len(papers)
+
+
+    def paper_key ( row:Dict[str,str] ) -> str:
+        """ Identity of a paper: cluster id, DOI or title and year """
+        cluster = PaperStore.cluster_id(row.get(ScraperGooleScholar.SCHOLAR_LINK_KEY))
+        if cluster:
+            return cluster
+        if row.get(ScraperGooleScholar.DOI_KEY):
+            return row[ScraperGooleScholar.DOI_KEY].lower()
+        return f"{row.get(ScraperGooleScholar.TITLE_KEY, '').lower()}:{row.get(ScraperGooleScholar.PUB_YEAR_KEY, '')}"
+
+
+    def citations ( row:Dict[str,str] ) -> int:
+        value = row.get(ScraperGooleScholar.NUM_CITATIONS_KEY, '')
+        return int(value) if value.isdigit() else 0
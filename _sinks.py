@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import abc
+import json
+import threading
+from pathlib import Path
+from typing import Dict, List
+from ._record import Record
+from ._resume import CSVWriter
+
+class Sink(abc.ABC):
+    """
+    Destination of the records of ScraperGooleScholar.stream. Subclasses
+    implement write. A sink can also be used alone as a context manager, it
+    is closed on exit.
+    --------------------------------------------------------------------
+        :param path: Output file of the sink
+
+    """
+
+    def __init__( self, path:str ):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.written = 0
+
+
+    @abc.abstractmethod
+    def write ( self, record:Record ) -> None:
+        """ Store a record """
+
+
+    def close ( self ) -> None:
+        pass
+
+
+    def __enter__ ( self ) -> 'Sink':
+        return self
+
+
+    def __exit__ ( self, *exc ) -> None:
+        self.close()
+
+
+class CSVSink(Sink):
+    """
+    Records appended to a CSV file with the columns of the scraper output.
+    Ranks already in the file are skipped, as in the CLI.
+    --------------------------------------------------------------------
+        :param path:        CSV file
+        :param flush_every: Number of rows buffered before flushing to disk
+
+    """
+
+    def __init__( self, path:str, flush_every:int = 10 ):
+        super().__init__(path)
+        self.writer = CSVWriter(self.path, [ column for _, column, _ in Record.FIELDS ], flush_every)
+
+
+    def write ( self, record:Record ) -> None:
+        if self.writer.write(record.row()):
+            self.written += 1
+
+
+    def close ( self ) -> None:
+        self.writer.close()
+
+
+class JSONLSink(Sink):
+    """
+    Records appended to a JSON Lines file, one object per record with the
+    native values by attribute name.
+    --------------------------------------------------------------------
+        :param path: JSONL file
+
+    """
+
+    def __init__( self, path:str ):
+        super().__init__(path)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+
+
+    def write ( self, record:Record ) -> None:
+        line = json.dumps(record.as_dict(), ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + '\n')
+            self.written += 1
+
+
+    def close ( self ) -> None:
+        with self._lock:
+            if not self._file.closed:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._file.close()
+
+
+class ParquetSink(Sink):
+    """
+    Records written to a Parquet file with typed columns, buffered in Arrow
+    record batches. Requires pyarrow. The file is only readable once the
+    sink is closed.
+    --------------------------------------------------------------------
+        :param path:       Parquet file, replaced if it exists
+        :param batch_size: Number of records of each record batch
+
+    """
+
+    # Arrow type of each Python type of the record fields
+    TYPES = {int: 'int64', float: 'float64', str: 'string'}
+
+    def __init__( self, path:str, batch_size:int = 1000 ):
+        super().__init__(path)
+        pyarrow = ParquetSink.require()
+        self.pa = pyarrow
+        self.schema = ParquetSink.get_schema(pyarrow)
+        self.batch_size = max(1, batch_size)
+        self.columns = ParquetSink.empty_columns()
+        self._writer = pyarrow.parquet.ParquetWriter(str(self.path), self.schema)
+        self._lock = threading.Lock()
+
+
+    def require () -> object:
+        """ pyarrow module with its parquet submodule, it is an optional dependency """
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("[ Input Error ] The Parquet output requires pyarrow: pip install pyarrow")
+        return pyarrow
+
+
+    def get_schema ( pyarrow ) -> object:
+        """ Arrow schema of the records """
+        return pyarrow.schema([ (name, getattr(pyarrow, ParquetSink.TYPES[kind])()) for name, _, kind in Record.FIELDS ])
+
+
+    def empty_columns () -> Dict[str,List]:
+        return { name: [] for name, _, _ in Record.FIELDS }
+
+
+    def write ( self, record:Record ) -> None:
+        with self._lock:
+            for name, values in self.columns.items():
+                values.append(getattr(record, name))
+            self.written += 1
+            if len(self.columns['gsrank']) >= self.batch_size:
+                self.flush_locked()
+
+
+    def flush_locked ( self ) -> None:
+        """ Write the buffered records as a record batch (the lock is held) """
+        if not self.columns['gsrank']:
+            return
+        batch = self.pa.RecordBatch.from_pydict(self.columns, schema=self.schema)
+        self._writer.write_batch(batch)
+        self.columns = ParquetSink.empty_columns()
+
+
+    def close ( self ) -> None:
+        with self._lock:
+            if self._writer is not None:
+                self.flush_locked()
+                self._writer.close()
+                self._writer = None
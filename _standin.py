@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import re
+import abc
+import json
+import time
+import random
+import threading
+from html import escape
+from urllib import request as urlrequest
+from urllib.error import HTTPError
+from urllib.parse import urlsplit, parse_qs, quote_plus
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, List, Optional, Tuple
+
+class Corpus:
+    """
+    Deterministic fake papers shared by the stand-in services, so Crossref
+    and the name APIs answer consistently with the Google Scholar pages.
+    --------------------------------------------------------------------
+        :param total:  Number of results served for every query, like the GS cap
+        :param papers: Number of papers of the corpus, reachable with year filters
+
+    """
+
+    NAMES = ['Maria', 'John', 'Wei', 'Fatima', 'Lucas', 'Aiko', 'Olga', 'Kwame', 'Ana', 'Pierre', 'Sara', 'Ivan']
+    SURNAMES = ['Morales', 'Smith', 'Wang', 'Haddad', 'Silva', 'Tanaka', 'Ivanova', 'Mensah', 'Garcia', 'Martin', 'Rossi', 'Petrov']
+    COUNTRIES = ['ES', 'US', 'CN', 'MA', 'BR', 'JP', 'RU', 'GH', 'MX', 'FR', 'IT', 'BG']
+
+    def __init__( self, total:int=1000, papers:Optional[int]=None ):
+        self.total = total
+        self.papers = max(papers or total, total)
+
+
+    def results ( self, years:Optional[Tuple[int,int]] = None ) -> List[int]:
+        """ Papers served for a query, in rank order, optionally of a range of years """
+        papers = range(1, self.papers + 1)
+        if years is not None:
+            papers = [ paper for paper in papers if years[0] <= self.year(paper) <= years[1] ]
+        return list(papers[:self.total])
+
+
+    def authors ( self, rank:int ) -> List[Dict[str,str]]:
+        """ Authors of the paper at a rank """
+        size = 1 + rank % 4
+        return [ {'given': Corpus.NAMES[(rank * 7 + i) % len(Corpus.NAMES)],
+                  'family': Corpus.SURNAMES[(rank * 5 + i * 3) % len(Corpus.SURNAMES)]} for i in range(size) ]
+
+
+    def title ( self, rank:int ) -> str:
+        return f"Stand-in paper number {rank} on gender bias"
+
+
+    def year ( self, rank:int ) -> int:
+        return 1990 + rank % 34
+
+
+    def country ( self, name:str ) -> str:
+        return Corpus.COUNTRIES[sum(map(ord, name.lower())) % len(Corpus.COUNTRIES)]
+
+
+class StandInHandler(BaseHTTPRequestHandler, abc.ABC):
+    """ Base handler with latency, error and 429 burst injection, subclasses implement answer """
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message ( self, *args ) -> None:
+        pass
+
+
+    def do_GET ( self ) -> None:
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            count = server.requests
+
+        if server.latency:
+            time.sleep(max(0.0, random.gauss(server.latency, server.latency / 4)))
+
+        if server.burst_every and count % server.burst_every < server.burst_size:
+            return self.send_body(429, b'Too Many Requests', 'text/plain', {'Retry-After': '1'})
+
+        if server.error_rate and random.random() < server.error_rate:
+            return self.send_body(500, b'Internal Server Error', 'text/plain')
+
+        parts = urlsplit(self.path)
+        status, body, content_type = self.answer(parts.path, parse_qs(parts.query))
+        self.send_body(status, body, content_type)
+
+
+    def send_body ( self, status:int, body:bytes, content_type:str, headers:Optional[Dict[str,str]]=None ) -> None:
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+    @abc.abstractmethod
+    def answer ( self, path:str, params:Dict[str,List[str]] ):
+        """ (status, body, content type) of a GET request """
+
+
+class ScholarHandler(StandInHandler):
+    """ Google Scholar result pages (/scholar?q=...&start=...) and robots.txt, used by the proxy health check """
+
+    def answer ( self, path:str, params:Dict[str,List[str]] ):
+        if path == '/robots.txt':
+            return 200, b'User-agent: *\nDisallow: /search', 'text/plain'
+        if path != '/scholar':
+            return 404, b'Not Found', 'text/plain'
+        query = params.get('q', [''])[0]
+        start = int(params.get('start', ['0'])[0] or 0)
+        years = None
+        if 'as_ylo' in params or 'as_yhi' in params:
+            years = (int(params.get('as_ylo', ['0'])[0] or 0), int(params.get('as_yhi', ['9999'])[0] or 9999))
+        return 200, StandIns.scholar_page(self.server.corpus, query, start, years).encode('utf-8'), 'text/html; charset=utf-8'
+
+
+class CrossrefHandler(StandInHandler):
+    """ Crossref works search (/works?query=...) """
+
+    def answer ( self, path:str, params:Dict[str,List[str]] ):
+        corpus = self.server.corpus
+        match = re.search(r'paper number (\d+)', params.get('query', [''])[0])
+        items = []
+        if match:
+            rank = int(match.group(1))
+            items.append({'DOI': f"10.5555/standin.{rank}", 'author': corpus.authors(rank)})
+        body = {'status': 'ok', 'message-type': 'work-list', 'message': {'total-results': len(items), 'items': items}}
+        return 200, json.dumps(body).encode('utf-8'), 'application/json'
+
+
+class GenderizeHandler(StandInHandler):
+    """ Genderize batch lookups (/?name[]=...) """
+
+    def answer ( self, path:str, params:Dict[str,List[str]] ):
+        names = params.get('name[]', []) or params.get('name', [])
+        body = [ {'name': name, 'gender': 'female' if len(name) % 2 else 'male',
+                  'probability': round(0.5 + (len(name) % 5) / 10, 2), 'count': 100} for name in names ]
+        return 200, json.dumps(body).encode('utf-8'), 'application/json'
+
+
+class NationalizeHandler(StandInHandler):
+    """ Nationalize batch lookups (/?name[]=...) """
+
+    def answer ( self, path:str, params:Dict[str,List[str]] ):
+        corpus = self.server.corpus
+        names = params.get('name[]', []) or params.get('name', [])
+        body = [ {'name': name, 'country': [{'country_id': corpus.country(name), 'probability': 0.42}]} for name in names ]
+        return 200, json.dumps(body).encode('utf-8'), 'application/json'
+
+
+class ProxyHandler(StandInHandler):
+    """ HTTP forward proxy (GET http://host/path) to the stand-ins, answering 502 while it is down """
+
+    def answer ( self, path:str, params:Dict[str,List[str]] ):
+        if self.server.down:
+            return 502, b'Bad Gateway', 'text/plain'
+        # The environment proxies are ignored, this is the proxy
+        opener = urlrequest.build_opener(urlrequest.ProxyHandler({}))
+        try:
+            with opener.open(self.path, timeout=10) as response:
+                return response.status, response.read(), response.headers.get('Content-Type', 'text/plain')
+        except HTTPError as e:
+            return e.code, e.read(), e.headers.get('Content-Type', 'text/plain')
+
+
+class StandIns:
+    """
+    Local stand-in HTTP servers for Google Scholar, Crossref, Genderize and
+    Nationalize, and a redirection of the real hosts to them. Each server can
+    add latency, random 500 errors and bursts of 429 answers. Stand-in HTTP
+    proxies, which can be taken down, exercise the proxy pool.
+    --------------------------------------------------------------------
+        :param corpus:      Fake papers served by the stand-ins
+        :param latency:     Mean seconds added to every answer, per host
+        :param error_rate:  Probability of a 500 answer, per host
+        :param burst_every: A burst of 429 answers starts every N requests, per host
+        :param burst_size:  Number of 429 answers of each burst
+        :param proxies:     Number of stand-in proxies
+
+    """
+
+    HANDLERS = {
+        'scholar.google.com': ScholarHandler,
+        'api.crossref.org': CrossrefHandler,
+        'api.genderize.io': GenderizeHandler,
+        'api.nationalize.io': NationalizeHandler
+    }
+
+    def __init__( self, corpus:Optional[Corpus]=None, latency:Optional[Dict[str,float]]=None,
+                  error_rate:Optional[Dict[str,float]]=None, burst_every:Optional[Dict[str,int]]=None, burst_size:int=3,
+                  proxies:int=0 ):
+        self.corpus = corpus or Corpus()
+        self.servers = dict()
+        self.proxies = dict()
+        self._originals = dict()
+
+        for host, handler in StandIns.HANDLERS.items():
+            self.servers[host] = self.serve(handler, (latency or {}).get(host, 0.0), (error_rate or {}).get(host, 0.0),
+                                            (burst_every or {}).get(host, 0), burst_size)
+
+        for _ in range(proxies):
+            server = self.serve(ProxyHandler)
+            server.down = False
+            self.proxies[f"http://127.0.0.1:{server.server_port}"] = server
+
+
+    def serve ( self, handler:type, latency:float = 0.0, error_rate:float = 0.0, burst_every:int = 0, burst_size:int = 3 ) -> ThreadingHTTPServer:
+        """ Server of a stand-in on a free local port """
+        server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        server.daemon_threads = True
+        server.corpus = self.corpus
+        server.lock = threading.Lock()
+        server.requests = 0
+        server.latency = latency
+        server.error_rate = error_rate
+        server.burst_every = burst_every
+        server.burst_size = burst_size
+        return server
+
+
+    def scholar_page ( corpus:Corpus, query:str, start:int, years:Optional[Tuple[int,int]] = None ) -> str:
+        """ HTML of a Google Scholar result page with the structure scholarly parses """
+        results = corpus.results(years)
+        rows = []
+        for position, rank in enumerate(results[start:start + 10], start=start):
+            authors = corpus.authors(rank)
+            links = ', '.join(f'<a href="/citations?user=USER{rank}{i}&amp;hl=en">{a["given"][0]} {a["family"]}</a>'
+                              for i, a in enumerate(authors))
+            rows.append(
+                f'<div class="gs_r gs_or gs_scl" data-cid="CID{rank:06d}" data-did="CID{rank:06d}" data-rp="{position}">'
+                f'<div class="gs_ri"><h3 class="gs_rt"><a href="https://example.org/paper/{rank}">{escape(corpus.title(rank))}</a></h3>'
+                f'<div class="gs_a">{links} - Journal of Stand-ins, {corpus.year(rank)} - example.org</div>'
+                f'<div class="gs_rs">Abstract of the stand-in paper {rank}.</div>'
+                f'<div class="gs_fl"><a href="/scholar?cites={rank}&amp;hl=en">Cited by {rank * 3 % 250}</a>'
+                f'<a href="/scholar?q=related:CID{rank:06d}:scholar.google.com/">Related articles</a></div></div></div>')
+
+        navigation = ''
+        if start + 10 < len(results):
+            filters = f"&amp;as_ylo={years[0]}&amp;as_yhi={years[1]}" if years is not None else ''
+            next_url = f"/scholar?start={start + 10}&amp;q={quote_plus(query)}&amp;hl=en&amp;as_sdt=0,5{filters}"
+            navigation = (f'<div id="gs_n"><a href="{next_url}">Next</a></div>'
+                          f'<a href="{next_url}"><span class="gs_ico gs_ico_nav_next"></span></a>')
+
+        return ('<html><body>'
+                '<div id="gs_res_glb" data-sva="/citations?hl=en&amp;info={id}&amp;json="></div>'
+                f'<div class="gs_ab_mdw">About {len(results):,} results</div>'
+                + ''.join(rows) + navigation + '</body></html>')
+
+
+    def start ( self ) -> 'StandIns':
+        for server in [ *self.servers.values(), *self.proxies.values() ]:
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+        return self
+
+
+    def stop ( self ) -> None:
+        self.uninstall()
+        for server in [ *self.servers.values(), *self.proxies.values() ]:
+            server.shutdown()
+            server.server_close()
+
+
+    def set_down ( self, proxy:str, down:bool = True ) -> None:
+        """ Take a stand-in proxy down, or back up """
+        self.proxies[proxy].down = down
+
+
+    def address ( self, host:str ) -> Optional[str]:
+        """ host:port of the stand-in of a real host """
+        server = self.servers.get(host)
+        return f"127.0.0.1:{server.server_port}" if server is not None else None
+
+
+    def num_requests ( self ) -> Dict[str,int]:
+        """ Requests received by each stand-in, the proxies by URL """
+        return { host: server.requests for host, server in [ *self.servers.items(), *self.proxies.items() ] }
+
+
+    def install ( self ) -> 'StandIns':
+        """ Redirect the requests and httpx transports from the real hosts to the stand-ins """
+        from requests.adapters import HTTPAdapter
+        original_send = HTTPAdapter.send
+        self._originals['requests'] = original_send
+        standins = self
+
+        def send( adapter, request, **kwargs ):
+            parts = urlsplit(request.url)
+            address = standins.address(parts.hostname or '')
+            if address is not None:
+                request.url = parts._replace(scheme='http', netloc=address).geturl()
+            return original_send(adapter, request, **kwargs)
+
+        HTTPAdapter.send = send
+
+        try:
+            import httpx
+            original_handle = httpx.HTTPTransport.handle_request
+            self._originals['httpx'] = original_handle
+
+            def handle_request( transport, request ):
+                address = standins.address(request.url.host)
+                if address is not None:
+                    host, port = address.split(':')
+                    request.url = request.url.copy_with(scheme='http', host=host, port=int(port))
+                return original_handle(transport, request)
+
+            httpx.HTTPTransport.handle_request = handle_request
+
+            original_async = httpx.AsyncHTTPTransport.handle_async_request
+            self._originals['httpx_async'] = original_async
+
+            async def handle_async_request( transport, request ):
+                address = standins.address(request.url.host)
+                if address is not None:
+                    host, port = address.split(':')
+                    request.url = request.url.copy_with(scheme='http', host=host, port=int(port))
+                return await original_async(transport, request)
+
+            httpx.AsyncHTTPTransport.handle_async_request = handle_async_request
+        except ImportError:
+            pass
+
+        return self
+
+
+    def uninstall ( self ) -> None:
+        if 'requests' in self._originals:
+            from requests.adapters import HTTPAdapter
+            HTTPAdapter.send = self._originals.pop('requests')
+        if 'httpx' in self._originals:
+            import httpx
+            httpx.HTTPTransport.handle_request = self._originals.pop('httpx')
+            httpx.AsyncHTTPTransport.handle_async_request = self._originals.pop('httpx_async')
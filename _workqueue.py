@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import time
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+class WorkQueue:
+    """
+    Durable queue of GS page-range tasks shared by a coordinator and its
+    workers, in a SQLite file on a disk every process can reach. A worker
+    claims a task with a lease and renews it while the task runs; a task
+    whose lease expires (the worker died or lost its connection) is claimed
+    again by another worker. Failed tasks are retried up to MAX_ATTEMPTS
+    times. The enriched rows are reported to the queue, keyed by query and
+    GSRANK, and merged into the outputs by the coordinator. The queue uses a
+    rollback journal and BEGIN IMMEDIATE transactions, which only rely on
+    file locks (WAL needs shared memory and is unsafe on network disks): the
+    shared disk must support them, e.g. NFS with locking enabled.
+    --------------------------------------------------------------------
+        :param path: SQLite file of the queue
+
+    """
+
+    # Main Params
+    MAX_ATTEMPTS = 3
+    STATES = ['pending', 'leased', 'done', 'failed']
+
+    def __init__( self, path:str ):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = str(path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=60, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=DELETE')
+        self._conn.executescript('''
+            CREATE TABLE IF NOT EXISTS tasks (
+                id INTEGER PRIMARY KEY, query TEXT NOT NULL, first INTEGER NOT NULL, last INTEGER NOT NULL,
+                numentries INTEGER NOT NULL, state TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0,
+                worker TEXT, lease_until REAL, error TEXT, written INTEGER NOT NULL DEFAULT 0, updated REAL NOT NULL,
+                UNIQUE (query, first, last));
+            CREATE INDEX IF NOT EXISTS tasks_state ON tasks (state);
+            CREATE TABLE IF NOT EXISTS results (
+                query TEXT NOT NULL, gsrank INTEGER NOT NULL, row TEXT NOT NULL, worker TEXT,
+                merged INTEGER NOT NULL DEFAULT 0, PRIMARY KEY (query, gsrank));
+            CREATE INDEX IF NOT EXISTS results_merged ON results (merged);
+        ''')
+
+
+    def split ( ranges:List[Tuple[int,int]], task_size:int, page_size:int = 10 ) -> List[Tuple[int,int]]:
+        """ Split page-aligned ranges in tasks of task_size entries, rounded to whole pages """
+        task_size = max(1, -(-task_size // page_size)) * page_size
+        return [ (start, min(start + task_size - 1, last)) for first, last in ranges for start in range(first, last + 1, task_size) ]
+
+
+    def add ( self, query:str, ranges:List[Tuple[int,int]], numentries:int ) -> int:
+        """
+        Enqueue the page ranges of a query. A range already queued is only
+        queued again if it was finished, i.e. some of its entries are missing.
+        Returns the number of tasks queued.
+        ------------------------------------
+            :param query:      Search query to GS
+            :param ranges:     (first, last) GSRANKs of each task
+            :param numentries: Number of entries of the query
+
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute('BEGIN IMMEDIATE')
+            before = self._conn.total_changes
+            self._conn.executemany('''
+                INSERT INTO tasks (query, first, last, numentries, state, updated) VALUES (?, ?, ?, ?, 'pending', ?)
+                ON CONFLICT (query, first, last) DO UPDATE SET state = 'pending', attempts = 0, error = NULL, updated = excluded.updated
+                WHERE state IN ('done', 'failed')''',
+                [ (query, first, last, numentries, now) for first, last in ranges ])
+            return self._conn.total_changes - before
+
+
+    def claim ( self, worker:str, lease:float ) -> Optional[Dict]:
+        """
+        Lease the oldest pending task, or a task whose lease expired. None if there is none.
+        ------------------------------------
+            :param worker: Id of the worker
+            :param lease:  Seconds the task is reserved to the worker without a renewal
+
+        """
+        now = time.time()
+        # The transaction is committed on success and rolled back on an error
+        with self._lock, self._conn:
+            self._conn.execute('BEGIN IMMEDIATE')
+            # Expired leases of tasks out of attempts are not claimed again
+            self._conn.execute('''UPDATE tasks SET state = 'failed', updated = ?
+                                  WHERE state = 'leased' AND lease_until < ? AND attempts >= ?''',
+                               (now, now, WorkQueue.MAX_ATTEMPTS))
+            row = self._conn.execute('''SELECT id, query, first, last, numentries, attempts FROM tasks
+                                        WHERE state = 'pending' OR (state = 'leased' AND lease_until < ?)
+                                        ORDER BY id LIMIT 1''', (now,)).fetchone()
+            if row is not None:
+                self._conn.execute('''UPDATE tasks SET state = 'leased', worker = ?, lease_until = ?, attempts = attempts + 1, updated = ?
+                                      WHERE id = ?''', (worker, now + lease, now, row[0]))
+
+        if row is None:
+            return None
+        return dict(zip(['id', 'query', 'first', 'last', 'numentries', 'attempts'], row[:5] + (row[5] + 1,)))
+
+
+    def renew ( self, task:Dict, worker:str, lease:float ) -> bool:
+        """ Extend the lease of a task. False if the task was claimed by another worker """
+        return self.update('''UPDATE tasks SET lease_until = ?, updated = ? WHERE id = ? AND worker = ? AND state = 'leased' ''',
+                           (time.time() + lease, time.time(), task['id'], worker))
+
+
+    def complete ( self, task:Dict, worker:str, written:int ) -> bool:
+        """ Mark a task as done """
+        return self.update('''UPDATE tasks SET state = 'done', written = ?, error = NULL, updated = ? WHERE id = ? AND worker = ?''',
+                           (written, time.time(), task['id'], worker))
+
+
+    def fail ( self, task:Dict, worker:str, error:str ) -> bool:
+        """ Release a task to be retried, or mark it as failed once it is out of attempts """
+        state = 'failed' if task['attempts'] >= WorkQueue.MAX_ATTEMPTS else 'pending'
+        return self.update('''UPDATE tasks SET state = ?, error = ?, lease_until = NULL, updated = ? WHERE id = ? AND worker = ?''',
+                           (state, error, time.time(), task['id'], worker))
+
+
+    def update ( self, sql:str, values:Tuple ) -> bool:
+        with self._lock:
+            return self._conn.execute(sql, values).rowcount > 0
+
+
+    def report ( self, query:str, gsrank:int, row:Dict[str,str], worker:str ) -> None:
+        """ Store the enriched row of an entry """
+        with self._lock:
+            self._conn.execute('INSERT OR REPLACE INTO results (query, gsrank, row, worker, merged) VALUES (?, ?, ?, ?, 0)',
+                               (query, int(gsrank), json.dumps(row), worker))
+
+
+    def reported ( self, query:str, first:int, last:int ) -> Set[str]:
+        """ GSRANKs of a range already reported """
+        with self._lock:
+            rows = self._conn.execute('SELECT gsrank FROM results WHERE query = ? AND gsrank BETWEEN ? AND ?',
+                                      (query, first, last)).fetchall()
+        return { str(row[0]) for row in rows }
+
+
+    def unmerged ( self, limit:int = 1000 ) -> List[Tuple[str,int,Dict[str,str]]]:
+        """ (query, gsrank, row) of the results not merged yet, in rank order """
+        with self._lock:
+            rows = self._conn.execute('SELECT query, gsrank, row FROM results WHERE merged = 0 ORDER BY query, gsrank LIMIT ?',
+                                      (limit,)).fetchall()
+        return [ (query, gsrank, json.loads(row)) for query, gsrank, row in rows ]
+
+
+    def merged ( self, results:List[Tuple[str,int,Dict[str,str]]] ) -> None:
+        with self._lock, self._conn:
+            self._conn.execute('BEGIN IMMEDIATE')
+            self._conn.executemany('UPDATE results SET merged = 1 WHERE query = ? AND gsrank = ?',
+                                   [ (query, gsrank) for query, gsrank, _ in results ])
+
+
+    def open_tasks ( self ) -> int:
+        """ Tasks pending or running """
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM tasks WHERE state IN ('pending', 'leased')").fetchone()[0]
+
+
+    def failures ( self ) -> List[Tuple[str,int,int,str]]:
+        """ (query, first, last, error) of the failed tasks """
+        with self._lock:
+            return self._conn.execute("SELECT query, first, last, error FROM tasks WHERE state = 'failed' ORDER BY id").fetchall()
+
+
+    def stats ( self ) -> Dict[str,int]:
+        with self._lock:
+            counts = dict(self._conn.execute('SELECT state, COUNT(*) FROM tasks GROUP BY state').fetchall())
+            results = self._conn.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+        return { **{ state: counts.get(state, 0) for state in WorkQueue.STATES }, 'results': results }
+
+
+    def close ( self ) -> None:
+        with self._lock:
+            self._conn.close()
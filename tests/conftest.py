@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import sys
+import importlib.util
+from pathlib import Path
+import pytest
+
+# The package is imported by its name whatever the folder of the checkout is called
+ROOT = Path(__file__).resolve().parents[1]
+if 'ScraperGoogleScholar' not in sys.modules:
+    spec = importlib.util.spec_from_file_location('ScraperGoogleScholar', ROOT / '__init__.py',
+                                                  submodule_search_locations=[str(ROOT)])
+    module = importlib.util.module_from_spec(spec)
+    sys.modules['ScraperGoogleScholar'] = module
+    spec.loader.exec_module(module)
+
+
+@pytest.fixture
+def standins():
+    """ Stand-in services with the rate limits lifted """
+    from ScraperGoogleScholar._standin import StandIns
+    from ScraperGoogleScholar._ratelimit import RateLimiter
+    RateLimiter.configure({ host: 1e6 for host in RateLimiter.LIMITS })
+    services = StandIns(proxies=2).start().install()
+    yield services
+    services.stop()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import pytest
+from ScraperGoogleScholar._availability import AvailabilityProbe
+
+
+def pages(total:int):
+    """ Probe of a query with `total` results that records the probed offsets """
+    def probe(start:int) -> int:
+        probe.starts.append(start)
+        return max(0, min(AvailabilityProbe.PAGE_SIZE, total - start))
+    probe.starts = []
+    return probe
+
+
+@pytest.mark.parametrize('total', [0, 1, 9, 10, 11, 437, 990, 991, 999])
+def test_search_finds_the_last_page(total):
+    probe = pages(total)
+    count, probed = AvailabilityProbe.search(probe)
+    assert count == total
+    assert probed == len(probe.starts) <= 2 * 7 + 1
+
+
+def test_every_page_available_costs_one_request():
+    probe = pages(5000)
+    assert AvailabilityProbe.search(probe) == (1000, 1)
+    assert probe.starts == [990]
+
+
+@pytest.fixture
+def probe_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(AvailabilityProbe, 'CACHE', None)
+    cache = AvailabilityProbe.set_cache(str(tmp_path / 'cache.sqlite'))
+    yield cache
+    cache.close()
+
+
+def test_count_is_cached_per_query_and_years(probe_cache):
+    probe = pages(437)
+    assert AvailabilityProbe.count('gender bias', probe) == 437
+    sent = len(probe.starts)
+    assert AvailabilityProbe.count('gender bias', probe) == 437
+    assert len(probe.starts) == sent
+
+    # The year range is part of the key
+    assert AvailabilityProbe.count('gender bias', pages(12), years=(2000, 2010)) == 12
+
+
+def test_count_against_the_stand_in(standins, probe_cache):
+    standins.corpus.total = 437
+    before = standins.num_requests()['scholar.google.com']
+    assert AvailabilityProbe.count('gender bias') == 437
+    probed = standins.num_requests()['scholar.google.com'] - before
+    assert 1 < probed <= 15
+
+    # Year filters reach the stand-in
+    expected = len(standins.corpus.results((2000, 2005)))
+    assert AvailabilityProbe.count('gender bias', years=(2000, 2005)) == expected
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import pytest
+from ScraperGoogleScholar import _cache
+from ScraperGoogleScholar._cache import ResultCache, LRUCache
+
+
+class Clock:
+    """ Wall clock of the cache moved by the test """
+
+    def __init__( self ):
+        self.now = 1000.0
+
+
+    def time ( self ) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(_cache, 'time', clock)
+    return clock
+
+
+def test_keys_are_normalized(tmp_path):
+    cache = ResultCache(tmp_path / 'cache.sqlite', 'crossref')
+    cache.set('Gender  "Bias"', {'DOI': '10.1/x'})
+    assert cache.get('gender bias') == {'DOI': '10.1/x'}
+    assert cache.stats()['hits'] == 1
+    cache.close()
+
+
+def test_expired_entries(tmp_path, clock):
+    cache = ResultCache(tmp_path / 'cache.sqlite', 'crossref', ttl=60)
+    cache.set('old', 1)
+    clock.now += 30
+    cache.set('new', 2)
+    clock.now += 40
+
+    assert cache.get('old') is None
+    assert cache.get('new') == 2
+    assert cache.stats()['misses'] == 1 and len(cache) == 1
+    clock.now += 60
+    assert cache.purge() == 1 and len(cache) == 0
+    cache.close()
+
+
+def test_least_recently_used_evicted(tmp_path, clock, monkeypatch):
+    monkeypatch.setattr(ResultCache, 'EVICT_FRACTION', 0.0)
+    cache = ResultCache(tmp_path / 'cache.sqlite', 'crossref', maxsize=3)
+    for key in ('a', 'b', 'c'):
+        cache.set(key, key)
+        clock.now += 1
+
+    # The hit on a is only written with the next eviction
+    assert cache.get('a') == 'a'
+    clock.now += 1
+    cache.set('d', 'd')
+    assert [ key for key in 'abcd' if cache.get(key) is not None ] == ['a', 'c', 'd']
+
+    # Replacing a key does not evict
+    cache.set('d', 'e')
+    assert len(cache) == 3 and cache.get('d') == 'e'
+    cache.close()
+
+
+def test_access_times_survive_a_reopen(tmp_path, clock):
+    path = tmp_path / 'cache.sqlite'
+    cache = ResultCache(path, 'crossref', maxsize=2)
+    cache.set('a', 1)
+    clock.now += 1
+    cache.set('b', 2)
+    clock.now += 1
+    cache.get('a')
+    cache.close()
+
+    cache = ResultCache(path, 'crossref', maxsize=2)
+    cache.set('c', 3)
+    assert cache.get('a') == 1 and cache.get('b') is None
+    cache.close()
+
+
+def test_lru_cache():
+    cache = LRUCache(maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert cache.get('b') is None and cache.get('a') == 1 and len(cache) == 2
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import zipfile
+import requests
+from ScraperGoogleScholar._cassette import Cassette
+
+
+def test_record_and_replay(standins, tmp_path):
+    archive = tmp_path / 'run.zip'
+    cassette = Cassette(archive, 'record').install()
+    recorded = requests.get('https://api.genderize.io/', params={'name[]': 'Maria'}).json()
+    cassette.uninstall()
+    assert not cassette.journal.exists()
+
+    standins.stop()
+    cassette = Cassette(archive, 'replay').install()
+    assert requests.get('https://api.genderize.io/', params={'name[]': 'Maria'}).json() == recorded
+    cassette.uninstall()
+
+
+def test_recording_survives_a_crash(standins, tmp_path):
+    archive = tmp_path / 'run.zip'
+    cassette = Cassette(archive, 'record').install()
+    requests.get('https://api.genderize.io/', params={'name[]': 'Maria'})
+    cassette.flush()
+    requests.get('https://api.genderize.io/', params={'name[]': 'John'})
+    requests.get('https://api.genderize.io/', params={'name[]': 'Wei'})
+
+    # The process dies: the transports are restored but nothing else runs, the last line is cut
+    cassette._journal.close()
+    cassette._originals.clear()
+    standins.uninstall()
+    with open(cassette.journal, 'rb+') as journal:
+        journal.truncate(journal.seek(0, 2) - 5)
+    assert zipfile.ZipFile(archive).testzip() is None
+    assert len(zipfile.ZipFile(archive).namelist()) == 1
+
+    # The journal is folded when the archive is opened again
+    cassette = Cassette(archive, 'replay')
+    assert not cassette.journal.exists()
+    assert len(zipfile.ZipFile(archive).namelist()) == 2
+    cassette.install()
+    assert requests.get('https://api.genderize.io/', params={'name[]': 'John'}).json()[0]['name'] == 'John'
+    cassette.uninstall()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import csv
+from ScraperGoogleScholar._compact import compact
+from ScraperGoogleScholar._resume import CSVWriter, DatedOutputs, ResumeIndex
+from ScraperGoogleScholar._scraper import ScraperGooleScholar
+
+NAME = 'genderbias.csv'
+
+
+def write_day ( root, day:str, rows ):
+    """ Output CSV of a day with (GSRANK, TITLE) rows """
+    folder = root / day
+    folder.mkdir(parents=True, exist_ok=True)
+    writer = CSVWriter(folder / NAME, ['GSRANK', 'TITLE'])
+    for rank, title in rows:
+        writer.write({'GSRANK': str(rank), 'TITLE': title})
+    writer.close()
+    return folder / NAME
+
+
+def read_rows ( path ):
+    with open(path, newline='', encoding='utf-8') as csvfile:
+        return [ (row['GSRANK'], row['TITLE']) for row in csv.DictReader(csvfile) ]
+
+
+def test_ranks_of_every_day(tmp_path):
+    write_day(tmp_path, '2024-01-01', [(1, 'a'), (2, 'b')])
+    today = write_day(tmp_path, '2024-01-03', [(3, 'c')])
+    (tmp_path / 'notes').mkdir()
+    outputs = DatedOutputs.of(today)
+
+    assert [ folder.name for folder in outputs.folders() ] == ['2024-01-01', '2024-01-03']
+    assert outputs.names() == [NAME]
+    assert outputs.ranks(NAME) == {'1', '2', '3'}
+    assert outputs.ranks(NAME, exclude=today) == {'1', '2'}
+    assert DatedOutputs.of(tmp_path / NAME) is None
+
+    # A run of today skips the ranks stored on the other days
+    assert ScraperGooleScholar().get_downloaded_entries('gender bias', str(today.parent)) == {'1', '2', '3'}
+
+
+def test_compact_keeps_the_latest_row(tmp_path):
+    write_day(tmp_path, '2024-01-01', [(2, 'old two'), (1, 'one'), (10, 'ten')])
+    write_day(tmp_path, '2024-01-02', [(2, 'new two'), (3, 'three')])
+    outputs = DatedOutputs(tmp_path)
+
+    assert compact(outputs, NAME) == (4, 2)
+    assert read_rows(tmp_path / NAME) == [('1', 'one'), ('2', 'new two'), ('3', 'three'), ('10', 'ten')]
+    assert ResumeIndex(tmp_path / NAME).ranks == {'1', '2', '3', '10'}
+
+    # Compacting again reads the compacted file too, a later day still wins
+    write_day(tmp_path, '2024-01-05', [(3, 'newer three'), (4, 'four')])
+    assert compact(outputs, NAME) == (5, 4)
+    assert read_rows(tmp_path / NAME)[2:4] == [('3', 'newer three'), ('4', 'four')]
+
+
+def test_compact_prune(tmp_path):
+    write_day(tmp_path, '2024-01-01', [(1, 'one')])
+    write_day(tmp_path, '2024-01-02', [(2, 'two')])
+    (tmp_path / '2024-01-02' / 'other.csv').write_text('GSRANK\n7\n', encoding='utf-8')
+    outputs = DatedOutputs(tmp_path)
+
+    assert compact(outputs, NAME, prune=True) == (2, 2)
+    assert not (tmp_path / '2024-01-01').exists()
+    assert sorted(path.name for path in (tmp_path / '2024-01-02').iterdir()) == ['other.csv']
+    assert outputs.files(NAME) == [tmp_path / NAME]
+
+    # The ranks are still found for the next runs
+    assert outputs.ranks(NAME) == {'1', '2'}
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+import asyncio
+import httpx
+import pytest
+from ScraperGoogleScholar._crossref_client import CrossrefClient
+
+
+@pytest.fixture
+def client(standins):
+    client = CrossrefClient(mailto='team@example.org', in_flight=3)
+    yield client
+    client.close()
+
+
+def test_single_lookup(client, standins):
+    assert client.headers()['User-Agent'] == 'ScraperGoogleScholar/1.0 (mailto:team@example.org)'
+    assert client.params('q') == {'query': 'q', 'select': 'DOI,author', 'rows': 1, 'mailto': 'team@example.org'}
+
+    work = client.works(f'"{standins.corpus.title(7)}"')
+    assert work == {'DOI': '10.5555/standin.7', 'author': standins.corpus.authors(7)}
+
+    # No match: the error is raised
+    with pytest.raises(IndexError):
+        client.works('nothing like it')
+
+
+def test_bulk_lookups_keep_order_and_errors(client, standins):
+    before = standins.num_requests()['api.crossref.org']
+    queries = [ f'"{standins.corpus.title(rank)}"' for rank in range(1, 13) ]
+    queries.insert(4, 'nothing like it')
+
+    results = client.works_many(queries)
+    assert isinstance(results[4], IndexError)
+    del results[4]
+    assert [ result['DOI'] for result in results ] == [ f"10.5555/standin.{rank}" for rank in range(1, 13) ]
+    assert standins.num_requests()['api.crossref.org'] - before == 13
+    assert client.works_many([]) == []
+
+
+def test_bulk_lookups_bounded_in_flight(client, standins):
+    client.works_many(['"paper number 1"'])
+    get = client._aclient.get
+    flying = {'now': 0, 'max': 0}
+
+    async def counted ( *args, **kwargs ) -> httpx.Response:
+        flying['now'] += 1
+        flying['max'] = max(flying['max'], flying['now'])
+        try:
+            await asyncio.sleep(0.02)
+            return await get(*args, **kwargs)
+        finally:
+            flying['now'] -= 1
+
+    client._aclient.get = counted
+    results = client.works_many([ f'"paper number {rank}"' for rank in range(1, 21) ])
+    assert all(isinstance(result, dict) for result in results)
+    assert flying['max'] == 3
+
+
+def test_close_stops_the_loop(standins):
+    client = CrossrefClient()
+    client.works_many(['"paper number 1"'])
+    loop = client.loop()
+    client.close()
+    assert client._loop is None
+    assert client.client.is_closed
+    for _ in range(100):
+        if not loop.is_running():
+            break
+        time.sleep(0.01)
+    assert not loop.is_running()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import gzip
+import json
+import pytest
+from ScraperGoogleScholar._crossref import CrossrefAPI
+from ScraperGoogleScholar._crossref_index import CrossrefIndex, JSONItems
+
+
+def work ( number:int ) -> dict:
+    return {'DOI': f"10.5555/work.{number}", 'title': [f"Gender bias in citation number {number}"],
+            'issued': {'date-parts': [[2000 + number]]}, 'author': [{'given': 'Ana', 'family': 'Garcia'}],
+            'score': 12.5}
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = CrossrefIndex(tmp_path / 'index.sqlite')
+    yield index
+    index.close()
+
+
+def test_ingest_gzipped_json_dump(index, tmp_path, monkeypatch):
+    # Tiny chunks, so values are split between reads
+    monkeypatch.setattr(JSONItems, 'CHUNK', 7)
+    dump = tmp_path / '0.json.gz'
+    with gzip.open(dump, 'wt', encoding='utf-8') as dumpfile:
+        json.dump({'items': [ work(number) for number in range(1, 21) ], 'total': 20}, dumpfile, indent=1)
+
+    assert index.ingest(dump, verbose=False) == 20
+    assert len(index) == 20
+    assert index.lookup('A Garcia', '2007', 'Gender bias in citation number 7')['DOI'] == '10.5555/work.7'
+
+    # A file already ingested is skipped
+    assert index.ingest(tmp_path, verbose=False) == 0
+
+
+def test_json_items_of_every_layout(tmp_path):
+    layouts = [ {'status': 'ok', 'message': {'total-results': 2, 'items': [work(1), work(2)]}},
+                [work(1), work(2)],
+                {'items': []} ]
+    for layout, expected in zip(layouts, [2, 2, 0]):
+        path = tmp_path / 'dump.json'
+        path.write_text(json.dumps(layout), encoding='utf-8')
+        assert len(list(CrossrefIndex.works(path))) == expected
+
+
+def test_malformed_json_dump(tmp_path):
+    path = tmp_path / 'dump.json'
+    path.write_text('{"items": [{"DOI": "10.1/x"} {"DOI": "10.1/y"}]}', encoding='utf-8')
+    with pytest.raises(ValueError):
+        list(CrossrefIndex.works(path))
+
+
+def indexed ( doi:str, title:str, year, family:str ) -> dict:
+    work = {'DOI': doi, 'title': [title], 'author': [{'given': 'Maria', 'family': family}]}
+    if year is not None:
+        work['issued'] = {'date-parts': [[year]]}
+    return work
+
+
+def test_lookup_truncated_titles_surnames_and_years(index):
+    title = 'Measuring gender bias in the citation of scientific papers across disciplines'
+    index.insert([ CrossrefIndex.row(work) for work in [
+        indexed('10.1/smith', title, 2015, 'Smith'),
+        indexed('10.1/morales', title, 2015, 'Morales'),
+        indexed('10.1/undated', 'A study of Peer review outcomes', None, 'Wang'),
+        indexed('10.1/other', 'Something else entirely', 2015, 'Morales') ] ])
+
+    # The surname breaks the tie between works with the same title
+    assert index.lookup('M Morales; A Smith', '2015', title)['DOI'] == '10.1/morales'
+    assert index.lookup('J Smith', '2015', title)['author'] == [{'given': 'Maria', 'family': 'Smith'}]
+
+    # GS truncates long titles, the cut word is left out and the prefix compared
+    assert index.lookup('M Morales', '2015', 'Measuring gender bias in the citation of scientific pa…')['DOI'] == '10.1/morales'
+
+    # Accents and punctuation do not matter
+    assert index.lookup('M Morales', '2016', 'Measuring génder bias: in the citation of scientific papers across disciplines!') \
+        ['DOI'] == '10.1/morales'
+
+    # Years more than one apart are not matched, works without year are
+    assert index.lookup('M Morales', '2018', title) is None
+    assert index.lookup('W Wang', '1990', 'A study of peer review outcomes')['DOI'] == '10.1/undated'
+
+    # A similar but different title is a miss
+    assert index.lookup('M Morales', '2015', 'Measuring gender bias in patents') is None
+    assert index.stats() == {'works': 4, 'hits': 5, 'misses': 2}
+
+
+def test_petition_asks_the_live_api_only_on_a_miss(standins, index, monkeypatch):
+    monkeypatch.setattr(CrossrefAPI, 'CACHE', None)
+    monkeypatch.setattr(CrossrefAPI, 'INDEX', index)
+    corpus = standins.corpus
+    authors = '; '.join(f"{a['given'][0]} {a['family']}" for a in corpus.authors(3))
+    index.insert([ CrossrefIndex.row(indexed('10.1/local.3', corpus.title(3), corpus.year(3), corpus.authors(3)[0]['family'])) ])
+
+    before = standins.num_requests()['api.crossref.org']
+    doi, _, status = CrossrefAPI.petition(authors, str(corpus.year(3)), corpus.title(3), 3, False)
+    assert (doi, status) == ('10.1/local.3', 'PASS')
+    assert standins.num_requests()['api.crossref.org'] == before
+
+    authors = '; '.join(f"{a['given'][0]} {a['family']}" for a in corpus.authors(4))
+    doi, _, status = CrossrefAPI.petition(authors, str(corpus.year(4)), corpus.title(4), 4, False)
+    assert (doi, status) == ('10.5555/standin.4', 'PASS')
+    assert standins.num_requests()['api.crossref.org'] == before + 1
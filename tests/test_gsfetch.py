@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import pytest
+from ScraperGoogleScholar._gsfetch import GSParser, GSSearch
+from ScraperGoogleScholar._standin import Corpus, StandIns
+
+
+def test_parse_a_result_page():
+    corpus = Corpus(total=25)
+    results, next_url, total = GSParser.parse(StandIns.scholar_page(corpus, 'gender bias', 10))
+
+    assert total == 25
+    assert [ result['gsrank'] for result in results ] == list(range(11, 21))
+    assert next_url.startswith('/scholar?start=20&') and 'q=gender+bias' in next_url
+
+    first = results[0]
+    authors = corpus.authors(11)
+    assert first['bib']['title'] == corpus.title(11)
+    assert first['bib']['author'] == [ f"{a['given'][0]} {a['family']}" for a in authors ]
+    assert first['author_id'] == [ f"USER11{i}" for i in range(len(authors)) ]
+    assert first['bib']['venue'] == 'Journal of Stand-ins'
+    assert first['bib']['pub_year'] == str(corpus.year(11))
+    # The 'Abstract' prefix is dropped, as scholarly does
+    assert first['bib']['abstract'] == 'of the stand-in paper 11.'
+    assert first['num_citations'] == 11 * 3 % 250
+    assert first['citedby_url'] == '/scholar?cites=11&hl=en'
+    assert first['pub_url'] == 'https://example.org/paper/11'
+    assert first['url_scholarbib'] == GSParser.BIBCITE.format('CID000011', '10')
+
+    # The last page has no next link
+    results, next_url, _ = GSParser.parse(StandIns.scholar_page(corpus, 'gender bias', 20))
+    assert len(results) == 5 and next_url is None
+
+
+def test_parse_markers_eprints_and_missing_fields():
+    page = ('<html><body><div class="gs_r gs_or gs_scl" data-cid="XYZ" data-rp="0">'
+            '<div class="gs_ggs gs_fl"><a href="https://example.org/paper.pdf">[PDF] example.org</a></div>'
+            '<div class="gs_ri"><h3 class="gs_rt"><span class="gs_ctc">[PDF]</span> <a href="https://example.org/p">A paper</a></h3>'
+            '<div class="gs_a">M Morales, Proceedings of Something - example.org</div>'
+            '<div class="gs_rs">Abstract: what it is about…</div>'
+            '<div class="gs_fl"><a href="/scholar?q=related:XYZ">Related articles</a></div></div></div></body></html>')
+    results, next_url, total = GSParser.parse(page)
+
+    result = results[0]
+    assert result['bib']['title'] == 'A paper'
+    assert result['bib']['author'] == ['M Morales']
+    assert result['author_id'] == ['', '']
+    assert (result['bib']['venue'], result['bib']['pub_year']) == ('NA', 'NA')
+    assert result['bib']['abstract'] == 'what it is about'
+    assert result['eprint_url'] == 'https://example.org/paper.pdf'
+    assert result['num_citations'] == 0 and 'citedby_url' not in result
+    assert result['url_related_articles'] == '/scholar?q=related:XYZ'
+    assert next_url is None and total is None
+
+
+def test_captcha_pages_raise():
+    page = '<html><body><form id="gs_captcha_f"></form></body></html>'
+    with pytest.raises(ConnectionError):
+        GSParser.parse(page)
+    with pytest.raises(ConnectionError):
+        GSParser.count(page)
+    assert GSParser.count(StandIns.scholar_page(Corpus(total=7), 'q', 0)) == 7
+
+
+def test_search_walks_the_pages(standins):
+    standins.corpus.total = 25
+    before = standins.num_requests()['scholar.google.com']
+
+    search = GSSearch('gender bias', start_index=10)
+    assert search.total_results == 25
+    assert [ result['gsrank'] for result in search ] == list(range(11, 26))
+    assert search.pages == 2
+    assert standins.num_requests()['scholar.google.com'] - before == 2
+
+    # Year filters are sent with the query
+    expected = standins.corpus.results((2000, 2001))
+    search = GSSearch('gender bias', years=(2000, 2001))
+    assert [ result['bib']['pub_year'] for result in search ] == [ str(standins.corpus.year(rank)) for rank in expected ]
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import pytest
+from ScraperGoogleScholar import _metrics
+from ScraperGoogleScholar._metrics import Histogram, Metrics
+
+
+class Clock:
+    """ Clock of the metrics that only moves when the test advances it """
+
+    def __init__( self ):
+        self.now = 1000.0
+
+
+    def monotonic ( self ) -> float:
+        return self.now
+
+
+    def perf_counter ( self ) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(_metrics, 'time', clock)
+    return clock
+
+
+def test_histogram_percentiles():
+    histogram = Histogram((1.0, 2.0, 4.0))
+    assert histogram.percentile(0.5) is None and histogram.summary()['mean'] is None
+    for seconds in [0.5] * 50 + [1.5] * 40 + [3.0] * 9 + [10.0]:
+        histogram.observe(seconds)
+
+    assert histogram.buckets == [50, 40, 9, 1]
+    assert histogram.percentile(0.5) == pytest.approx(1.0)
+    assert histogram.percentile(0.9) == pytest.approx(2.0)
+    assert 2.0 < histogram.percentile(0.99) <= 4.0
+    assert histogram.percentile(1.0) == 10.0
+    summary = histogram.summary()
+    assert (summary['count'], summary['min'], summary['max'], summary['total']) == (100, 0.5, 10.0, 122.0)
+
+
+def test_timers_counters_and_report(clock):
+    metrics = Metrics()
+    for seconds in (0.2, 0.4):
+        with metrics.timer('crossref'):
+            clock.now += seconds
+    with pytest.raises(KeyError):
+        with metrics.timer('names'):
+            clock.now += 1.0
+            raise KeyError('name')
+
+    metrics.count('requests', host='api.crossref.org')
+    metrics.count('requests', 2, host='api.crossref.org')
+    metrics.slept('retry', 0.0, service='crossref')
+    metrics.slept('retry', 1.5, service='crossref')
+    for result in ('hit', 'hit', 'hit', 'miss'):
+        metrics.count('cache_lookups', cache='crossref', result=result)
+    metrics.start(10)
+    metrics.advance(4)
+
+    report = metrics.report()
+    assert report['elapsed'] == pytest.approx(1.6)
+    assert report['stages']['crossref']['count'] == 2 and report['stages']['crossref']['total'] == pytest.approx(0.6)
+    assert report['stages']['names']['count'] == 1
+    assert report['counters']['requests'] == [{'host': 'api.crossref.org', 'value': 3}]
+    assert report['counters']['sleep_seconds'] == [{'service': 'crossref', 'source': 'retry', 'value': 1.5}]
+    assert report['caches'] == {'crossref': {'hits': 3, 'misses': 1, 'hit_ratio': 0.75}}
+    assert report['entries']['done'] == 4 and report['entries']['total'] == 10
+
+    # 4 entries in 1.6 s: the 6 left take 2.4 s
+    assert metrics.progress_line() == '[ Progress ] 4/10 entries (40.0%) - 9000 entries/h - ETA 0:00:02'
+
+
+def test_exports(clock, tmp_path):
+    metrics = Metrics()
+    metrics.export_to(report=tmp_path / 'report.json', prometheus=tmp_path / 'metrics' / 'gscraper.prom')
+    metrics.observe('gs_page', 0.003)
+    metrics.count('retries', service='scholar', kind='blo"cked')
+    metrics.count('cache_lookups', cache='genderize', result='miss')
+    metrics.start(2)
+
+    # The exports are refreshed while the run advances, at most every EXPORT_EVERY seconds
+    metrics.advance()
+    assert not (tmp_path / 'report.json').exists()
+    clock.now += Metrics.EXPORT_EVERY
+    metrics.advance()
+    assert json.loads((tmp_path / 'report.json').read_text())['entries']['done'] == 2
+
+    lines = (tmp_path / 'metrics' / 'gscraper.prom').read_text().splitlines()
+    assert 'gscraper_stage_seconds_bucket{stage="gs_page",le="0.001"} 0' in lines
+    assert 'gscraper_stage_seconds_bucket{stage="gs_page",le="0.005"} 1' in lines
+    assert 'gscraper_stage_seconds_bucket{stage="gs_page",le="+Inf"} 1' in lines
+    assert 'gscraper_stage_seconds_count{stage="gs_page"} 1' in lines
+    assert 'gscraper_retries_total{kind="blo\\"cked",service="scholar"} 1' in lines
+    assert 'gscraper_entries{state="done"} 2' in lines
+    assert 'gscraper_cache_hit_ratio{cache="genderize"} 0.0' in lines
+    assert not list(tmp_path.rglob('*.tmp'))
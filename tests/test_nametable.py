@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import csv
+import random
+import threading
+from ScraperGoogleScholar._demografix import GenderPredictor
+from ScraperGoogleScholar._names import NameInference
+from ScraperGoogleScholar._nametable import NameTable, PackedColumns
+
+
+def read_rows ( path ):
+    with open(path, newline='', encoding='utf-8') as csvfile:
+        return list(csv.reader(csvfile))
+
+
+def test_concurrent_flushes_keep_every_row(tmp_path, monkeypatch):
+    monkeypatch.setattr(NameTable, 'FLUSH_EVERY', 3)
+    path = tmp_path / 'names.csv'
+    table = NameTable(path)
+
+    def add ( worker:int ):
+        for i in range(50):
+            table.add('genderize', f"name{worker}x{i}", {'gender': 'female', 'probability': 0.9, 'count': 10})
+            table.flush()
+
+    workers = [ threading.Thread(target=add, args=(worker,)) for worker in range(8) ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    table.flush()
+
+    rows = read_rows(path)
+    assert rows[0] == NameTable.FIELDNAMES
+    assert rows.count(NameTable.FIELDNAMES) == 1
+    assert len(rows) == 1 + 8 * 50
+    assert NameTable(path).get('genderize', 'name7x49')['gender'] == 'female'
+
+
+def test_dataset_upgraded_once_when_loaded(tmp_path):
+    path = tmp_path / 'names.csv'
+    path.write_text('name,gender,probability,count,source\nMaria,F,0.98,500,census\n', encoding='utf-8')
+
+    table = NameTable(path)
+    assert read_rows(path)[0] == NameTable.FIELDNAMES + ['source']
+    assert table.get('genderize', 'maria') == {'name': 'maria', 'gender': 'female', 'probability': 0.98, 'count': 500}
+
+    table.add('nationalize', 'Garcia', {'country': [{'country_id': 'ES', 'probability': 0.6}]})
+    table.flush()
+    rows = read_rows(path)
+    assert rows[1][:4] == ['genderize', 'Maria', '', 'female'] and rows[1][-1] == 'census'
+    assert rows[2][:3] == ['nationalize', 'Garcia', 'ES']
+
+
+def test_packed_columns_binary_search():
+    names = [ f"{country}:{name}" for country in ('', 'ES', 'US') for name in ('ana', 'zoë', 'ángel', 'wei', '王芳', 'an') ]
+    rows = [ (key, 'female' if i % 2 else 'male', i / 100, i) for i, key in enumerate(names) ]
+    shuffled = list(rows)
+    random.Random(3).shuffle(shuffled)
+    columns = PackedColumns(shuffled + [(':ana', 'female', 0.5, 99)])
+
+    # Every key is found, the last row of a key wins
+    assert len(columns) == len(names)
+    for key, label, probability, count in rows:
+        expected = ('female', 0.5, 99) if key == ':ana' else (label, round(probability, 4), count)
+        assert columns.find(key) == expected
+
+    # Missing keys before, between and after the stored ones, and prefixes of them
+    for key in ('', ':', ':a', ':anaa', 'AA:ana', 'ES:zo', 'ZZ:ana', 'US:王', 'US:王芳芳'):
+        assert columns.find(key) is None
+    assert PackedColumns().find(':ana') is None
+
+    # Rows come back sorted, the order of the search
+    assert [ row[0].encode('utf-8') for row in columns.rows() ] == sorted(key.encode('utf-8') for key in names)
+
+
+def test_recent_answers_are_merged(monkeypatch):
+    monkeypatch.setattr(NameTable, 'MERGE_EVERY', 5)
+    table = NameTable()
+    for i in range(12):
+        table.add('genderize', f"Name{i}", {'gender': 'male', 'probability': 0.75, 'count': i})
+
+    assert len(table.columns['genderize']) == 10 and len(table.recent['genderize']) == 2
+    for i in range(12):
+        assert table.get('genderize', f"name{i}") == {'name': f"name{i}", 'gender': 'male', 'probability': 0.75, 'count': i}
+    assert table.get('genderize', 'name12') is None
+    assert table.stats() == {'names': 12, 'hits': 12, 'misses': 1}
+
+
+def test_api_answers_are_written_back(standins, tmp_path, monkeypatch):
+    monkeypatch.setattr(GenderPredictor, 'INFERENCE', NameInference())
+    path = tmp_path / 'names.csv'
+    table = GenderPredictor.set_table(path)
+
+    inference = GenderPredictor.INFERENCE
+    genders = inference.genderize(['Maria', 'Wei'], 'ES')
+    countries = inference.nationalize(['Garcia'])
+    assert inference.num_requests == {'genderize': 1, 'nationalize': 1}
+    table.flush()
+
+    rows = read_rows(path)
+    assert rows[1:] == [ ['genderize', 'Maria', 'ES', 'female', str(genders['Maria']['probability']), '100'],
+                         ['genderize', 'Wei', 'ES', 'female', str(genders['Wei']['probability']), '100'],
+                         ['nationalize', 'Garcia', standins.corpus.country('Garcia'), '', '0.42', ''] ]
+
+    # The next run answers them from the table, without requests
+    inference = NameInference(table=NameTable(path))
+    assert inference.genderize(['Maria', 'Wei'], 'ES')['Wei']['gender'] == 'female'
+    assert inference.nationalize(['Garcia'])['Garcia'] == countries['Garcia']
+    assert inference.genderize(['Maria'], 'US') and inference.num_requests == {'genderize': 1, 'nationalize': 0}
@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import pytest
+from ScraperGoogleScholar._scraper import ScraperGooleScholar
+
+
+@pytest.fixture
+def papers(tmp_path):
+    store = ScraperGooleScholar.set_papers(str(tmp_path / 'papers.sqlite'))
+    yield store
+    ScraperGooleScholar.PAPERS = None
+    store.close()
+
+
+def test_doi_fallback_needs_a_confirmed_match(standins, papers):
+    scraper = ScraperGooleScholar()
+    doi = '10.5555/shared'
+    authors = [{'given': 'Ana', 'family': 'Garcia'}, {'given': 'Kwame', 'family': 'Tanaka'}]
+    first = scraper.enrich_paper('A Garcia; K Tanaka', '2020', 'Paper one', 1, False, (doi, authors, 'PASS'), 'CLUSTER1')
+
+    # Crossref returned the same DOI for an unrelated paper, but its first surname does not match
+    unrelated = [{'given': 'Wei', 'family': 'Wang'}]
+    second = scraper.enrich_paper('Wei Wang', '2020', 'Paper two', 2, False, (doi, unrelated, 'MISSING'), 'CLUSTER2')
+
+    assert second[ScraperGooleScholar.FIRST_AUTHOR] == 'Wei Wang'
+    assert second[ScraperGooleScholar.DOI_KEY] == 'https://doi.org/' + doi
+    assert papers.get('CLUSTER2') == second
+
+    # The unconfirmed DOI is not indexed: another version of the first paper still finds it
+    third = scraper.enrich_paper('A Garcia', '2021', 'Paper one (preprint)', 3, False, (doi, authors, 'PASS'), 'CLUSTER3')
+    assert third == first
+    assert papers.get('CLUSTER3') == first
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+import random
+import pytest
+from ScraperGoogleScholar._pipeline import Pipeline
+from ScraperGoogleScholar._scraper import ScraperGooleScholar
+from ScraperGoogleScholar._demografix import GenderPredictor
+
+
+def test_names_prefetched_once_per_page(standins, monkeypatch):
+    monkeypatch.setattr(ScraperGooleScholar, 'FETCHER', 'native')
+    calls = []
+    prefetch = GenderPredictor.prefetch
+
+    def counted ( authors ):
+        calls.append(list(authors))
+        return prefetch(authors)
+
+    monkeypatch.setattr(GenderPredictor, 'prefetch', counted)
+    records = list(ScraperGooleScholar.stream('gender bias', 20))
+
+    assert len(records) == 20
+    assert [ len(authors) for authors in calls ] == [20, 20]
+    assert all(record.first_author_gender for record in records)
+
+
+class FakeScraper:
+    """ Scraper with `total` GS results whose enrichment takes a random time and fails for some ranks """
+
+    PAGE_SIZE = 10
+
+    def __init__( self, total:int, failing=(), crossref_fails:bool = False ):
+        self.total = total
+        self.failing = set(failing)
+        self.crossref_fails = crossref_fails
+        self.fetched = 0
+        self.pages = []
+        self.crossref = dict()
+        self.written = []
+
+
+    def search ( self ):
+        return iter(range(1, self.total + 1))
+
+
+    def fetch_entry ( self, search_query, vpn, new_page = False ):
+        self.fetched += 1
+        return {'rank': next(search_query)}
+
+
+    def crossref_page ( self, page, verbose ):
+        self.pages.append([ numentry for numentry, _ in page ])
+        if self.crossref_fails:
+            raise ConnectionError('Crossref is down')
+        return { numentry: f"doi-{numentry}" for numentry, _ in page }
+
+
+    def enrich_entry ( self, entrydict, numentry, numentries, verbose, crossref = None ):
+        time.sleep(random.uniform(0, 0.01))
+        if numentry in self.failing:
+            raise ValueError(f"entry {numentry} failed")
+        self.crossref[numentry] = crossref
+        return {'GSRANK': str(entrydict['rank'])}
+
+
+    def write ( self, query, entry, numentry, outdir ):
+        self.written.append(numentry)
+
+
+def test_rows_written_in_rank_order_and_failures_dropped():
+    scraper = FakeScraper(35, failing={4, 17})
+    pipeline = Pipeline(scraper, 'gender bias', '.', 'desktop', workers=8, verbose=False)
+    wanted = [ str(rank) for rank in range(1, 36) if rank not in (2, 30) ]
+
+    assert pipeline.run(scraper.search(), 35, wanted) == 31
+    assert scraper.written == [ rank for rank in range(1, 36) if rank not in (2, 4, 17, 30) ]
+    assert pipeline.failed == 2
+
+    # A Crossref lookup per GS page, with the entries of the page still missing
+    assert scraper.pages == [[1, 3, 4, 5, 6, 7, 8, 9, 10], list(range(11, 21)), [21, 22, 23, 24, 25, 26, 27, 28, 29],
+                             list(range(31, 36))]
+    assert all(scraper.crossref[rank] == f"doi-{rank}" for rank in scraper.written)
+
+
+def test_run_stops_at_the_end_of_the_results():
+    scraper = FakeScraper(12)
+    pipeline = Pipeline(scraper, 'gender bias', '.', 'desktop', workers=2, verbose=False)
+    assert pipeline.run(scraper.search(), 30, [ str(rank) for rank in range(1, 31) ]) == 12
+    assert scraper.written == list(range(1, 13)) and scraper.fetched == 13
+
+
+def test_failed_bulk_lookup_enriches_entries_alone():
+    scraper = FakeScraper(15, crossref_fails=True)
+    pipeline = Pipeline(scraper, 'gender bias', '.', 'desktop', workers=4, verbose=False)
+    assert pipeline.run(scraper.search(), 15, [ str(rank) for rank in range(1, 16) ]) == 15
+    assert set(scraper.crossref.values()) == {None}
+
+
+def test_writer_errors_stop_the_run():
+    scraper = FakeScraper(40)
+    def write ( query, entry, numentry, outdir ):
+        if numentry == 12:
+            raise OSError('disk full')
+        scraper.written.append(numentry)
+    scraper.write = write
+
+    pipeline = Pipeline(scraper, 'gender bias', '.', 'desktop', workers=2, verbose=False)
+    with pytest.raises(OSError):
+        pipeline.run(scraper.search(), 40, [ str(rank) for rank in range(1, 41) ])
+    assert scraper.written == list(range(1, 12))
+    assert scraper.fetched < 40
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+import threading
+import pytest
+from ScraperGoogleScholar import _proxy
+from ScraperGoogleScholar._proxy import Proxy, ProxyPool
+from ScraperGoogleScholar._scraper import ScraperGooleScholar
+
+
+@pytest.fixture
+def pool(standins, monkeypatch):
+    pool = ProxyPool(list(standins.proxies), cooldown=0.3)
+    monkeypatch.setattr(Proxy, 'POOL', pool)
+    return pool
+
+
+def test_requests_go_through_the_current_proxy(standins, pool, monkeypatch):
+    monkeypatch.setattr(ScraperGooleScholar, 'FETCHER', 'native')
+    first, second = standins.proxies
+    assert pool.rotate() == first
+
+    records = list(ScraperGooleScholar.stream('gender bias', 10))
+    assert len(records) == 10
+    assert standins.num_requests()[first] >= 2 and standins.num_requests()[second] == 0
+
+    # The current proxy goes down: the rotation skips it
+    standins.set_down(first)
+    assert pool.rotate() == second
+    assert pool.stats()[first]['cooling'] > 0
+
+
+class Clock:
+    """ Monotonic clock of the pool that only moves when the pool sleeps or the test advances it """
+
+    def __init__( self ):
+        self.now = 1000.0
+        self.sleeps = []
+
+
+    def monotonic ( self ) -> float:
+        return self.now
+
+
+    def sleep ( self, seconds:float ) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def test_acquire_waits_for_the_first_cooldown(pool, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(_proxy, 'time', clock)
+    first, second = pool.proxies
+    pool.block(first)
+    clock.now += 0.1
+    pool.block(second)
+
+    # The proxy blocked first rests first, the pool sleeps once until then
+    assert pool.acquire() == first
+    assert len(clock.sleeps) == 1 and clock.sleeps[0] == pytest.approx(0.2)
+    assert pool.stats()[second]['cooling'] > 0
+
+    pool.block(first)
+    assert pool.acquire(wait=False) is None
+    assert len(clock.sleeps) == 1
+
+
+def test_acquire_raises_past_the_max_wait(pool, monkeypatch):
+    monkeypatch.setattr(ProxyPool, 'MAX_WAIT', 0.1)
+    for url in pool.proxies:
+        pool.block(url)
+    with pytest.raises(ConnectionError):
+        pool.acquire()
+
+
+def test_no_healthy_proxy_clears_the_current_one(standins, pool):
+    assert pool.rotate() is not None
+    for url in standins.proxies:
+        standins.set_down(url)
+
+    assert pool.rotate() is None
+    assert pool.current is None
+    with pytest.raises(ConnectionError):
+        Proxy.requests_proxies()
+
+    # A proxy back up is used once it rests
+    first = next(iter(standins.proxies))
+    standins.set_down(first, False)
+    time.sleep(pool.stats()[first]['cooling'])
+    assert Proxy.requests_proxies() == {'http': first, 'https': first}
+
+
+def test_simultaneous_blocks_rotate_once(standins, monkeypatch):
+    proxies = list(standins.proxies)
+    pool = ProxyPool(proxies + ['http://127.0.0.1:9'], cooldown=60)
+    first = pool.rotate()
+    threads = [ threading.Thread(target=pool.rotate, kwargs={'failed': first}) for _ in range(6) ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert pool.rotations == 2
+    assert pool.current not in (None, first)
+    cooling = [ url for url, state in pool.stats().items() if state['cooling'] > 0 ]
+    assert cooling == [first]
+
+
+def test_scholarly_proxy_cleared_without_healthy_proxy(standins):
+    applied = []
+    pool = ProxyPool(list(standins.proxies), cooldown=60, apply=applied.append)
+    assert pool.rotate() is not None
+    for url in standins.proxies:
+        standins.set_down(url)
+    assert pool.rotate() is None
+    assert applied[0] is not None and applied[-1] is None
+
+    assert Proxy.scholarly_generator(None)._proxies == {}
+    assert Proxy.scholarly_generator(applied[0])._proxies == {'http://': applied[0], 'https://': applied[0]}
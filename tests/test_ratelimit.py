@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import pytest
+from ScraperGoogleScholar import _ratelimit
+from ScraperGoogleScholar._ratelimit import RateLimiter, TokenBucket
+
+
+class Clock:
+    """ Monotonic clock of the buckets that only moves when they sleep or the test advances it """
+
+    def __init__( self ):
+        self.now = 1000.0
+        self.sleeps = []
+
+
+    def monotonic ( self ) -> float:
+        return self.now
+
+
+    def sleep ( self, seconds:float ) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(_ratelimit, 'time', clock)
+    return clock
+
+
+def test_tokens_refill_with_time(clock):
+    bucket = TokenBucket(rate=2.0, burst=2)
+
+    # The burst goes out at once, the next request waits 1/rate for a new token
+    assert bucket.acquire() == 0.0
+    assert bucket.acquire() == 0.0
+    assert bucket.acquire() == pytest.approx(0.5)
+    assert clock.sleeps == [pytest.approx(0.5)]
+
+    # After a long idle time the bucket is full again, but never over the burst
+    clock.now += 60
+    assert bucket.acquire() == 0.0
+    assert bucket.acquire() == 0.0
+    assert bucket.acquire() == pytest.approx(0.5)
+    assert bucket.slept == pytest.approx(1.0)
+
+
+def test_penalize_cools_down_and_reward_recovers(clock, monkeypatch):
+    monkeypatch.setattr(_ratelimit.random, 'uniform', lambda low, high: 1.0)
+    bucket = TokenBucket(rate=4.0)
+
+    assert bucket.penalize() == TokenBucket.BASE_COOLDOWN
+    assert bucket.penalize(retry_after=30) == 30
+    assert bucket.rate == pytest.approx(1.0)
+
+    # The next request waits for the longest cooldown
+    assert bucket.acquire() == pytest.approx(30)
+
+    bucket.reward()
+    assert bucket.rate == pytest.approx(1.0 * TokenBucket.RECOVERY) and bucket.strikes == 1
+    for _ in range(20):
+        bucket.reward()
+    assert bucket.rate == 4.0 and bucket.strikes == 0
+
+
+def test_limits_per_host(clock):
+    limiter = RateLimiter.configure({'api.crossref.org': 1.0})
+    try:
+        assert limiter.acquire('https://api.crossref.org/works?query=x') == 0.0
+        assert limiter.acquire('api.crossref.org') == pytest.approx(1.0)
+
+        # Hosts without a limit are not throttled
+        for _ in range(5):
+            assert limiter.acquire('https://example.org/') == 0.0
+        assert set(limiter.stats()) == {'api.crossref.org'}
+    finally:
+        RateLimiter.configure()
+
+
+def test_parse_limits():
+    assert RateLimiter.parse_limits(['Scholar.Google.com=0.5', 'api.crossref.org = 20']) == \
+        {'scholar.google.com': 0.5, 'api.crossref.org': 20.0}
+    with pytest.raises(ValueError):
+        RateLimiter.parse_limits(['api.crossref.org=fast'])
+    with pytest.raises(ValueError):
+        RateLimiter.parse_limits(['api.crossref.org=0'])
@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+from ScraperGoogleScholar._rawstore import RawStore
+
+
+def test_append_after_a_truncated_line(tmp_path):
+    path = tmp_path / 'query.raw.jsonl'
+    store = RawStore(path)
+    for rank in (1, 2, 3):
+        store.append(rank, {'bib': {'title': f"Paper {rank}"}})
+    store.close()
+
+    # A crash in the middle of the last record
+    os.truncate(path, path.stat().st_size - 10)
+    assert not path.read_bytes().endswith(b'\n')
+
+    store = RawStore(path)
+    assert 3 not in store
+    for rank in (4, 5):
+        store.append(rank, {'bib': {'title': f"Paper {rank}"}})
+    store.close()
+
+    records = RawStore.records([path])
+    assert sorted(records) == [1, 2, 4, 5]
+    assert records[4]['bib']['title'] == 'Paper 4'
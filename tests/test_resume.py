@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import csv
+from ScraperGoogleScholar.__main__ import run
+from ScraperGoogleScholar._resume import CSVWriter
+from ScraperGoogleScholar._scraper import ScraperGooleScholar
+
+
+def test_missing_ranges():
+    ranges = ScraperGooleScholar.get_missing_ranges
+    assert ranges(30, []) == []
+    assert ranges(30, ['5']) == [(1, 10)]
+    assert ranges(30, ['5', '7', '21', '30']) == [(1, 10), (21, 30)]
+
+    # Consecutive pages are read with the same iterator, the last page ends at numentries
+    assert ranges(25, ['9', '11', '25']) == [(1, 25)]
+    assert ranges(25, ['24', '26', '0']) == [(21, 25)]
+
+
+def test_resume_only_requests_pages_with_missing_entries(standins, tmp_path, monkeypatch):
+    monkeypatch.setattr(ScraperGooleScholar, 'FETCHER', 'native')
+    outfile = ScraperGooleScholar.get_outfile('gender bias', tmp_path)
+    writer = CSVWriter(outfile, ScraperGooleScholar.FIELDNAMES)
+    for rank in [ rank for rank in range(1, 21) if rank != 5 ]:
+        writer.write({ ScraperGooleScholar.GSRANK_KEY: str(rank), ScraperGooleScholar.TITLE_KEY: f"Paper {rank}" })
+    writer.close()
+
+    before = standins.num_requests()['scholar.google.com']
+    assert run('gender bias', 30, str(tmp_path), 'desktop', False) == 11
+
+    # The first page for entry 5 and the third one, the second page is skipped
+    assert standins.num_requests()['scholar.google.com'] - before == 2
+    with open(outfile, newline='', encoding='utf-8') as csvfile:
+        ranks = [ row[ScraperGooleScholar.GSRANK_KEY] for row in csv.DictReader(csvfile) ]
+    assert sorted(ranks, key=int) == [ str(rank) for rank in range(1, 31) ]
+    assert ranks[19:] == ['5'] + [ str(rank) for rank in range(21, 31) ]
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import pytest
+import requests
+from ScraperGoogleScholar import _retry
+from ScraperGoogleScholar._retry import CircuitBreaker, CircuitOpenError, Retrier
+
+
+class Clock:
+    """ Monotonic clock of the retrier that only moves when it sleeps or the test advances it """
+
+    def __init__( self ):
+        self.now = 1000.0
+        self.sleeps = []
+
+
+    def monotonic ( self ) -> float:
+        return self.now
+
+
+    def sleep ( self, seconds:float ) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class HTTPError(Exception):
+
+    def __init__( self, status:int ):
+        super().__init__(f"HTTP {status}")
+        self.response = type('Response', (), {'status_code': status})()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(_retry, 'time', clock)
+    monkeypatch.setattr(_retry.random, 'uniform', lambda low, high: 1.0)
+    monkeypatch.setattr(Retrier, 'BREAKERS', dict())
+    monkeypatch.setattr(Retrier, 'RETRIES', dict())
+    return clock
+
+
+def failing(times:int, error:Exception):
+    """ Function that raises `error` the first `times` calls and then returns 'ok' """
+    calls = []
+    def function():
+        calls.append(1)
+        if len(calls) <= times:
+            raise error
+        return 'ok'
+    function.calls = calls
+    return function
+
+
+def test_classify():
+    assert Retrier.classify(Retrier.SCHOLAR, HTTPError(429)) == 'blocked'
+    assert Retrier.classify(Retrier.SCHOLAR, Exception('Please solve the CAPTCHA')) == 'blocked'
+    assert Retrier.classify(Retrier.CROSSREF, HTTPError(429)) == 'quota'
+    assert Retrier.classify(Retrier.NAMES, HTTPError(402)) == 'quota'
+    assert Retrier.classify(Retrier.CROSSREF, HTTPError(503)) == 'transient'
+    assert Retrier.classify(Retrier.CROSSREF, requests.exceptions.ConnectTimeout()) == 'transient'
+    assert Retrier.classify(Retrier.CROSSREF, HTTPError(404)) == 'fatal'
+    assert Retrier.classify(Retrier.CROSSREF, KeyError('DOI')) == 'fatal'
+
+
+def test_transient_errors_are_retried_with_backoff(clock):
+    function = failing(2, TimeoutError())
+    assert Retrier.call(Retrier.CROSSREF, function) == 'ok'
+    assert len(function.calls) == 3
+    assert clock.sleeps == [Retrier.BASE_DELAY, Retrier.BASE_DELAY * 2]
+    assert Retrier.stats()['retries'] == {'crossref:transient': 2}
+
+    # Fatal errors are raised at once
+    function = failing(1, KeyError('DOI'))
+    with pytest.raises(KeyError):
+        Retrier.call(Retrier.CROSSREF, function)
+    assert len(function.calls) == 1
+
+
+def test_blocked_calls_rotate_instead_of_sleeping(clock):
+    rotations = []
+    function = failing(1, HTTPError(429))
+    assert Retrier.call(Retrier.SCHOLAR, function, on_blocked=lambda: rotations.append(1)) == 'ok'
+    assert rotations == [1] and clock.sleeps == []
+
+
+def test_breaker_transitions(clock):
+    breaker = CircuitBreaker('test', threshold=3, reset_timeout=60)
+
+    # Closed: failures under the threshold keep it closed
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.remaining() == 0.0
+
+    # Open: the threshold trips it for reset_timeout seconds
+    breaker.record_failure()
+    assert breaker.remaining() == 60 and breaker.trips == 1
+    clock.now += 45
+    assert breaker.remaining() == 15
+
+    # Half open: the timeout passed, a failed trial call opens it again without a new trip
+    clock.now += 15
+    assert breaker.remaining() == 0.0
+    breaker.record_failure()
+    assert breaker.remaining() == 60 and breaker.trips == 1
+
+    # A successful trial call closes it
+    clock.now += 60
+    breaker.record_success()
+    assert breaker.remaining() == 0.0 and breaker.failures == 0
+    breaker.record_failure()
+    assert breaker.remaining() == 0.0
+
+
+def test_call_waits_for_an_open_circuit(clock, monkeypatch):
+    breaker = Retrier.breaker(Retrier.CROSSREF)
+    for _ in range(breaker.threshold):
+        breaker.record_failure()
+
+    # The call sleeps until the trial call and closes the circuit when it succeeds
+    assert Retrier.call(Retrier.CROSSREF, lambda: 'ok') == 'ok'
+    assert clock.sleeps == [breaker.reset_timeout]
+    assert breaker.remaining() == 0.0
+
+    # A circuit open for too long fails fast
+    monkeypatch.setattr(breaker, 'reset_timeout', Retrier.MAX_WAIT_OPEN * 2)
+    for _ in range(breaker.threshold):
+        breaker.record_failure()
+    function = failing(0, None)
+    with pytest.raises(CircuitOpenError):
+        Retrier.call(Retrier.CROSSREF, function)
+    assert function.calls == []
+    assert Retrier.stats()['circuit_trips'] == {'crossref': 2}
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import csv
+from ScraperGoogleScholar._scraper import ScraperGooleScholar
+from ScraperGoogleScholar._resume import CSVWriter
+from ScraperGoogleScholar._shard import YearShards
+
+
+def write_rows ( folder, ranks ):
+    folder.mkdir(parents=True, exist_ok=True)
+    writer = CSVWriter(ScraperGooleScholar.get_outfile('gender bias', folder), ScraperGooleScholar.FIELDNAMES)
+    for rank in ranks:
+        writer.write({ ScraperGooleScholar.GSRANK_KEY: str(rank), ScraperGooleScholar.TITLE_KEY: f"Paper {rank}",
+                       ScraperGooleScholar.PUB_YEAR_KEY: '2000', ScraperGooleScholar.NUM_CITATIONS_KEY: '0' })
+    writer.close()
+
+
+def test_slices_resume_from_earlier_days(tmp_path):
+    years = (2000, 2001)
+    yesterday = YearShards('gender bias', tmp_path / '2026-10-17', years)
+    write_rows(yesterday.folder(years), [1, 2])
+
+    today = YearShards('gender bias', tmp_path / '2026-10-18', years)
+    assert today.folder(years) == tmp_path / 'genderbias.shards' / '2000-2001' / '2026-10-18'
+    assert ScraperGooleScholar().get_downloaded_entries('gender bias', today.folder(years)) == {'1', '2'}
+
+    # Today only the missing entries are written, the merge reads every day
+    write_rows(today.folder(years), [3])
+    outfile, papers = today.merge([(years, 3)])
+    assert outfile == tmp_path / '2026-10-18' / 'genderbias.shards.csv'
+    with open(outfile, newline='', encoding='utf-8') as csvfile:
+        rows = list(csv.DictReader(csvfile))
+    assert papers == 3
+    assert [ row[YearShards.SHARD_RANK_KEY] for row in rows ] == ['1', '2', '3']
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import threading
+import pytest
+from ScraperGoogleScholar._scraper import ScraperGooleScholar
+from ScraperGoogleScholar._sinks import Sink
+
+
+class ListSink(Sink):
+
+    def __init__( self, path:str ):
+        super().__init__(path)
+        self.records = []
+        self.closed = False
+
+
+    def write ( self, record ) -> None:
+        self.records.append(record)
+
+
+    def close ( self ) -> None:
+        self.closed = True
+
+
+def test_sink_requires_write(tmp_path):
+    with pytest.raises(TypeError):
+        Sink(tmp_path / 'out')
+
+
+def test_stream_records(standins, tmp_path, monkeypatch):
+    monkeypatch.setattr(ScraperGooleScholar, 'FETCHER', 'native')
+    sink = ListSink(tmp_path / 'out')
+    records = list(ScraperGooleScholar.stream('deep learning', 15, sinks=[sink]))
+    assert [ record.gsrank for record in records ] == list(range(1, 16))
+    assert sink.records == records and sink.closed
+
+
+def test_astream_cancelled_while_waiting(standins, tmp_path, monkeypatch):
+    monkeypatch.setattr(ScraperGooleScholar, 'FETCHER', 'native')
+    # Slow enrichment, so the cancellation lands while the next record is awaited
+    standins.servers['api.crossref.org'].latency = 0.5
+    sink = ListSink(tmp_path / 'out')
+    received = []
+
+    async def consume ():
+        async for record in ScraperGooleScholar.astream('deep learning', 100, sinks=[sink]):
+            received.append(record)
+
+    async def main ():
+        task = asyncio.create_task(consume())
+        while not received:
+            await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    assert sink.closed
+    assert not [ thread for thread in threading.enumerate() if thread.name.startswith('gscraper-astream') ]
+
+    # The query stops, with the entries already being enriched
+    for thread in threading.enumerate():
+        if thread.name == 'gscraper-stream':
+            thread.join(timeout=30)
+            assert not thread.is_alive()
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import pytest
+from ScraperGoogleScholar._workqueue import WorkQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = WorkQueue(tmp_path / 'queue.sqlite')
+    yield queue
+    queue.close()
+
+
+def test_claim_rolls_back_on_error(queue):
+    assert queue.add('query', WorkQueue.split([(1, 40)], 20), 40) == 2
+
+    # The lease is invalid, the claim fails after its first statement
+    with pytest.raises(TypeError):
+        queue.claim('worker-1', None)
+    assert not queue._conn.in_transaction
+    assert queue.stats()['pending'] == 2
+
+    task = queue.claim('worker-1', 60)
+    assert (task['first'], task['last'], task['attempts']) == (1, 20, 1)
+    assert queue.stats()['leased'] == 1
+
+
+def test_merged_results(queue):
+    queue.report('query', 1, {'GSRANK': '1'}, 'worker-1')
+    queue.report('query', 2, {'GSRANK': '2'}, 'worker-1')
+    queue.merged(queue.unmerged(limit=1))
+    assert [ gsrank for _, gsrank, _ in queue.unmerged() ] == [2]
+    assert queue._conn.execute('PRAGMA journal_mode').fetchone()[0] == 'delete'